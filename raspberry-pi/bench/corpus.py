@@ -0,0 +1,22 @@
+"""
+Corpus sintético para los benchmarks: el de scripts/synth_corpus.py (reglas,
+mutaciones, samples_v2.json) con semilla fija, una línea por patrón.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from synth_corpus import PATTERN_TYPES, STYLES, synthesize
+from pattern_generator import PatternGenerator
+
+_generator = None
+
+
+def synthetic_corpus(count, seed=0):
+    """Producir `count` patrones deterministas para una semilla dada"""
+    global _generator
+    if _generator is None:
+        _generator = PatternGenerator(use_ai=False)
+    return synthesize(count, seed=seed, generator=_generator)
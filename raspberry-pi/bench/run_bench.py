@@ -0,0 +1,279 @@
+"""
+TidalAI Companion - Benchmarks del pipeline de generación
+
+    python3 bench/run_bench.py                       # suite completa
+    python3 bench/run_bench.py --quick               # tamaños pequeños (PC / comprobación rápida)
+    python3 bench/run_bench.py -k markov -o pi.json  # solo los casos que contienen "markov"
+    python3 bench/run_bench.py --compare base.json pi.json
+
+Imprime (o guarda con -o) un JSON con metadatos (commit, máquina, Python) y,
+por caso, el tiempo por llamada en ms (min/mediana/media/desviación) y ops/s.
+Los datos son deterministas (semilla fija), así que dos ejecuciones del mismo
+commit en la misma máquina son comparables.
+
+Para medir el servidor HTTP real ver scripts/bench_serving.py.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'generator'))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'web'))
+
+from corpus import PATTERN_TYPES, STYLES, synthetic_corpus
+from markov_model import MarkovModel
+from pattern_generator import PatternGenerator
+from theory_engine import TheoryEngine
+
+SEED = 1234
+CASES = []  # (nombre, función que prepara el caso y devuelve la llamada a medir)
+
+
+def case(name):
+    def register(setup):
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+def measure(fn, repeat=5, min_batch_time=0.05):
+    """
+    Tiempo por llamada de fn(): se calibra un lote de llamadas que dure al menos
+    min_batch_time y se repite `repeat` veces.
+    """
+    fn()  # Calentamiento
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_batch_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_batch_time / 10 else 2
+
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+
+    median = statistics.median(samples)
+    return {
+        'min_ms': round(min(samples) * 1000, 4),
+        'median_ms': round(median * 1000, 4),
+        'mean_ms': round(statistics.mean(samples) * 1000, 4),
+        'stdev_ms': round(statistics.stdev(samples) * 1000, 4) if len(samples) > 1 else 0.0,
+        'ops_per_sec': round(1 / median, 1) if median else None,
+        'loops': number,
+        'repeat': repeat
+    }
+
+
+# --- Casos ---
+
+def corpus_sizes(quick):
+    return [500, 2000] if quick else [1000, 10000, 50000]
+
+
+_corpus_cache = {}
+
+
+def corpus(size):
+    if size not in _corpus_cache:
+        _corpus_cache[size] = list(synthetic_corpus(size, seed=SEED))
+    return _corpus_cache[size]
+
+
+def trained_model(size):
+    model = MarkovModel(order=2)
+    model.train(corpus(size))
+    return model
+
+
+def register_cases(quick):
+    for size in corpus_sizes(quick):
+        @case(f'markov.train[{size}]')
+        def _(size=size):
+            patterns = corpus(size)
+            return lambda: MarkovModel(order=2).train(patterns)
+
+        @case(f'markov.train_parallel[{size}]')
+        def _(size=size):
+            patterns = corpus(size)
+            workers = max(2, os.cpu_count() or 1)
+            return lambda: MarkovModel(order=2).train(patterns, workers=workers)
+
+        @case(f'markov.generate[{size}]')
+        def _(size=size):
+            model = trained_model(size)
+            return lambda: model.generate(max_tokens=50, temperature=1.0)
+
+    generator = PatternGenerator(use_ai=False)
+    generator.markov = trained_model(corpus_sizes(quick)[0])
+
+    for pattern_type in PATTERN_TYPES:
+        for style in (STYLES[:2] if quick else STYLES):
+            @case(f'generator.generate[{pattern_type}/{style}]')
+            def _(pattern_type=pattern_type, style=style):
+                return lambda: generator.generate(pattern_type=pattern_type, style=style, use_ai=False)
+
+    @case('generator.generate[ai]')
+    def _():
+        return lambda: generator.generate(use_ai=True, temperature=1.0)
+
+    sample_patterns = corpus(200)
+
+    theory = TheoryEngine()
+    genres = [g for g in theory.rules_config if g != 'general']
+    for genre in (genres[:3] if quick else genres):
+        @case(f'theory.validate[{genre}]')
+        def _(genre=genre):
+            return lambda: [theory.validate(p, genre) for p in sample_patterns[:20]]
+
+    from latent_engine import LatentEngine
+    latent = LatentEngine()
+
+    @case('latent.blend_multiple')
+    def _():
+        return lambda: latent.blend_multiple({'techno': 0.5, 'ambient': 0.3, 'house': 0.2})
+
+    @case('latent.blend_multiple[2]')
+    def _():
+        return lambda: latent.blend_multiple({'techno': 0.7, 'ambient': 0.3})
+
+    @case('latent.blend_multiple[6]')
+    def _():
+        return lambda: latent.blend_multiple({g: 1.0 for g in latent.genres[:6]})
+
+    @case('latent.path[64]')
+    def _():
+        return lambda: latent.path('techno', 'ambient', steps=64)
+
+    from oracle_engine import OracleEngine
+    oracle = OracleEngine()
+    intents = [f'quiero algo más oscuro y agresivo, drum and bass {i}' for i in range(1000)]
+
+    @case('oracle.interpret')
+    def _():
+        texts = iter(intents * 1000)  # Textos distintos: sin caché de resultados
+        return lambda: oracle.interpret(next(texts))
+
+    @case('oracle.fuzzy_matches')
+    def _():
+        misspelled = ['agresibo', 'spacey', 'oscurro', 'relajadoo', 'brillantee', 'minimall', 'tribu', 'caotik']
+        return lambda: [oracle.fuzzy_matches(w) for w in misspelled]
+
+    @case('generator.mutate')
+    def _():
+        return lambda: generator.mutate(sample_patterns[0], strength=0.5)
+
+    @case('generator.morph')
+    def _():
+        return lambda: generator.morph(sample_patterns[1], sample_patterns[2], ratio=0.5)
+
+    @case('generator.get_layers')
+    def _():
+        return lambda: [generator.get_layers(p) for p in sample_patterns[:20]]
+
+    @case('evolution.run_evolution[20]')
+    def _():
+        import evolutionary_trainer
+        # No tocar el corpus real: las supervivientes van a un temporal
+        evolutionary_trainer.CORPUS_FILE = os.path.join(tempfile.mkdtemp(), 'evolution.txt')
+        trainer = evolutionary_trainer.EvolutionaryTrainer(generator)
+        return lambda: trainer.run_evolution(batch_size=20, top_k=5)
+
+    @case('flask./api/generate')
+    def _():
+        # Historial en una base temporal, no en tidal.db: AppState la abre al importar app
+        os.environ['TIDALAI_DB'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        import app as web_app
+        client = web_app.app.test_client()
+        payload = {'pattern_type': 'drums', 'style': 'techno', 'use_ai': True, 'temperature': 1.0}
+        return lambda: client.post('/api/generate', json=payload)
+
+
+# --- Ejecución ---
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(filter_text=None, quick=False, repeat=5):
+    register_cases(quick)
+    results = {}
+    for name, setup in CASES:
+        if filter_text and filter_text not in name:
+            continue
+        random.seed(SEED)
+        fn = setup()
+        random.seed(SEED)
+        results[name] = measure(fn, repeat=repeat)
+        print(f"{name:45s} {results[name]['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': int(time.time()),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'quick': quick,
+            'seed': SEED
+        },
+        'results': results
+    }
+
+
+def compare(old_path, new_path):
+    """Tabla de medianas: ratio > 1 significa que el nuevo es más lento"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'caso':45s} {old['meta']['commit'] or 'old':>10s} {new['meta']['commit'] or 'new':>10s}  ratio")
+    for name, stats in new['results'].items():
+        if name not in old['results']:
+            continue
+        before, after = old['results'][name]['median_ms'], stats['median_ms']
+        ratio = after / before if before else float('inf')
+        print(f"{name:45s} {before:>10.3f} {after:>10.3f}  {ratio:.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='filter', help='Ejecutar solo los casos cuyo nombre contiene este texto')
+    parser.add_argument('-o', '--out', help='Guardar el JSON en este fichero')
+    parser.add_argument('--quick', action='store_true', help='Tamaños de corpus pequeños')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Comparar dos resultados')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    report = run(args.filter, quick=args.quick, repeat=args.repeat)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
@@ -0,0 +1,234 @@
+"""
+TidalAI Companion - Corpus Reader
+Lectura del corpus en streaming: patterns.txt (y favorites.json) se recorren
+como un generador en vez de cargarse en una lista.
+
+    model.train(iter_corpus(corpus_file, favorites_file))
+
+El pipeline lee línea a línea, descarta comentarios y marcadores
+"# --- ... RUN ---", normaliza y elimina duplicados sobre la marcha. La
+memoria no depende del tamaño del fichero (salvo el set de deduplicación,
+que guarda un hash por patrón único) y el entrenamiento empieza con la
+primera línea.
+
+iter_labeled_corpus() produce además las etiquetas de cada patrón
+("genre:techno", "type:drums") para entrenar los sub-modelos de Markov.
+"""
+
+import json
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+_PREFIX_RE = re.compile(r'^d\d+\s*\$\s*')  # "d1 $ " delante del patrón
+_COMMENT_RE = re.compile(r'\s--.*$')  # Comentario Haskell al final de la línea
+_SEPARATOR_RE = re.compile(r'^#[\s=#-]*$')  # "# =========" entre cabeceras de sección
+
+# Palabra clave en la cabecera de sección -> género de theory_rules.json.
+# En orden: "BREAKS Y JUNGLE" es breakbeat, "JUNGLE" a secas drum_and_bass.
+GENRE_KEYWORDS = [
+    ('DRUM AND BASS', 'drum_and_bass'), ('DRUM & BASS', 'drum_and_bass'), ('DNB', 'drum_and_bass'),
+    ('BREAK', 'breakbeat'), ('JUNGLE', 'drum_and_bass'), ('TECHNO', 'techno'), ('HOUSE', 'house'),
+    ('AMBIENT', 'ambient'), ('DUB', 'dub'), ('TRAP', 'trap'), ('GLITCH', 'glitch'),
+    ('INDUSTRIAL', 'industrial'), ('CYBERPUNK', 'cyberpunk'), ('DEEPSEA', 'deepsea'), ('DEEP SEA', 'deepsea'),
+    ('ORGANIC', 'organic'), ('EXPERIMENTAL', 'experimental')
+]
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """Líneas no vacías de un fichero de corpus, sin comentarios ni marcadores de bloque"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and not line.startswith('--'):
+                yield line
+
+
+def read_sections(path: str) -> Iterator[Tuple[str, str]]:
+    """Como read_lines, pero con el género de la sección en curso (o None)"""
+    for line, genre, _ in scan_sections(path):
+        yield line, genre
+
+
+def scan_sections(path: str, start: int = 0, genre: str = None) -> Iterator[Tuple[str, str, int]]:
+    """
+    (línea, género, offset) desde el byte `start`, donde offset es la posición
+    justo después de la línea. Con el offset y el género de la última línea
+    leída se puede retomar la lectura cuando el corpus crece (solo se añade al
+    final: evolución, scavenger).
+    """
+    if not os.path.exists(path):
+        return
+    offset = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for raw in f:
+            offset += len(raw)
+            line = raw.decode('utf-8', errors='replace').strip()
+            if not line or line.startswith('--') or _SEPARATOR_RE.match(line):
+                continue
+            if line.startswith('#'):
+                # Cada cabecera abre sección; los marcadores "# --- RUN ---" la cierran
+                genre = header_genre(line)
+                continue
+            yield line, genre, offset
+
+
+def header_genre(header: str):
+    """Género mencionado en una cabecera de sección del corpus, o None"""
+    text = header.lstrip('#').strip().upper()
+    for keyword, genre in GENRE_KEYWORDS:
+        if keyword in text:
+            return genre
+    return None
+
+
+def categorize_type(pattern: str) -> str:
+    """
+    Tipo de instrumento de un patrón (drums, bass, melody, percussion, fx o
+    unknown) por heurísticas sobre el sample y las notas.
+    """
+    pattern_lower = pattern.lower()
+    
+    sound_match = re.search(r's\s+"([^"]+)"', pattern_lower)
+    sound_source = sound_match.group(1) if sound_match else ""
+    has_note = 'note' in pattern_lower or re.search(r'n\s+"', pattern_lower)
+    
+    drum_sounds = ['bd', 'kick', 'sn', 'snare', 'hh', 'hat', 'hihat', 'cp', 'clap',
+                   'clubkick', 'sd', 'rim', 'tom', 'cymbal', 'crash', 'ride', 'hh27', 'ch', 'oh']
+    bass_sounds = ['bass', 'sub', 'jungbass', 'reese', 'wobble', 'superfm', 'bassdm', 'bassdrums']
+    melody_sounds = ['arpy', 'arp', 'piano', 'superpiano', 'rhodes', 'keys', 'supersquare', 
+                     'supersaw', 'superpwm', 'pluck', 'bell', 'gong', 'supergong', 'supervibe', 
+                     'vibe', 'marimba', 'synth', 'lead', 'pad', 'string']
+    perc_sounds = ['tabla', 'bongo', 'conga', 'perc', 'shaker', 'tamb', 'cowbell', 'wood', 
+                   'metal', 'click', 'tick']
+    fx_sounds = ['noise', 'wind', 'breath', 'bev', 'birds', 'space', 'pad', 'drone', 
+                 'texture', 'grain', 'glitch', 'acid']
+    
+    for drum in drum_sounds:
+        if drum in sound_source or f'sound "{drum}' in pattern_lower:
+            return 'drums'
+    
+    for bass in bass_sounds:
+        if bass in sound_source:
+            return 'bass'
+    
+    for perc in perc_sounds:
+        if perc in sound_source:
+            return 'percussion'
+    
+    for fx in fx_sounds:
+        if fx in sound_source:
+            return 'fx'
+    
+    if has_note:
+        if any(x in pattern_lower for x in ['scale', 'chord', 'arpeggio', 'arpeggiate']):
+            return 'melody'
+        
+        note_numbers = re.findall(r'\b(\d+)\b', pattern)
+        if note_numbers:
+            notes = [int(n) for n in note_numbers if int(n) < 128]
+            if notes:
+                avg_note = sum(notes) / len(notes)
+                if avg_note < 48:
+                    return 'bass'
+                elif avg_note >= 48:
+                    return 'melody'
+    
+    for melody in melody_sounds:
+        if melody in sound_source or melody in pattern_lower:
+            return 'melody'
+    
+    if any(x in pattern_lower for x in ['lpf 200', 'lpf 150', 'lpf 120', 'lpf 100']):
+        return 'bass'
+    
+    if any(x in pattern_lower for x in ['striate', 'grain', 'chop']):
+        return 'fx'
+    
+    return 'unknown'
+
+
+def read_favorites(path: str) -> Iterator[str]:
+    """Patrones de favorites.json (lista de objetos con clave 'pattern')"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        favorites_data = json.load(f)  # Fichero pequeño: se carga entero
+    for fav in favorites_data:
+        if isinstance(fav, dict) and fav.get('pattern'):
+            yield fav['pattern']
+
+
+def normalize(pattern: str) -> str:
+    """Forma canónica de un patrón: sin "d1 $", sin comentario final, espacios simples"""
+    pattern = _PREFIX_RE.sub('', pattern.strip())
+    pattern = _COMMENT_RE.sub('', pattern)
+    return ' '.join(pattern.split())
+
+
+def unique_records(records: Iterable[Tuple]) -> Iterator[Tuple]:
+    """
+    Registros (patrón, ...) con el patrón normalizado, sin vacíos ni patrones
+    repetidos (gana el primero), conservando el orden y el resto de campos.
+    """
+    seen = set()  # hash() del patrón, no el texto
+    for pattern, *fields in records:
+        pattern = normalize(pattern)
+        if not pattern:
+            continue
+        key = hash(pattern)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield (pattern, *fields)
+
+
+def unique_patterns(patterns: Iterable[str]) -> Iterator[str]:
+    """Normalizar y descartar vacíos y duplicados, conservando el orden"""
+    for pattern, in unique_records((pattern,) for pattern in patterns):
+        yield pattern
+
+
+def read_labeled_favorites(path: str) -> Iterator[Tuple[str, str, str]]:
+    """(patrón, género, tipo) de favorites.json; el género sale de 'style' o 'genre'"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        favorites_data = json.load(f)
+    for fav in favorites_data:
+        if isinstance(fav, dict) and fav.get('pattern'):
+            yield fav['pattern'], fav.get('genre') or fav.get('style'), fav.get('type')
+
+
+def iter_labeled_corpus(corpus_file: str, favorites_file: str = None) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Como iter_corpus, pero cada elemento es (patrón, etiquetas): "genre:<g>"
+    si la sección o el favorito lo indican y "type:<t>" si el tipo se conoce.
+    Es el formato que acepta MarkovModel.train para los sub-modelos.
+    """
+    def sources():
+        for pattern, genre in read_sections(corpus_file):
+            yield pattern, genre, None
+        if favorites_file:
+            yield from read_labeled_favorites(favorites_file)
+
+    for pattern, genre, pattern_type in unique_records(sources()):
+        labels = []
+        if genre:
+            labels.append(f'genre:{genre}')
+        pattern_type = pattern_type or categorize_type(pattern)
+        if pattern_type and pattern_type != 'unknown':
+            labels.append(f'type:{pattern_type}')
+        yield pattern, labels
+
+
+def iter_corpus(corpus_file: str, favorites_file: str = None) -> Iterator[str]:
+    """Corpus base seguido de los favoritos, normalizado y sin duplicados"""
+    def sources():
+        yield from read_lines(corpus_file)
+        if favorites_file:
+            yield from read_favorites(favorites_file)
+
+    return unique_patterns(sources())
@@ -5,6 +5,8 @@ import re
 from datetime import datetime
 import logging
 
+from json_cache import json_cache
+
 logger = logging.getLogger(__name__)
 
 # Configuración
@@ -23,11 +25,10 @@ class EvolutionaryTrainer:
         self.config = self._load_config()
         
     def _load_config(self):
-        import json
         try:
-            if os.path.exists(CONFIG_FILE):
-                with open(CONFIG_FILE, 'r') as f:
-                    return json.load(f)
+            config = json_cache.load(CONFIG_FILE)
+            if config is not None:
+                return config
         except Exception as e:
             logger.error(f"Error cargando config: {e}")
             
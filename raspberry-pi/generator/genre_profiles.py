@@ -0,0 +1,243 @@
+"""
+TidalAI Companion - Genre Profiles
+Perfiles de género aprendidos del corpus categorizado (secciones "# GENERO: ..."
+de patterns.txt y favoritos con estilo): densidad media de eventos, uso de
+euclídeos, uso de efectos y frecuencia de cada sample.
+
+    profiles = GenreProfiles()
+    profiles.refresh(corpus_file, favorites_file)  # Incremental
+    profiles.save()
+
+La caché en disco guarda contadores (no medias), así que un refresco solo lee
+lo añadido al corpus desde la última vez: patterns.txt solo crece por el final
+(evolución, scavenger). Si el fichero cambia de otra forma (huella del tramo
+anterior al offset distinta, o más corto) se recalcula entero. favorites.json
+es pequeño y se recuenta cuando cambia su tamaño o fecha.
+
+LatentEngine convierte los perfiles en vectores de género (ver vectors()).
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+from corpus_reader import categorize_type, normalize, read_labeled_favorites, scan_sections
+
+# Datos generados, junto a tidal.db (raíz de raspberry-pi), no entre el código
+PROFILES_FILE = os.path.join(os.path.dirname(__file__), '..', 'genre_profiles.json')
+
+# Bytes antes del offset que se comparan para saber si el corpus solo ha crecido
+FINGERPRINT_BYTES = 4096
+
+# Eventos por ciclo que corresponden a densidad 1.0 y efectos por patrón a complejidad plena
+DENSITY_FULL = 16
+EFFECTS_FULL = 3
+
+# Samples más frecuentes que pasan al vector de un género
+PROFILE_SAMPLES = 8
+
+# Parámetros de control que no cuentan como efecto
+_NON_EFFECTS = {'s', 'sound', 'n', 'note', 'up', 'orbit', 'legato', 'sustain', 'cut', 'gain'}
+
+_SOUND_RE = re.compile(r'\b(?:s|sound|n|note|up)\s+"([^"]+)"')
+_SAMPLE_RE = re.compile(r'\b(?:s|sound)\s+"([^"]+)"')
+_STEP_RE = re.compile(r'(~|[\w.:\-]+)(?:\((\d+),\s*\d+[^)]*\))?(?:\*(\d+))?')
+_EUCLID_RE = re.compile(r'\(\s*\d+\s*,\s*\d+')
+_EFFECT_RE = re.compile(r'#\s*(\w+)')
+_NAME_RE = re.compile(r'\w+')
+
+
+def pattern_stats(pattern):
+    """Eventos por ciclo, euclídeo sí/no, efectos y samples de un patrón"""
+    events = 0
+    for sequence in _SOUND_RE.findall(pattern):
+        count = 0
+        for step, pulses, repeat in _STEP_RE.findall(sequence):
+            if step != '~':
+                count += int(pulses) if pulses else int(repeat or 1)
+        events = max(events, count)  # n "..." # s "..." describen los mismos eventos
+
+    samples = []
+    for sequence in _SAMPLE_RE.findall(pattern):
+        # "808bd:3" -> 808bd; los números sueltos son índices o argumentos euclídeos
+        samples.extend(name for name in _NAME_RE.findall(sequence) if not name.isdigit())
+
+    # Rítmico: batería/percusión, o cualquier sample no melódico repetido en el ciclo
+    pattern_type = categorize_type(pattern)
+    rhythmic = pattern_type in ('drums', 'percussion') or (events >= 4 and pattern_type not in ('melody', 'bass'))
+
+    return {
+        'events': events,
+        'euclid': bool(_EUCLID_RE.search(pattern)),
+        'effects': sorted({e for e in _EFFECT_RE.findall(pattern) if e not in _NON_EFFECTS}),
+        'samples': samples,
+        'rhythmic': rhythmic
+    }
+
+
+def _empty_stats():
+    return {'patterns': 0, 'events': 0, 'euclid': 0, 'rhythmic': 0, 'effects': Counter(), 'samples': Counter()}
+
+
+def _add(stats, pattern):
+    features = pattern_stats(pattern)
+    stats['patterns'] += 1
+    stats['events'] += features['events']
+    stats['euclid'] += features['euclid']
+    stats['rhythmic'] += features['rhythmic']
+    stats['effects'].update(features['effects'])
+    stats['samples'].update(features['samples'])
+
+
+def _merge(into, stats):
+    for key in ('patterns', 'events', 'euclid', 'rhythmic'):
+        into[key] += stats[key]
+    into['effects'].update(stats['effects'])
+    into['samples'].update(stats['samples'])
+
+
+def _from_data(data):
+    return {genre: dict(s, effects=Counter(s['effects']), samples=Counter(s['samples'])) for genre, s in data.items()}
+
+
+def _to_data(stats):
+    return {genre: dict(s, effects=dict(s['effects']), samples=dict(s['samples'])) for genre, s in stats.items()}
+
+
+def _fingerprint(path, offset):
+    """Hash de los FINGERPRINT_BYTES anteriores a offset"""
+    start = max(0, offset - FINGERPRINT_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def _signature(path):
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class GenreProfiles:
+    """Contadores por género del corpus y de los favoritos, con caché en disco"""
+
+    def __init__(self, cache_file: str = PROFILES_FILE):
+        self.cache_file = cache_file
+        self.corpus_state = {}  # path, offset, genre de la sección abierta y huella
+        self.corpus_stats = {}
+        self.favorites_signature = None
+        self.favorites_stats = {}
+        if cache_file and os.path.exists(cache_file):
+            self.load()
+
+    def load(self):
+        with open(self.cache_file, 'r') as f:
+            data = json.load(f)
+        self.corpus_state = data.get('corpus', {})
+        self.corpus_stats = _from_data(data.get('corpus_stats', {}))
+        self.favorites_signature = data.get('favorites_signature')
+        self.favorites_stats = _from_data(data.get('favorites_stats', {}))
+
+    def save(self):
+        data = {
+            'corpus': self.corpus_state,
+            'corpus_stats': _to_data(self.corpus_stats),
+            'favorites_signature': self.favorites_signature,
+            'favorites_stats': _to_data(self.favorites_stats)
+        }
+        tmp = self.cache_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.cache_file)
+
+    def refresh(self, corpus_file: str, favorites_file: str = None) -> int:
+        """
+        Poner los perfiles al día con el corpus; devuelve cuántos patrones se
+        han contado (0 si nada cambió).
+        """
+        return self._refresh_corpus(corpus_file) + self._refresh_favorites(favorites_file)
+
+    def _refresh_corpus(self, corpus_file):
+        path = os.path.abspath(corpus_file)
+        if not os.path.exists(path):
+            return 0
+        state = self.corpus_state
+        offset = state.get('offset', 0)
+        size = os.path.getsize(path)
+        appended = (
+            state.get('path') == path and offset <= size
+            and _fingerprint(path, offset) == state.get('fingerprint')
+        )
+        if not appended:
+            offset = 0
+            state = {'path': path, 'offset': 0, 'genre': None}
+            self.corpus_stats = {}
+
+        counted = 0
+        genre = state.get('genre')
+        for line, genre, offset in scan_sections(path, start=state['offset'], genre=genre):
+            pattern = normalize(line)
+            if pattern and genre:
+                _add(self.corpus_stats.setdefault(genre, _empty_stats()), pattern)
+                counted += 1
+
+        state.update(offset=offset, genre=genre, fingerprint=_fingerprint(path, offset))
+        self.corpus_state = state
+        return counted
+
+    def _refresh_favorites(self, favorites_file):
+        signature = _signature(favorites_file) if favorites_file else None
+        if signature == self.favorites_signature:
+            return 0
+        self.favorites_signature = signature
+        self.favorites_stats = {}
+        counted = 0
+        if favorites_file:
+            for pattern, genre, _ in read_labeled_favorites(favorites_file):
+                pattern = normalize(pattern)
+                if pattern and genre:
+                    _add(self.favorites_stats.setdefault(genre, _empty_stats()), pattern)
+                    counted += 1
+        return counted
+
+    def genres(self):
+        """{género: contadores} de corpus y favoritos juntos"""
+        combined = {}
+        for source in (self.corpus_stats, self.favorites_stats):
+            for genre, stats in source.items():
+                _merge(combined.setdefault(genre, _empty_stats()), stats)
+        return combined
+
+    def vectors(self):
+        """
+        {género: vector derivado de los datos} para los géneros con patrones.
+        Sin tempo (los patrones no lo llevan); 'patterns' indica en cuántos se basa.
+        """
+        vectors = {}
+        for genre, stats in self.genres().items():
+            n = stats['patterns']
+            if not n:
+                continue
+            effects_per_pattern = sum(stats['effects'].values()) / n
+            top = stats['samples'].most_common(PROFILE_SAMPLES)
+            peak = top[0][1] if top else 1
+            vectors[genre] = {
+                'patterns': n,
+                'density_base': min(1.0, stats['events'] / n / DENSITY_FULL),
+                'complexity_base': 0.5 * stats['euclid'] / n + 0.5 * min(1.0, effects_per_pattern / EFFECTS_FULL),
+                'rhythmic_weight': stats['rhythmic'] / n,
+                'sample_weights': {sample: count / peak for sample, count in top}
+            }
+        return vectors
+
+if __name__ == '__main__':
+    base = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus')
+    profiles = GenreProfiles()
+    counted = profiles.refresh(os.path.join(base, 'patterns.txt'), os.path.join(base, 'favorites.json'))
+    profiles.save()
+    print(f"{counted} patrones nuevos contados")
+    for name, vector in sorted(profiles.vectors().items()):
+        print(f"  {name}: {vector}")
@@ -0,0 +1,313 @@
+"""
+Jam Engine
+Sesión de jam en segundo plano: genera patrones por canal con antelación
+(buffer de lookahead) y los envía por OSC en los límites de compás,
+siguiendo las secciones del Conductor si está activo. Si el Conductor arranca,
+se reinicia, termina o se para a mitad de la jam, la sesión se re-alinea con él.
+"""
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JamSession:
+    """
+    Una sesión de jam en curso.
+
+    Dos hilos comparten el buffer de slots (compás -> patrones por canal):
+    - productor: genera los slots con antelación (al menos hasta el primer
+      compás de la siguiente sección), fuera de la línea de tiempo musical.
+    - emisor: duerme hasta cada límite de compás y envía el slot ya preparado.
+      Si un slot no está listo a tiempo se salta (los canales siguen sonando).
+
+    Los eventos section_change, finished y stopped del Conductor re-alinean la sesión
+    (ver _realign): los cambios pendientes pasan a la rejilla del Conductor y
+    se descartan los slots preparados con un plan que ya no va a sonar.
+    """
+
+    def __init__(self, generator, theory, conductor, osc_client,
+                 channels, pattern_types, duration_minutes=5, interval=8,
+                 tempo=140, style="techno", density=0.6, complexity=0.5,
+                 use_ai=True, temperature=1.0, lookahead_bars=16, log=None):
+        self.generator = generator
+        self.theory = theory
+        self.conductor = conductor
+        self.osc_client = osc_client
+        self.channels = list(channels)
+        self.pattern_types = list(pattern_types)
+        self.style = style
+        self.density = density
+        self.complexity = complexity
+        self.use_ai = use_ai
+        self.temperature = temperature
+        self.lookahead_bars = lookahead_bars
+        self.interval = interval
+        self.log = log or logger.info
+
+        # Reloj: alinearse con el Conductor si está sonando
+        if conductor.is_active:
+            self.bpm = conductor.bpm
+            self.origin = conductor.start_time
+            self.first_bar = self._bar_at(time.time()) + 1
+        else:
+            self.bpm = tempo
+            self.origin = time.time()
+            self.first_bar = 1  # Un compás de margen para preparar el primer slot
+
+        # El intervalo (segundos) se redondea a compases enteros
+        self.bars_per_change = max(1, round(interval / self.seconds_per_bar))
+        duration_bars = max(1, int(duration_minutes * 60 / self.seconds_per_bar))
+        self.slot_bars = list(range(self.first_bar, self.first_bar + duration_bars, self.bars_per_change))
+
+        self._buffer = {}  # compás -> {"section": ..., "patterns": {canal: patrón}}
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._next_index = 0  # Próximo slot a enviar
+        self._epoch = 0  # Cambia con cada re-alineado: el trabajo en curso del productor se descarta
+        self.current = {}  # canal -> último patrón enviado
+        self.current_section = None
+        self.sent = 0
+        self.missed = 0
+        self.last_error = None
+        self.started_at = time.time()
+        self.finished_at = None
+
+        self._producer = threading.Thread(target=self._produce, name="jam-producer", daemon=True)
+        self._sender = threading.Thread(target=self._send_loop, name="jam-sender", daemon=True)
+
+    # --- Reloj ---
+
+    @property
+    def seconds_per_bar(self):
+        return 60 / self.bpm * 4
+
+    def _bar_at(self, t):
+        return int((t - self.origin) / self.seconds_per_bar)
+
+    def _time_of(self, bar):
+        return self.origin + bar * self.seconds_per_bar
+
+    def _realign(self):
+        """
+        Seguir al Conductor tras un evento: con otro reloj (arranque, reinicio,
+        otro BPM) los cambios pendientes se recolocan desde el próximo compás de
+        su rejilla; sin plan activo se mantiene la rejilla actual. En ambos casos
+        se descartan los slots preparados para una sección que ya no sonará.
+        """
+        with self._cond:
+            if self.conductor.is_active:
+                grid = (self.conductor.bpm, self.conductor.start_time)
+            else:
+                grid = (self.bpm, self.origin)
+            regrid = grid != (self.bpm, self.origin)
+            if regrid:
+                remaining = len(self.slot_bars) - self._next_index
+                self.bpm, self.origin = grid
+                self.bars_per_change = max(1, round(self.interval / self.seconds_per_bar))
+                first = self._bar_at(time.time()) + 1
+                self.slot_bars[self._next_index:] = range(
+                    first, first + remaining * self.bars_per_change, self.bars_per_change)
+                self._buffer.clear()
+                self._epoch += 1
+            else:
+                stale = [bar for bar, slot in self._buffer.items() if slot["section"] != self._section_name(bar)]
+                for bar in stale:
+                    del self._buffer[bar]
+                if stale:
+                    self._epoch += 1
+            self._cond.notify_all()
+        if regrid:
+            self.log(f"🎛️ Jam re-alineada con el Conductor ({self.bpm} BPM)")
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        # Un cambio de sección adelanta el horizonte: despertar al productor a tiempo
+        self.conductor.subscribe(self._on_conductor_event)
+        self._producer.start()
+        self._sender.start()
+        self.log(f"🎛️ Jam iniciada: {len(self.slot_bars)} cambios cada {self.bars_per_change} compases ({self.bpm} BPM)")
+
+    def stop(self, silence=False):
+        self._stop_event.set()
+        self.conductor.unsubscribe(self._on_conductor_event)
+        with self._cond:
+            self._cond.notify_all()
+        for thread in (self._producer, self._sender):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+        if silence:
+            for channel in self.channels:
+                self.osc_client.stop_channel(channel)
+
+    @property
+    def running(self):
+        return self._sender.is_alive() and not self._stop_event.is_set()
+
+    def _on_conductor_event(self, event, status):
+        if event in ("section_change", "finished", "stopped"):
+            self._realign()
+        elif event == "transition_imminent":
+            with self._cond:
+                self._cond.notify_all()
+
+    # --- Productor ---
+
+    def _section_for(self, bar):
+        """Sección del Conductor que sonará en `bar` (None si no hay plan activo)"""
+        if not self.conductor.is_active:
+            return None
+        return self.conductor.section_at(bar)
+
+    def _section_name(self, bar):
+        section = self._section_for(bar)
+        return section["name"] if section else None
+
+    def _horizon(self):
+        """Último compás que debe estar pre-generado ahora mismo"""
+        now_bar = self._bar_at(time.time())
+        horizon = now_bar + self.lookahead_bars
+        section = self._section_for(now_bar)
+        if section:
+            # Cubrir siempre el primer compás de la siguiente sección
+            horizon = max(horizon, section["end_bar"])
+        return horizon
+
+    def _generate_slot(self, bar):
+        section = self._section_for(bar)
+        density, complexity = self.density, self.complexity
+        if section:
+            # Mismo sesgo que /api/generate: 80% plan del Conductor, 20% usuario
+            density = section["density"] * 0.8 + density * 0.2
+            complexity = section["complexity"] * 0.8 + complexity * 0.2
+
+        patterns = {}
+        for i, channel in enumerate(self.channels):
+            pattern_type = self.pattern_types[i % len(self.pattern_types)]
+            result = self.generator.generate(
+                pattern_type=pattern_type,
+                density=density,
+                complexity=complexity,
+                tempo=self.bpm,
+                style=self.style,
+                use_ai=self.use_ai,
+                temperature=self.temperature
+            )
+            patterns[channel] = self.theory.sanitize_pattern(result["pattern"])
+
+        return {"section": section["name"] if section else None, "patterns": patterns}
+
+    def _produce(self):
+        index, epoch = 0, self._epoch
+        while not self._stop_event.is_set():
+            with self._cond:
+                if epoch != self._epoch:
+                    # Re-alineado: rehacer lo que falte desde el próximo slot a enviar
+                    index, epoch = self._next_index, self._epoch
+                if self._next_index >= len(self.slot_bars):
+                    return
+                # Despertar al consumir un slot o con eventos del Conductor (como mucho cada compás);
+                # tras el último slot se espera igual por si un re-alineado obliga a rehacer
+                if index >= len(self.slot_bars) or self.slot_bars[index] > self._horizon():
+                    self._cond.wait(timeout=self.seconds_per_bar)
+                    continue
+                bar = self.slot_bars[index]
+                index += 1
+                if bar in self._buffer:
+                    continue
+            # Slot ya vencido (productor retrasado): no gastar tiempo en él
+            if bar < self._bar_at(time.time()):
+                continue
+            slot = None
+            for attempt in range(2):  # Un reintento: el muestreo es aleatorio
+                try:
+                    slot = self._generate_slot(bar)
+                    break
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.error(f"Error generando slot de jam (compás {bar}, intento {attempt + 1}): {e}")
+            if slot is None:
+                continue
+            with self._cond:
+                if epoch == self._epoch:  # Si no, el slot es de la rejilla o el plan anteriores
+                    self._buffer[bar] = slot
+                    self._cond.notify_all()
+
+    # --- Emisor ---
+
+    def _send_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    if self._next_index >= len(self.slot_bars):
+                        break
+                    bar, epoch = self.slot_bars[self._next_index], self._epoch
+                    # Dormir hasta el límite del compás; un re-alineado cambia el compás objetivo
+                    while not self._stop_event.is_set() and epoch == self._epoch:
+                        delay = self._time_of(bar) - time.time()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(timeout=delay)
+                    if self._stop_event.is_set():
+                        return
+                    if epoch != self._epoch:
+                        continue
+                    slot = self._buffer.pop(bar, None)
+                    self._next_index += 1
+                    self._cond.notify_all()
+
+                if slot is None:
+                    self.missed += 1
+                    logger.warning(f"Jam: slot del compás {bar} no preparado a tiempo, se mantiene el anterior")
+                    continue
+
+                if slot["section"] and slot["section"] != self.current_section:
+                    self.log(f"🎛️ Jam: sección {slot['section']} (compás {bar})")
+                self.current_section = slot["section"]
+
+                for channel, pattern in slot["patterns"].items():
+                    if self.osc_client.send_pattern(channel, pattern):
+                        self.current[channel] = pattern
+                self.sent += 1
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Error en emisor de jam: {e}")
+        finally:
+            self.finished_at = time.time()
+            self.conductor.unsubscribe(self._on_conductor_event)
+            if not self._stop_event.is_set():
+                self._stop_event.set()
+                self.log(f"🎛️ Jam finalizada: {self.sent} cambios enviados, {self.missed} perdidos")
+
+    # --- Inspección ---
+
+    def status(self):
+        with self._cond:
+            buffered = [
+                {"bar": bar, "section": self._buffer[bar]["section"]}
+                for bar in sorted(self._buffer)
+            ]
+            next_bar = self.slot_bars[self._next_index] if self._next_index < len(self.slot_bars) else None
+
+        return {
+            "running": self.running,
+            "bpm": self.bpm,
+            "bar": self._bar_at(time.time()),
+            "bars_per_change": self.bars_per_change,
+            "first_bar": self.first_bar,
+            "last_bar": self.slot_bars[-1] if self.slot_bars else None,
+            "next_bar": next_bar,
+            "section": self.current_section,
+            "channels": self.channels,
+            "types": self.pattern_types,
+            "buffered": buffered,
+            "sent": self.sent,
+            "missed": self.missed,
+            "total": len(self.slot_bars),
+            "current": self.current,
+            "last_error": self.last_error,
+            "started_at": int(self.started_at),
+            "finished_at": int(self.finished_at) if self.finished_at else None
+        }
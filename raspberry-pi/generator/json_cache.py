@@ -0,0 +1,129 @@
+"""
+TidalAI Companion - JSON File Cache
+Caché en memoria para los ficheros JSON de configuración.
+
+Las lecturas devuelven el objeto ya parseado mientras el fichero no cambie
+en disco (mtime/inode/tamaño); las escrituras son atómicas (temporal + rename)
+y actualizan la caché directamente.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from copy import deepcopy
+
+
+class JSONFileCache:
+    """
+    Caché read-through de ficheros JSON, revalidada con os.stat().
+
+    Los objetos devueltos por load() se comparten entre peticiones:
+    tratarlos como de solo lectura (o pedir copy=True para modificarlos).
+    """
+
+    def __init__(self):
+        self._entries = {}  # path -> (firma, objeto)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    @staticmethod
+    def _signature(st):
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def load(self, path, default=None, copy=False):
+        """
+        Devolver el contenido parseado de `path`.
+
+        Si el fichero no existe se devuelve `default` (sin crearlo).
+        Con copy=True se devuelve una copia profunda que el llamante puede modificar.
+        """
+        key = self._key(path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return default
+
+        signature = self._signature(st)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                data = entry[1]
+                return deepcopy(data) if copy else data
+            self.misses += 1
+
+        with open(key, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        with self._lock:
+            self._entries[key] = (signature, data)
+        return deepcopy(data) if copy else data
+
+    def write(self, path, data, indent=2):
+        """
+        Escribir `data` de forma atómica y actualizar la caché.
+
+        Se escribe en un temporal del mismo directorio y se renombra encima
+        del destino: un corte de luz nunca deja un JSON a medias en la SD.
+        """
+        key = self._key(path)
+        directory = os.path.dirname(key)
+        os.makedirs(directory, exist_ok=True)
+
+        try:
+            mode = os.stat(key).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(key), suffix='.tmp')
+        try:
+            # mkstemp crea el temporal con 0600: conservar los permisos del original
+            if hasattr(os, 'fchmod'):  # No disponible en Windows
+                os.fchmod(fd, mode)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, key)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # Guardar una copia: el llamante puede seguir modificando su objeto
+        signature = self._signature(os.stat(key))
+        with self._lock:
+            self._entries[key] = (signature, deepcopy(data))
+
+    def invalidate(self, path=None):
+        """Olvidar un fichero (o toda la caché si path es None)"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(path), None)
+
+    def stats(self):
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+# Instancia compartida por el servidor y los módulos del generador
+json_cache = JSONFileCache()
@@ -2,19 +2,51 @@
 Latent Space Engine (Fase 18)
 Motor de interpolación vectorial entre géneros musicales.
 Permite crear híbridos únicos mezclando parámetros de múltiples estilos.
+
+Los géneros son filas de una matriz NumPy (géneros x features): los cuatro
+parámetros escalares y un peso de preferencia por cada sample del vocabulario
+(samples_v2.json). Una mezcla es un producto vector x matriz; un barrido de N
+pasos o la búsqueda del género más cercano, una sola operación matricial.
+
+Los vectores iniciales (a mano para siete géneros, neutros para el resto) se
+corrigen con los perfiles aprendidos del corpus categorizado (genre_profiles):
+se leen de la caché en disco, así que no hay coste en el arranque.
 """
 import json
 import os
 import logging
 
+import numpy as np
+
+from genre_profiles import PROFILES_FILE, GenreProfiles
+
 logger = logging.getLogger(__name__)
 
+# Columnas escalares de la matriz (las siguientes son los samples del vocabulario)
+SCALAR_FEATURES = ["density_base", "complexity_base", "tempo_preference", "rhythmic_weight"]
+
+TEMPO = SCALAR_FEATURES.index("tempo_preference")
+
+# Peso mínimo en la mezcla para que un sample aparezca en preferred_samples
+SAMPLE_CUTOFF = 0.1
+
+# Mezclas de hasta SMALL_BLEND géneros (las de la UI): suma en Python sobre las
+# columnas no nulas de cada fila, sin el coste fijo de NumPy por llamada
+SMALL_BLEND = 3
+
+# Con PROFILE_PRIOR patrones el perfil aprendido pesa lo mismo que el vector a
+# mano; frente a los valores neutros de un género custom basta un patrón
+PROFILE_PRIOR = 20
+
 class LatentEngine:
-    def __init__(self, rules_file='theory_rules.json'):
+    def __init__(self, rules_file='theory_rules.json', samples_file='samples_v2.json', profiles_file=PROFILES_FILE):
         self.rules_file = os.path.join(os.path.dirname(__file__), rules_file)
+        self.samples_file = os.path.join(os.path.dirname(__file__), samples_file)
         self.available_genres = self._load_genres()
-        self.genre_vectors = self._init_vectors()
-        logger.info(f"Latent Engine initialized with {len(self.available_genres)} genres")
+        self.profiles = self._load_profiles(profiles_file)
+        self._build_matrix(self._init_vectors())
+        logger.info(f"Latent Engine initialized with {len(self.available_genres)} genres "
+                    f"({self.matrix.shape[1]} features)")
     
     def _load_genres(self):
         """Lee los géneros disponibles desde theory_rules.json"""
@@ -28,10 +60,34 @@ class LatentEngine:
                 return []
         return []
     
+    def _load_profiles(self, profiles_file):
+        """Vectores aprendidos del corpus ({} sin caché: aún no se ha re-entrenado)"""
+        if not profiles_file or not os.path.exists(profiles_file):
+            return {}
+        try:
+            return GenreProfiles(profiles_file).vectors()
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading genre profiles: {e}")
+            return {}
+    
+    def _load_sample_vocabulary(self):
+        """Todos los samples de samples_v2.json, en orden de categoría"""
+        try:
+            with open(self.samples_file, 'r') as f:
+                categories = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading sample vocabulary: {e}")
+            return []
+        vocabulary = []
+        for samples in categories.values():
+            vocabulary.extend(samples)
+        return list(dict.fromkeys(vocabulary))
+    
     def _init_vectors(self):
         """
         Define vectores de parámetros para cada género conocido.
-        Estos son los "embeddings" que se interpolarán.
+        Estos son los "embeddings" que se interpolarán: los valores a mano (o
+        neutros) corregidos con el perfil del corpus de cada género.
         """
         # Parámetros base por género (ajustables)
         base_vectors = {
@@ -89,21 +145,151 @@ class LatentEngine:
         # Crear vectores solo para géneros que existen en theory_rules.json
         vectors = {}
         for genre in self.available_genres:
+            learned = self.profiles.get(genre)
             if genre in base_vectors:
-                vectors[genre] = base_vectors[genre]
+                vectors[genre] = self._learned_vector(base_vectors[genre], learned, PROFILE_PRIOR)
             else:
-                # Género custom: usar valores neutros
-                vectors[genre] = {
+                # Género custom: valores neutros, sustituidos casi por completo por el perfil si lo hay
+                neutral = {
                     "density_base": 0.5,
                     "complexity_base": 0.5,
                     "tempo_preference": 120,
                     "preferred_samples": [],
                     "rhythmic_weight": 0.5
                 }
-                logger.warning(f"Genre '{genre}' not in base vectors, using defaults")
+                vectors[genre] = self._learned_vector(neutral, learned, 1)
+                if not learned:
+                    logger.warning(f"Genre '{genre}' not in base vectors or corpus profiles, using defaults")
         
         return vectors
     
+    @staticmethod
+    def _learned_vector(prior, learned, prior_strength):
+        """
+        Media de un vector inicial y el perfil del corpus, con peso
+        n / (n + prior_strength) para el perfil (n = patrones del género).
+        El tempo no se aprende: se mantiene el del vector inicial.
+        """
+        if not learned:
+            return prior
+        alpha = learned["patterns"] / (learned["patterns"] + prior_strength)
+        preferred = prior["preferred_samples"]
+        weights = {s: (1 - alpha) * (1.0 - rank / len(preferred)) for rank, s in enumerate(preferred)}
+        for sample, weight in learned["sample_weights"].items():
+            weights[sample] = weights.get(sample, 0.0) + alpha * weight
+        vector = {f: (1 - alpha) * prior[f] + alpha * learned[f]
+                  for f in ("density_base", "complexity_base", "rhythmic_weight")}
+        vector["tempo_preference"] = prior["tempo_preference"]
+        vector["preferred_samples"] = sorted(weights, key=weights.get, reverse=True)
+        vector["sample_weights"] = weights
+        return vector
+    
+    def _build_matrix(self, vectors):
+        """
+        Construir la matriz géneros x features a partir de {género: vector dict}.
+        
+        Los preferred_samples de cada género se convierten en pesos sobre todo el
+        vocabulario, decrecientes con la posición en la lista (1, 1-1/n, ...),
+        salvo que el vector traiga ya sus sample_weights (perfiles del corpus).
+        """
+        vocabulary = self._load_sample_vocabulary()
+        for vec in vectors.values():
+            vocabulary.extend(s for s in vec["preferred_samples"] if s not in vocabulary)
+        
+        self.genres = list(vectors)
+        self.genre_index = {genre: i for i, genre in enumerate(self.genres)}
+        self.samples = vocabulary
+        self.sample_index = {sample: i for i, sample in enumerate(vocabulary)}
+        self.features = SCALAR_FEATURES + [f"sample:{s}" for s in vocabulary]
+        
+        offset = len(SCALAR_FEATURES)
+        matrix = np.zeros((len(self.genres), len(self.features)))
+        for row, genre in enumerate(self.genres):
+            vec = vectors[genre]
+            matrix[row, :offset] = [vec[f] for f in SCALAR_FEATURES]
+            preferred = vec["preferred_samples"]
+            weights = vec.get("sample_weights") or {s: 1.0 - rank / len(preferred) for rank, s in enumerate(preferred)}
+            for sample, weight in weights.items():
+                matrix[row, offset + self.sample_index[sample]] = weight
+        self.matrix = matrix
+        
+        # Filas dispersas para las mezclas pequeñas: escalares y {columna: peso} no nulos
+        self._sparse_rows = [(row[:offset].tolist(), {i: w for i, w in enumerate(row[offset:].tolist()) if w})
+                             for row in matrix]
+        
+        # Escala por columna para distancias (el tempo no debe dominar sobre 0-1)
+        spread = matrix.std(axis=0)
+        self._scale = np.where(spread > 0, spread, 1.0)
+    
+    @property
+    def genre_vectors(self):
+        """Vista {género: parámetros} de la matriz (formato de /api/latent/genres)"""
+        return dict(zip(self.genres, self._params_rows(self.matrix)))
+    
+    def _params(self, vector):
+        """Fila de la matriz (o mezcla) -> dict de parámetros del generador"""
+        return self._params_rows(vector[None, :])[0]
+    
+    def _params_rows(self, vectors):
+        """
+        Varias filas a la vez (barridos): solo se ordenan en Python las columnas
+        de sample que superan SAMPLE_CUTOFF en alguna fila, que son pocas.
+        """
+        offset = len(SCALAR_FEATURES)
+        columns = np.flatnonzero((vectors[:, offset:] >= SAMPLE_CUTOFF).any(axis=0))
+        names = [self.samples[i] for i in columns]
+        results = []
+        for scalars, weights in zip(vectors[:, :offset].tolist(), vectors[:, offset + columns].tolist()):
+            ranked = sorted((w, -i) for i, w in enumerate(weights) if w >= SAMPLE_CUTOFF)
+            results.append({
+                "density_base": scalars[0],
+                "complexity_base": scalars[1],
+                "tempo_preference": int(scalars[2]),
+                "rhythmic_weight": scalars[3],
+                "preferred_samples": [names[-i] for _, i in reversed(ranked)]
+            })
+        return results
+    
+    def _normalize(self, blend_config):
+        """{género: peso} -> (pesos normalizados, [(fila, peso)] de los géneros conocidos)"""
+        total = sum(blend_config.values())
+        if total == 0:
+            return None, None
+        normalized = {k: v / total for k, v in blend_config.items()}
+        rows = [(self.genre_index[g], w) for g, w in normalized.items() if g in self.genre_index]
+        return normalized, rows
+    
+    def _weights(self, blend_config):
+        """{género: peso} -> vector de pesos normalizado (los géneros desconocidos no aportan)"""
+        normalized, rows = self._normalize(blend_config)
+        if normalized is None:
+            return None, None
+        weights = np.zeros(len(self.genres))
+        for index, weight in rows:
+            weights[index] = weight
+        return weights, normalized
+    
+    def _blend_rows(self, rows):
+        """Mezcla de pocas filas con _sparse_rows: mismo resultado que _params(weights @ matrix)"""
+        scalars = [0.0] * len(SCALAR_FEATURES)
+        tempo = 0
+        samples = {}
+        for index, weight in rows:
+            row_scalars, row_samples = self._sparse_rows[index]
+            for f, value in enumerate(row_scalars):
+                scalars[f] += value * weight
+            tempo += int(row_scalars[TEMPO] * weight)
+            for column, value in row_samples.items():
+                samples[column] = samples.get(column, 0.0) + value * weight
+        ranked = sorted((c for c, w in samples.items() if w >= SAMPLE_CUTOFF), key=lambda c: (-samples[c], c))
+        return {
+            "density_base": scalars[0],
+            "complexity_base": scalars[1],
+            "tempo_preference": tempo,
+            "rhythmic_weight": scalars[3],
+            "preferred_samples": [self.samples[c] for c in ranked]
+        }
+    
     def get_available_genres(self):
         """Retorna lista de géneros disponibles para mezclar"""
         return self.available_genres
@@ -113,84 +299,70 @@ class LatentEngine:
         Interpola entre dos géneros.
         weight_b: 0.0 = 100% A, 1.0 = 100% B
         """
-        if genre_a not in self.genre_vectors or genre_b not in self.genre_vectors:
+        if genre_a not in self.genre_index or genre_b not in self.genre_index:
             logger.error(f"Invalid genres for interpolation: {genre_a}, {genre_b}")
             return None
         
-        vec_a = self.genre_vectors[genre_a]
-        vec_b = self.genre_vectors[genre_b]
         weight_a = 1.0 - weight_b
-        
-        # Interpolación lineal de parámetros numéricos
-        result = {
-            "density_base": (vec_a["density_base"] * weight_a) + (vec_b["density_base"] * weight_b),
-            "complexity_base": (vec_a["complexity_base"] * weight_a) + (vec_b["complexity_base"] * weight_b),
-            "tempo_preference": int((vec_a["tempo_preference"] * weight_a) + (vec_b["tempo_preference"] * weight_b)),
-            "rhythmic_weight": (vec_a["rhythmic_weight"] * weight_a) + (vec_b["rhythmic_weight"] * weight_b),
-            "blend_info": {
-                "genre_a": genre_a,
-                "genre_b": genre_b,
-                "weight_a": weight_a,
-                "weight_b": weight_b
-            }
+        vector = weight_a * self.matrix[self.genre_index[genre_a]] + weight_b * self.matrix[self.genre_index[genre_b]]
+        result = self._params(vector)
+        result["blend_info"] = {
+            "genre_a": genre_a,
+            "genre_b": genre_b,
+            "weight_a": weight_a,
+            "weight_b": weight_b
         }
-        
-        # Mezclar samples (unión ponderada)
-        # Si weight_b > 0.5, priorizar samples de B
-        if weight_b > 0.5:
-            result["preferred_samples"] = vec_b["preferred_samples"] + vec_a["preferred_samples"][:2]
-        else:
-            result["preferred_samples"] = vec_a["preferred_samples"] + vec_b["preferred_samples"][:2]
-        
         return result
     
     def blend_multiple(self, blend_config):
         """
         Mezcla múltiples géneros con pesos arbitrarios.
         blend_config: {"techno": 0.5, "ambient": 0.3, "house": 0.2}
+        
+        El tempo de cada género se trunca a entero antes de sumar (como siempre
+        ha hecho la mezcla): {"house": 0.3, "breakbeat": 0.7} -> 37 + 94 = 131.
         """
-        # Normalizar pesos para que sumen 1.0
-        total = sum(blend_config.values())
-        if total == 0:
+        normalized, rows = self._normalize(blend_config)
+        if normalized is None:
             return None
         
-        normalized = {k: v/total for k, v in blend_config.items()}
-        
-        # Inicializar resultado
-        result = {
-            "density_base": 0.0,
-            "complexity_base": 0.0,
-            "tempo_preference": 0,
-            "rhythmic_weight": 0.0,
-            "preferred_samples": [],
-            "blend_info": normalized
-        }
-        
-        # Sumar contribuciones ponderadas
-        for genre, weight in normalized.items():
-            if genre not in self.genre_vectors:
-                continue
-            vec = self.genre_vectors[genre]
-            result["density_base"] += vec["density_base"] * weight
-            result["complexity_base"] += vec["complexity_base"] * weight
-            result["tempo_preference"] += int(vec["tempo_preference"] * weight)
-            result["rhythmic_weight"] += vec["rhythmic_weight"] * weight
-            
-            # Añadir samples según peso (más peso = más samples)
-            sample_count = max(1, int(len(vec["preferred_samples"]) * weight * 2))
-            result["preferred_samples"].extend(vec["preferred_samples"][:sample_count])
-        
-        # Eliminar duplicados de samples manteniendo orden
-        seen = set()
-        unique_samples = []
-        for s in result["preferred_samples"]:
-            if s not in seen:
-                seen.add(s)
-                unique_samples.append(s)
-        result["preferred_samples"] = unique_samples
-        
+        if len(rows) <= SMALL_BLEND:
+            result = self._blend_rows(rows)
+        else:
+            weights = np.zeros(len(self.genres))
+            for index, weight in rows:
+                weights[index] = weight
+            result = self._params(weights @ self.matrix)
+            result["tempo_preference"] = sum(int(self._sparse_rows[i][0][TEMPO] * w) for i, w in rows)
+        result["blend_info"] = normalized
         return result
     
+    def path(self, genre_a, genre_b, steps=16):
+        """
+        Trayectoria de A a B en `steps` pasos (automatización de morph): una
+        matriz de pesos (steps x 2) por las dos filas, en una sola operación.
+        """
+        if genre_a not in self.genre_index or genre_b not in self.genre_index:
+            return None
+        steps = max(2, int(steps))
+        t = np.linspace(0.0, 1.0, steps)[:, None]
+        rows = self.matrix[[self.genre_index[genre_a], self.genre_index[genre_b]]]
+        vectors = np.hstack([1.0 - t, t]) @ rows
+        return [dict(params, position=p) for params, p in zip(self._params_rows(vectors), t[:, 0].tolist())]
+    
+    def nearest(self, blend_config, k=3):
+        """
+        Géneros más cercanos a una mezcla: distancia euclídea a todas las filas
+        a la vez, con cada columna escalada por su desviación entre géneros.
+        """
+        weights, _ = self._weights(blend_config)
+        if weights is None:
+            return []
+        target = (weights @ self.matrix) / self._scale
+        distances = np.linalg.norm(self.matrix / self._scale - target, axis=1)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [{"genre": self.genres[i], "distance": float(distances[i])} for i in order]
+    
     def get_hybrid_params(self, blend_config):
         """
         Retorna parámetros finales para el generador basados en la mezcla.
@@ -6,11 +6,30 @@ Modelo de cadenas de Markov para generar patrones TidalCycles basados en ejemplo
 import random
 import json
 import os
-from collections import defaultdict
-from typing import List, Dict, Tuple
+import multiprocessing
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import List, Dict, Tuple, Callable, Iterable
 import re
 
 
+# Con MIX_PRIOR patrones un sub-modelo conserva la mitad de su peso de mezcla (ver mixture)
+MIX_PRIOR = 50
+
+# Tablas mezcladas en caché (una por combinación de pesos, p.ej. posiciones del slider de blend)
+MIX_CACHE_SIZE = 16
+
+# Estados por tabla mezclada (LRU): con MIX_CACHE_SIZE tablas, como mucho
+# MIX_CACHE_SIZE * MIX_TABLE_ROWS distribuciones en memoria
+MIX_TABLE_ROWS = 4096
+
+
+class GenerationCancelled(Exception):
+    """La generación se interrumpió a petición del cliente (stream cerrado o cancelado)"""
+
+
 class MarkovModel:
     """
     Modelo de Markov para generar patrones TidalCycles.
@@ -19,17 +38,35 @@ class MarkovModel:
     patrones basados en las probabilidades aprendidas.
     """
     
-    def __init__(self, order: int = 2):
+    def __init__(self, order: int = 2, pool: Dict = None):
         """
         Inicializar modelo.
         
         Args:
             order: Orden del modelo Markov (número de tokens de contexto)
+            pool: Tabla de internado compartida (la pasa el modelo global a sus sub-modelos)
         """
         self.order = order
         self.transitions = defaultdict(lambda: defaultdict(int))
         self.starts = []
         self.trained = False
+        # Sub-modelos por etiqueta ("genre:techno", "type:drums"). Comparten con
+        # el global un único pool de internado: cada tupla de estado existe una
+        # vez en memoria aunque aparezca en varios modelos
+        self.sub_models = {}
+        self._pool = pool if pool is not None else {}
+        self._mix_cache = OrderedDict()  # clave de pesos -> _MixedTable (LRU)
+        self._mix_lock = threading.Lock()
+    
+    def _intern(self, value):
+        return self._pool.setdefault(value, value)
+    
+    def sub_model(self, label: str) -> 'MarkovModel':
+        """Sub-modelo de una etiqueta (se crea vacío si no existe)"""
+        model = self.sub_models.get(label)
+        if model is None:
+            model = self.sub_models[label] = MarkovModel(order=self.order, pool=self._pool)
+        return model
     
     def tokenize(self, pattern: str) -> List[str]:
         """
@@ -49,35 +86,214 @@ class MarkovModel:
         
         return [t for t in tokens if t.strip()]
     
-    def train(self, patterns: List[str]):
+    def train(self, patterns: Iterable[str], workers: int = 1, shard_size: int = 2000) -> int:
         """
         Entrenar modelo con corpus de patrones.
         
         Args:
-            patterns: Lista de patrones TidalCycles
+            patterns: Patrones TidalCycles (lista o iterable, p.ej. corpus_reader.iter_corpus).
+                Un elemento (patrón, etiquetas) cuenta además en el sub-modelo de
+                cada etiqueta (ver corpus_reader.iter_labeled_corpus)
+            workers: Procesos para contar n-gramas en paralelo (1 = en este proceso).
+                Solo desde un proceso sin hilos ni estado propio, como scripts/retrain.py
+            shard_size: Patrones por shard en modo paralelo
+        
+        Returns:
+            Número de patrones leídos
         """
-        for pattern in patterns:
+        if workers > 1:
+            count = self._train_parallel(patterns, workers, shard_size)
+        else:
+            count = self._count(patterns)
+        
+        self.trained = True
+        for model in self.sub_models.values():
+            model.trained = True
+        self.clear_mix_cache()
+        print(f"Modelo entrenado con {count} patrones")
+        print(f"Estados únicos: {len(self.transitions)}")
+        if self.sub_models:
+            print(f"Sub-modelos: {', '.join(sorted(self.sub_models))}")
+        return count
+    
+    def _count(self, patterns: Iterable[str]) -> int:
+        """Sumar los n-gramas de `patterns` a las cuentas del modelo"""
+        count = 0
+        intern = self._pool.setdefault
+        for item in patterns:
+            pattern, labels = (item, ()) if isinstance(item, str) else item
+            count += 1
             tokens = self.tokenize(pattern)
             
             if len(tokens) < self.order + 1:
                 continue
             
-            # Guardar inicio
-            self.starts.append(tuple(tokens[:self.order]))
+            # Se internan los estados: la misma tupla sirve de clave en el global y en los sub-modelos
+            order = self.order
+            states = [tuple(tokens[i:i + order]) for i in range(len(tokens) - order)]
+            states = [intern(state, state) for state in states]
             
-            # Construir transiciones
-            for i in range(len(tokens) - self.order):
-                state = tuple(tokens[i:i + self.order])
-                next_token = tokens[i + self.order]
-                self.transitions[state][next_token] += 1
+            for model in (self, *map(self.sub_model, labels)) if labels else (self,):
+                # Guardar inicio
+                model.starts.append(states[0])
+                
+                # Construir transiciones
+                transitions = model.transitions
+                for i, state in enumerate(states):
+                    transitions[state][tokens[i + order]] += 1
         
-        self.trained = True
-        print(f"Modelo entrenado con {len(patterns)} patrones")
-        print(f"Estados únicos: {len(self.transitions)}")
+        return count
     
-    def generate(self, max_tokens: int = 50, temperature: float = 1.0) -> Dict:
+    def _train_parallel(self, patterns: Iterable[str], workers: int, shard_size: int) -> int:
+        """
+        Repartir el corpus en shards, contarlos en procesos worker y fusionar
+        las cuentas. Los shards se leen del iterable a medida que hay workers
+        libres (como mucho 2 por worker en vuelo) y se fusionan en orden, así
+        que el resultado es idéntico al entrenamiento en un solo proceso.
+        """
+        patterns = iter(patterns)
+        shards = iter(lambda: list(islice(patterns, shard_size)), [])
+        
+        first = next(shards, None)
+        second = next(shards, None)
+        if second is None:
+            # Corpus de un solo shard: no compensa arrancar procesos
+            return self._count(first or [])
+        
+        # Nunca fork: el proceso que entrena puede tener otros hilos vivos (el
+        # servidor) y un lock tomado en el momento del fork quedaría bloqueado
+        # en el worker. Con spawn/forkserver los workers reimportan __main__,
+        # así que el entrenamiento paralelo se lanza desde scripts/retrain.py
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        
+        count = 0
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for shard in chain((first, second), shards):
+                pending.append(pool.submit(_count_shard, self.order, shard))
+                if len(pending) >= workers * 2:
+                    count += self._merge_shard(pending.popleft().result())
+            while pending:
+                count += self._merge_shard(pending.popleft().result())
+        
+        return count
+    
+    def _merge_shard(self, shard) -> int:
+        count, transitions, starts, sub_models = shard
+        self.merge_counts(transitions, starts)
+        for label, (sub_transitions, sub_starts) in sub_models.items():
+            self.sub_model(label).merge_counts(sub_transitions, sub_starts)
+        return count
+    
+    def merge_counts(self, transitions: Dict, starts: List[Tuple]):
+        """Sumar cuentas de transiciones ({estado: {token: n}}) e inicios a este modelo"""
+        intern = self._intern
+        for state, next_tokens in transitions.items():
+            target = self.transitions[intern(state)]
+            for token, n in next_tokens.items():
+                target[intern(token)] += n
+        self.starts.extend(intern(start) for start in starts)
+        self.clear_mix_cache()
+    
+    def merge(self, other: 'MarkovModel') -> 'MarkovModel':
+        """
+        Fusionar otro modelo del mismo orden (p.ej. entrenado en otra máquina y
+        cargado con load()). Equivale a haber entrenado con ambos corpus.
+        """
+        if other.order != self.order:
+            raise ValueError(f"No se pueden fusionar modelos de orden {self.order} y {other.order}")
+        self.merge_counts(other.transitions, other.starts)
+        for label, sub in other.sub_models.items():
+            self.sub_model(label).merge(sub)
+        self.trained = self.trained or other.trained
+        return self
+    
+    def clear_mix_cache(self):
+        """Descartar las tablas mezcladas (las cuentas han cambiado)"""
+        with self._mix_lock:
+            self._mix_cache.clear()
+    
+    def mixed_table(self, mix: Dict[str, float] = None) -> '_MixedTable':
+        """
+        Tabla de distribuciones mezcladas para unos pesos. Los pesos se redondean
+        a 2 decimales: la misma posición del slider reutiliza la misma tabla.
+        """
+        key = tuple(sorted(
+            (label, round(weight, 2)) for label, weight in (mix or {}).items() if round(weight, 2) > 0
+        ))
+        with self._mix_lock:
+            table = self._mix_cache.get(key)
+            if table is not None:
+                self._mix_cache.move_to_end(key)
+                return table
+        
+        table = _MixedTable(self.mixture(dict(key)))
+        with self._mix_lock:
+            table = self._mix_cache.setdefault(key, table)
+            while len(self._mix_cache) > MIX_CACHE_SIZE:
+                self._mix_cache.popitem(last=False)
+        return table
+    
+    def mixture(self, weights: Dict[str, float] = None) -> List[Tuple[float, 'MarkovModel']]:
+        """
+        Componentes [(peso, modelo)] para muestrear con generate(mix=...).
+        
+        weights: {etiqueta: peso} de los sub-modelos; el modelo global recibe
+        el peso restante hasta 1. Las etiquetas sin sub-modelo se ignoran y un
+        sub-modelo con pocos patrones cede parte de su peso al global
+        (peso * n / (n + MIX_PRIOR)), para que dos ejemplos no dicten el estilo.
+        """
+        components = []
+        for label, weight in (weights or {}).items():
+            sub = self.sub_models.get(label)
+            if sub is None or not sub.starts or weight <= 0:
+                continue
+            n = len(sub.starts)
+            components.append((weight * n / (n + MIX_PRIOR), sub))
+        
+        remaining = 1.0 - sum(w for w, _ in components)
+        if remaining > 0 or not components:
+            components.insert(0, (max(remaining, 0.0) or 1.0, self))
+        return components
+    
+    @staticmethod
+    def _mixed_counts(components, state):
+        """Distribución {token: prob} del siguiente token mezclando los componentes que conocen `state`"""
+        if len(components) == 1:
+            next_tokens = components[0][1].transitions.get(state)
+            if not next_tokens:
+                return None
+            total = sum(next_tokens.values())
+            return {t: c / total for t, c in next_tokens.items()}
+        
+        mixed = {}
+        total_weight = 0.0
+        for weight, model in components:
+            next_tokens = model.transitions.get(state)
+            if not next_tokens:
+                continue
+            total = sum(next_tokens.values())
+            total_weight += weight
+            for token, count in next_tokens.items():
+                mixed[token] = mixed.get(token, 0.0) + weight * count / total
+        if not total_weight:
+            return None
+        return {t: p / total_weight for t, p in mixed.items()}
+    
+    def generate(self, max_tokens: int = 50, temperature: float = 1.0,
+                 on_token: Callable[[Dict], None] = None, cancel=None,
+                 mix: Dict[str, float] = None) -> Dict:
         """
         Generar nuevo patrón y devolver el proceso de 'pensamiento'.
+        
+        Args:
+            on_token: Callback opcional llamado con cada 'thought' en cuanto se muestrea
+            cancel: Evento opcional (threading.Event); si se activa se lanza GenerationCancelled
+            mix: Pesos de sub-modelos ({"genre:techno": 0.5, "type:drums": 0.3}); en
+                cada paso se mezclan sus distribuciones con la del modelo global.
+                La mezcla de cada estado se calcula una vez y queda en caché
+                (mixed_table), así que repetir los mismos pesos no la recalcula
         """
         if not self.trained:
             raise ValueError("Modelo no entrenado. Llama a train() primero.")
@@ -85,8 +301,15 @@ class MarkovModel:
         if not self.starts:
             return {"pattern": "", "thoughts": []}
         
-        # Comenzar con un estado inicial aleatorio
-        current_state = list(random.choice(self.starts))
+        table = self.mixed_table(mix)
+        components = table.components
+        
+        # Comenzar con un estado inicial aleatorio (del componente elegido por peso)
+        if len(components) == 1:
+            starts = components[0][1].starts
+        else:
+            starts = random.choices([m for _, m in components], weights=[w for w, _ in components])[0].starts
+        current_state = list(random.choice(starts))
         result = list(current_state)
         thoughts = []
         
@@ -96,33 +319,28 @@ class MarkovModel:
             "prob": 1.0,
             "alternatives": []
         })
+        if on_token:
+            on_token(thoughts[-1])
         
         for _ in range(max_tokens - self.order):
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            
             state_tuple = tuple(current_state[-self.order:])
             
-            if state_tuple not in self.transitions:
+            # Obtener posibles siguientes tokens (distribución mezclada, en caché)
+            row = table.row(state_tuple)
+            if not row:
                 break
-            
-            # Obtener posibles siguientes tokens
-            next_tokens = self.transitions[state_tuple]
+            choices, probs = row
             
             # Aplicar temperatura y calcular probabilidades
-            total = sum(next_tokens.values())
-            choices = list(next_tokens.keys())
-            
-            # Calcular distribución original (para visualización)
-            original_probs = {t: (next_tokens[t] / total) for t in choices}
-            
             if temperature != 1.0:
-                adjusted = {}
-                for token, count in next_tokens.items():
-                    prob = count / total
-                    adjusted[token] = prob ** (1.0 / temperature)
-                
-                total_adjusted = sum(adjusted.values())
-                weights = [adjusted[c] / total_adjusted for c in choices]
+                adjusted = [prob ** (1.0 / temperature) for prob in probs]
+                total_adjusted = sum(adjusted)
+                weights = [a / total_adjusted for a in adjusted]
             else:
-                weights = [next_tokens[c] / total for c in choices]
+                weights = probs
             
             # Seleccionar siguiente token
             next_token = random.choices(choices, weights=weights)[0]
@@ -136,6 +354,8 @@ class MarkovModel:
                     key=lambda x: x["prob"], reverse=True
                 )[:3] # Top 3 alternativas
             })
+            if on_token:
+                on_token(thoughts[-1])
             
             result.append(next_token)
             current_state.append(next_token)
@@ -170,15 +390,31 @@ class MarkovModel:
         
         return ''.join(result)
     
-    def save(self, filepath: str):
-        """Guardar modelo a archivo JSON"""
-        data = {
-            'order': self.order,
+    def _to_data(self) -> Dict:
+        return {
             'transitions': {
                 str(k): dict(v) for k, v in self.transitions.items()
             },
             'starts': [list(s) for s in self.starts]
         }
+    
+    def _from_data(self, data: Dict):
+        intern = self._intern
+        self.starts = [intern(tuple(intern(t) for t in s)) for s in data['starts']]
+        
+        # Reconstruir transitions
+        self.transitions = defaultdict(lambda: defaultdict(int))
+        for state_str, next_tokens in data['transitions'].items():
+            state = intern(tuple(intern(t) for t in eval(state_str)))  # Convertir string a tuple
+            for token, count in next_tokens.items():
+                self.transitions[state][intern(token)] = count
+        self.trained = True
+    
+    def save(self, filepath: str):
+        """Guardar modelo a archivo JSON"""
+        data = {'order': self.order, **self._to_data()}
+        if self.sub_models:
+            data['sub_models'] = {label: sub._to_data() for label, sub in self.sub_models.items()}
         
         with open(filepath, 'w') as f:
             json.dump(data, f, indent=2)
@@ -191,16 +427,15 @@ class MarkovModel:
             data = json.load(f)
         
         self.order = data['order']
-        self.starts = [tuple(s) for s in data['starts']]
+        self._pool = {}
+        self._from_data(data)
+        self.clear_mix_cache()
         
-        # Reconstruir transitions
-        self.transitions = defaultdict(lambda: defaultdict(int))
-        for state_str, next_tokens in data['transitions'].items():
-            state = eval(state_str)  # Convertir string a tuple
-            for token, count in next_tokens.items():
-                self.transitions[state][token] = count
+        # Sub-modelos (ausentes en modelos guardados antes de existir)
+        self.sub_models = {}
+        for label, sub_data in data.get('sub_models', {}).items():
+            self.sub_model(label)._from_data(sub_data)
         
-        self.trained = True
         print(f"Modelo cargado desde {filepath}")
 
     def to_graph_json(self, limit=100):
@@ -258,6 +493,48 @@ class MarkovModel:
         }
 
 
+class _MixedTable:
+    """
+    Distribuciones del siguiente token para una mezcla de componentes,
+    calculadas la primera vez que se visita cada estado. Guarda como mucho
+    MIX_TABLE_ROWS estados (se descartan los menos usados).
+    """
+    __slots__ = ('components', 'rows', '_lock')
+    
+    def __init__(self, components: List[Tuple[float, MarkovModel]]):
+        self.components = components
+        self.rows = OrderedDict()  # estado -> (tokens, probabilidades) o () si ningún componente lo conoce
+        self._lock = threading.Lock()
+    
+    def row(self, state: Tuple):
+        with self._lock:
+            row = self.rows.get(state)
+            if row is not None:
+                self.rows.move_to_end(state)
+                return row
+        
+        # Fuera del lock: dos hilos pueden calcular el mismo estado, con el mismo resultado
+        probs = MarkovModel._mixed_counts(self.components, state)
+        row = (list(probs), list(probs.values())) if probs else ()
+        with self._lock:
+            self.rows[state] = row
+            while len(self.rows) > MIX_TABLE_ROWS:
+                self.rows.popitem(last=False)
+        return row
+
+
+def _plain_counts(model: MarkovModel):
+    return {state: dict(next_tokens) for state, next_tokens in model.transitions.items()}, model.starts
+
+
+def _count_shard(order: int, patterns: List):
+    """Contar n-gramas de un shard en un proceso worker (devuelve tipos simples, picklables)"""
+    model = MarkovModel(order=order)
+    count = model._count(patterns)
+    sub_models = {label: _plain_counts(sub) for label, sub in model.sub_models.items()}
+    return (count, *_plain_counts(model), sub_models)
+
+
 # Corpus personalizado - Basado en samples REALES del usuario
 # Todos estos samples están verificados como instalados
 EXAMPLE_CORPUS = [
@@ -0,0 +1,211 @@
+"""
+TidalAI Companion - Metrics
+Instrumentación ligera: contadores, histogramas de latencia y spans por etapa,
+expuestos en formato de texto de Prometheus.
+
+Desactivable con TIDALAI_METRICS=0: entonces inc/observe/span no hacen nada
+(un return inmediato) y /metrics devuelve un documento vacío.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Buckets de latencia (segundos): de 0.1 ms (etapas) a 10 s (rutas lentas en la Pi)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # No acumulados: se acumulan al exportar
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullSpan:
+    """Span que no mide nada (métricas desactivadas)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas de proceso (el servidor corre con un solo worker).
+
+    Las etiquetas se pasan como kwargs: metrics.inc('x_total', route='/api/generate').
+    Mantener su cardinalidad baja (rutas de url_map, no URLs con parámetros).
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._help = {}  # nombre -> (tipo, descripción)
+        self._counters = {}  # nombre -> {etiquetas: valor}
+        self._histograms = {}  # nombre -> {etiquetas: _Histogram}
+        self._buckets = {}  # nombre -> buckets
+        self._gauges = {}  # nombre -> función que devuelve valor o {etiquetas: valor}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items())) if labels else ()
+
+    # --- Declaración (opcional: solo aporta HELP/TYPE) ---
+
+    def counter(self, name, description):
+        self._help[name] = ('counter', description)
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        self._help[name] = ('histogram', description)
+        self._buckets[name] = tuple(buckets)
+
+    def gauge(self, name, description, collect, kind='gauge'):
+        """
+        Serie calculada al exportar: collect() devuelve un número o
+        {tupla de (etiqueta, valor): número}. kind='counter' para contadores
+        que ya lleva otro objeto (p.ej. los aciertos de una caché).
+        """
+        self._help[name] = (kind, description)
+        self._gauges[name] = collect
+
+    # --- Registro ---
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            hist.observe(value)
+
+    def span(self, name, **labels):
+        """Context manager que observa la duración del bloque en el histograma `name`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- Exportación ---
+
+    @staticmethod
+    def _format_labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    @staticmethod
+    def _format_value(value):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(float(value)) if isinstance(value, float) else str(value)
+
+    def render(self):
+        """Documento en formato de texto de Prometheus (text/plain; version=0.0.4)"""
+        if not self.enabled:
+            return ''
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+        gauges = {}
+        for name, collect in self._gauges.items():
+            try:
+                value = collect()
+            except Exception:
+                continue  # Una fuente rota no debe tumbar /metrics
+            gauges[name] = value if isinstance(value, dict) else {(): value}
+
+        lines = []
+
+        def header(name, kind):
+            description = self._help.get(name, (kind, ''))[1]
+            if description:
+                lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for name in sorted(counters):
+            header(name, 'counter')
+            for key, value in sorted(counters[name].items()):
+                lines.append(f'{name}{self._format_labels(key)} {self._format_value(value)}')
+
+        for name in sorted(gauges):
+            header(name, self._help[name][0])
+            for key, value in sorted(gauges[name].items()):
+                lines.append(f'{name}{self._format_labels(key)} {self._format_value(value)}')
+
+        for name in sorted(histograms):
+            header(name, 'histogram')
+            for key, (buckets, counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{self._format_labels(key, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_bucket{self._format_labels(key, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{self._format_labels(key)} {self._format_value(total)}')
+                lines.append(f'{name}_count{self._format_labels(key)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Instancia compartida por el servidor y los módulos del generador
+metrics = MetricsRegistry(enabled=os.environ.get('TIDALAI_METRICS', '1') != '0')
+
+metrics.histogram('tidalai_http_request_duration_seconds', 'Latencia de las peticiones HTTP por ruta')
+metrics.counter('tidalai_http_requests_total', 'Peticiones HTTP por ruta, método y código')
+metrics.histogram('tidalai_generation_stage_seconds', 'Duración de cada etapa del pipeline de generación')
+metrics.counter('tidalai_generation_retries_total', 'Reintentos por violaciones de teoría musical')
+metrics.counter('tidalai_osc_messages_total', 'Mensajes OSC enviados por dirección y resultado')
@@ -2,12 +2,109 @@
 TidalAI Companion - Oracle Engine
 Mapeador semántico que traduce intenciones en parámetros técnicos de TidalCycles.
 Optimizado para ejecución ligera en Raspberry Pi.
+
+El léxico (más las entradas de oracle_lexicon.json) se compila en un trie de
+palabras: las frases de varias palabras ("más oscuro", "drum and bass") ganan
+a sus palabras sueltas y los acentos no cuentan ("mas", "caotico"). Un texto se
+interpreta en una sola pasada y el resultado queda en caché.
+
+Las palabras desconocidas se corrigen con un índice de bigramas de caracteres
+sobre el vocabulario del léxico ("agresibo" -> "agresivo", "spacey" -> "space"):
+solo se puntúan las entradas que comparten algún bigrama con la palabra.
 """
 
+import logging
+import os
 import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import chain
+
+from json_cache import json_cache
+
+logger = logging.getLogger(__name__)
+
+LEXICON_FILE = os.path.join(os.path.dirname(__file__), 'oracle_lexicon.json')
+
+# Intenciones interpretadas en caché (las del directo se repiten mucho)
+INTERPRET_CACHE_SIZE = 256
+
+# Segundos entre comprobaciones de cambios en oracle_lexicon.json
+LEXICON_CHECK_INTERVAL = 1.0
+
+# Similitud mínima (Dice sobre bigramas) para aceptar una corrección, y
+# longitud mínima de palabra a corregir (las cortas dan falsos positivos)
+FUZZY_THRESHOLD = 0.7
+FUZZY_MIN_LENGTH = 4
+
+_WORD_RE = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=4096)
+def fold_word(word):
+    """Palabra en minúsculas y sin acentos ("Caótico" -> "caotico")"""
+    word = word.lower()
+    if word.isascii():
+        return word
+    return ''.join(c for c in unicodedata.normalize('NFD', word) if not unicodedata.combining(c))
+
+
+def phrase_key(phrase):
+    """Tupla de palabras normalizadas de una frase del léxico"""
+    return tuple(fold_word(w) for w in _WORD_RE.findall(phrase))
+
+
+def bigrams(word):
+    """Bigramas de caracteres con marcas de inicio y fin ("^a", "ag", ..., "o$")"""
+    padded = f"^{word}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class NGramIndex:
+    """
+    Índice invertido bigrama -> palabras. Una búsqueda recorre solo las listas
+    de los bigramas de la consulta, no todo el vocabulario.
+    """
+    
+    def __init__(self, words):
+        self.words = sorted(set(words))
+        self.sizes = []
+        self.postings = {}
+        for word_id, word in enumerate(self.words):
+            grams = bigrams(word)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(word_id)
+        # Memorizado por índice: se descarta con él al recompilar el léxico
+        self.correct = lru_cache(maxsize=4096)(self._correct)
+    
+    def search(self, word, limit=3, threshold=0.0):
+        """[(palabra, puntuación)] de más a menos parecida (coeficiente de Dice)"""
+        grams = bigrams(word)
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+        # Con c bigramas comunes la puntuación no pasa de 2c / (len(grams) + c)
+        min_shared = threshold * len(grams) / (2 - threshold)
+        scored = []
+        for word_id, count in shared.items():
+            if count < min_shared:
+                continue
+            score = 2 * count / (len(grams) + self.sizes[word_id])
+            if score >= threshold:
+                scored.append((score, self.words[word_id]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(w, round(score, 3)) for score, w in scored[:limit]]
+    
+    def _correct(self, word):
+        """Mejor entrada por encima de FUZZY_THRESHOLD, o None"""
+        best = self.search(word, limit=1, threshold=FUZZY_THRESHOLD)
+        return best[0][0] if best else None
+
 
 class OracleEngine:
-    def __init__(self):
+    def __init__(self, lexicon_file=LEXICON_FILE):
         # Diccionario maestro de intenciones
         # Cada entrada contiene descriptores y sus efectos en los parámetros
         self.lexicon = {
@@ -45,44 +142,172 @@ class OracleEngine:
             "fast": "agresivo", "slow": "relajado", "deep": "dub", "industrial": "industrial",
             "hazlo": None, "pone": None, "quiero": None, "algo": None, "sonido": None
         }
-
+        
+        self.lexicon_file = lexicon_file
+        self._user_data = None  # Objeto de json_cache con el que se compiló el trie
+        self._compiled = None  # (trie, índice de bigramas, palabras conocidas)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # texto -> resultado (LRU)
+        self._user_data = self._load_user_data()
+        self._checked_at = time.monotonic()
+        self._compile(self._user_data)
+    
+    def _load_user_data(self):
+        """
+        Entradas de usuario de oracle_lexicon.json: {"lexicon": {...}, "synonyms": {...}}.
+        None si no hay fichero; con un JSON inválido se sigue con el último válido.
+        """
+        if not self.lexicon_file:
+            return None
+        try:
+            return json_cache.load(self.lexicon_file)
+        except ValueError as e:
+            logger.error(f"Invalid oracle lexicon {self.lexicon_file}: {e}")
+            return self._user_data
+    
+    def _compile(self, user_data):
+        """
+        Trie de palabras con el léxico base y el de usuario (que manda). Cada
+        nodo es {palabra: nodo}; la intención de una frase completa cuelga de
+        la clave None del nodo final.
+        """
+        user_data = user_data if isinstance(user_data, dict) else {}
+        lexicon = {**self.lexicon, **user_data.get('lexicon', {})}
+        synonyms = {**self.synonyms, **user_data.get('synonyms', {})}
+        
+        phrases = {phrase_key(key): intent for key, intent in lexicon.items()}
+        for synonym, target in synonyms.items():
+            intent = lexicon.get(target) if target else None
+            key = phrase_key(synonym)
+            if intent and key not in phrases:
+                phrases[key] = intent
+        
+        # Palabras de relleno ("quiero", "algo"): ni intención ni corrección
+        ignored = {key for synonym, target in synonyms.items() if not target for key in phrase_key(synonym)}
+        
+        trie = {}
+        for words, intent in phrases.items():
+            if not words or not isinstance(intent, dict):
+                continue
+            node = trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[None] = intent
+        
+        vocabulary = {word for words in phrases for word in words}
+        self._compiled = (trie, NGramIndex(vocabulary), vocabulary | ignored)
+        self._cache.clear()
+    
+    def _current_lexicon(self):
+        """Léxico compilado al día con oracle_lexicon.json (json_cache solo relee si cambió)"""
+        now = time.monotonic()
+        if now - self._checked_at < LEXICON_CHECK_INTERVAL:
+            return self._compiled
+        self._checked_at = now
+        user_data = self._load_user_data()
+        if user_data is not self._user_data:
+            with self._lock:
+                if user_data is not self._user_data:
+                    self._compile(user_data)
+                    self._user_data = user_data
+        return self._compiled
+    
+    def fuzzy_matches(self, word, limit=3):
+        """Entradas del vocabulario más parecidas a `word`: [{"key", "score"}]"""
+        _, index, _ = self._current_lexicon()
+        return [{"key": key, "score": score} for key, score in index.search(fold_word(word), limit)]
+    
+    def _matches(self, compiled, text):
+        """
+        [(frase tal como se escribió, intención, correcciones)] en orden,
+        coincidencia más larga primero: una sola pasada por las palabras del
+        texto. Las palabras desconocidas se sustituyen antes por su entrada
+        más parecida del vocabulario, si supera FUZZY_THRESHOLD.
+        """
+        trie, index, known = compiled
+        words = _WORD_RE.findall(text.lower())
+        keys = [fold_word(w) for w in words]
+        fixed = {}  # posición -> palabra del vocabulario
+        for i, key in enumerate(keys):
+            if key not in known and len(key) >= FUZZY_MIN_LENGTH and not key.isdigit():
+                best = index.correct(key)
+                if best:
+                    keys[i] = fixed[i] = best
+        
+        matches = []
+        i, count = 0, len(keys)
+        while i < count:
+            node = trie.get(keys[i])
+            if node is None:
+                i += 1
+                continue
+            end, intent = (i + 1, node[None]) if None in node else (i, None)
+            j = i + 1
+            while j < count and keys[j] in node:
+                node = node[keys[j]]
+                j += 1
+                if None in node:
+                    end, intent = j, node[None]
+            if intent is None:
+                i += 1
+                continue
+            corrections = {words[k]: fixed[k] for k in range(i, end) if k in fixed}
+            matches.append((' '.join(words[i:end]), intent, corrections))
+            i = end
+        return matches
+    
     def interpret(self, text):
         """Traduce un texto en un objeto de parámetros técnicos"""
-        text = text.lower()
-        words = re.findall(r'\b\w+\b', text)
+        compiled = self._current_lexicon()
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+        if cached is None:
+            cached = self._interpret(compiled, text)
+            with self._lock:
+                self._cache[text] = cached
+                if len(self._cache) > INTERPRET_CACHE_SIZE:
+                    self._cache.popitem(last=False)
         
+        # Copia: el llamante puede modificar las listas
+        return dict(cached, extra_tokens=list(cached["extra_tokens"]),
+                    detected_keywords=list(cached["detected_keywords"]),
+                    corrections=dict(cached["corrections"]))
+    
+    def _interpret(self, compiled, text):
         result = {
             "density_offset": 0.0,
             "complexity_offset": 0.0,
             "extra_tokens": [],
             "style_pref": None,
             "tempo_mod": 0,
-            "detected_keywords": []
+            "detected_keywords": [],
+            "corrections": {}  # palabra escrita -> entrada del léxico (coincidencia aproximada)
         }
         
+        # Los multiplicadores de dinámica afectan a todo el texto, estén donde
+        # estén: se suman los offsets y se multiplican al final
         multiplier = 1.0
-        
-        # Primero procesamos multiplicadores de dinámica
-        for word in words:
-            intent = self.lexicon.get(word) or self.lexicon.get(self.synonyms.get(word))
-            if intent and "multiplier" in intent:
+        multiplier_keywords = []
+        density = complexity = 0.0
+        for phrase, intent, corrections in self._matches(compiled, text):
+            result["corrections"].update(corrections)
+            if "multiplier" in intent:
                 multiplier *= intent["multiplier"]
-                result["detected_keywords"].append(word)
-
-        # Luego procesamos el resto de palabras
-        for word in words:
-            key = self.synonyms.get(word, word)
-            intent = self.lexicon.get(key)
+                multiplier_keywords.append(phrase)
+                continue
             
-            if intent:
-                if "multiplier" in intent: continue # Ya procesado
-                
-                result["detected_keywords"].append(word)
-                if "density" in intent: result["density_offset"] += intent["density"] * multiplier
-                if "complexity" in intent: result["complexity_offset"] += intent["complexity"] * multiplier
-                if "tokens" in intent: result["extra_tokens"].extend(intent["tokens"])
-                if "style_pref" in intent: result["style_pref"] = intent["style_pref"]
-                if "tempo_mod" in intent: result["tempo_mod"] += intent["tempo_mod"]
+            result["detected_keywords"].append(phrase)
+            if "density" in intent: density += intent["density"]
+            if "complexity" in intent: complexity += intent["complexity"]
+            if "tokens" in intent: result["extra_tokens"].extend(intent["tokens"])
+            if "style_pref" in intent: result["style_pref"] = intent["style_pref"]
+            if "tempo_mod" in intent: result["tempo_mod"] += intent["tempo_mod"]
+        
+        result["density_offset"] = density * multiplier
+        result["complexity_offset"] = complexity * multiplier
+        result["detected_keywords"] = multiplier_keywords + result["detected_keywords"]
 
         # Limitar offsets para no romper los sliders (0.0 a 1.0 suele ser el rango)
         # Aquí permitimos que el generador maneje los límites finales
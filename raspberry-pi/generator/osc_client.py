@@ -9,6 +9,8 @@ import logging
 from typing import Optional
 import time
 
+from metrics import metrics
+
 
 # Configurar logging
 logging.basicConfig(
@@ -70,10 +72,12 @@ class OSCClient:
         try:
             # Enviar mensaje OSC
             self.client.send_message("/tidal/pattern", [channel, pattern])
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/pattern', result='ok')
             logger.info(f"Patrón enviado a {channel}: {pattern[:50]}...")
             return True
             
         except Exception as e:
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/pattern', result='error')
             logger.error(f"Error enviando patrón: {e}")
             self.connected = False
             return False
@@ -98,10 +102,12 @@ class OSCClient:
         
         try:
             self.client.send_message("/tidal/param", [channel, param, value])
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/param', result='ok')
             logger.info(f"Parámetro enviado: {channel}.{param} = {value}")
             return True
             
         except Exception as e:
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/param', result='error')
             logger.error(f"Error enviando parámetro: {e}")
             self.connected = False
             return False
@@ -124,10 +130,12 @@ class OSCClient:
         
         try:
             self.client.send_message("/tidal/stop", [channel])
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/stop', result='ok')
             logger.info(f"Canal detenido: {channel}")
             return True
             
         except Exception as e:
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/stop', result='error')
             logger.error(f"Error deteniendo canal: {e}")
             self.connected = False
             return False
@@ -164,10 +172,12 @@ class OSCClient:
         
         try:
             self.client.send_message(address, list(args))
+            metrics.inc('tidalai_osc_messages_total', address='custom', result='ok')
             logger.info(f"Mensaje personalizado enviado: {address} {args}")
             return True
             
         except Exception as e:
+            metrics.inc('tidalai_osc_messages_total', address='custom', result='error')
             logger.error(f"Error enviando mensaje personalizado: {e}")
             self.connected = False
             return False
@@ -181,9 +191,11 @@ class OSCClient:
         """
         try:
             self.client.send_message("/tidal/ping", ["test"])
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/ping', result='ok')
             logger.info("Test de conexión enviado")
             return True
         except Exception as e:
+            metrics.inc('tidalai_osc_messages_total', address='/tidal/ping', result='error')
             logger.error(f"Test de conexión falló: {e}")
             return False
     
@@ -7,9 +7,10 @@ Incluye generación basada en reglas y modelo de IA (Markov Chains).
 import random
 import os
 import json
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Callable
 from enum import Enum
-from collections import defaultdict
+from collections import defaultdict, deque
 
 # Intentar importar modelo Markov (opcional)
 try:
@@ -19,6 +20,10 @@ except ImportError:
     MARKOV_AVAILABLE = False
     print("Markov model no disponible. Usando solo generación basada en reglas.")
 
+# Peso de los sub-modelos de género e instrumento al muestrear en modo IA
+# (el modelo global recibe el resto)
+AI_MIX_WEIGHTS = {'genre': 0.5, 'type': 0.3}
+
 
 class PatternType(Enum):
     """Tipos de patrones soportados"""
@@ -51,12 +56,14 @@ class PatternGenerator:
         self._init_pattern_library()
         
         # Fase 36: Memoria Musical
-        self.pattern_history = []
+        # Es el único estado que comparten las generaciones concurrentes: los
+        # pensamientos de cada llamada viajan en una lista propia (ver generate)
         self.max_history = 10
+        self.pattern_history = deque(maxlen=self.max_history)
+        self._history_lock = threading.Lock()
         
         # Cargar o crear modelo Markov si está disponible
         self.markov_model = None
-        self.rule_thoughts = [] # Para logging de lógica en tiempo real
         if MARKOV_AVAILABLE and use_ai:
             self._init_markov_model()
     
@@ -89,7 +96,7 @@ class PatternGenerator:
                 synths = data.get('synths', [])
                 if synths:
                     # Evitar duplicados
-                    self.melody_samples = list(set(self.melody_samples + synths))
+                    self.melody_samples = sorted(set(self.melody_samples + synths))  # Orden estable (reproducible con semilla)
                 
                 loaded_json = True
                 print(f"Librería de samples cargada desde {samples_path}")
@@ -196,17 +203,21 @@ class PatternGenerator:
         """Inicializar modelo Markov"""
         model_path = os.path.join(os.path.dirname(__file__), 'markov_model.json')
         
+        # Construir el modelo aparte y publicarlo al final: las generaciones en
+        # curso siguen usando el anterior, nunca uno a medio cargar
         if os.path.exists(model_path):
             # Cargar modelo existente
-            self.markov = MarkovModel()
-            self.markov.load(model_path)
+            markov = MarkovModel()
+            markov.load(model_path)
+            self.markov = markov
             print(f"Modelo Markov cargado desde {model_path}")
         else:
             # Crear y entrenar modelo nuevo con corpus por defecto
             from markov_model import EXAMPLE_CORPUS
-            self.markov = MarkovModel(order=2)
-            self.markov.train(EXAMPLE_CORPUS)
-            self.markov.save(model_path)
+            markov = MarkovModel(order=2)
+            markov.train(EXAMPLE_CORPUS)
+            markov.save(model_path)
+            self.markov = markov
             print(f"Modelo Markov creado y guardado en {model_path}")
     
     def generate(self,
@@ -218,9 +229,17 @@ class PatternGenerator:
                  use_ai: bool = None,
                  temperature: float = 1.0,
                  musical_friction: float = 0.2,
-                 intent_modifiers: Dict = None) -> Dict:
+                 intent_modifiers: Dict = None,
+                 on_thought: Callable[[Dict], None] = None,
+                 cancel=None,
+                 blend: Dict[str, float] = None) -> Dict:
         """
         Generar patrón TidalCycles. Devuelve dict con {"pattern": str, "thoughts": list}
+        
+        on_thought recibe cada 'thought' según se produce (token a token en modo IA);
+        cancel (threading.Event) permite abortar el muestreo con GenerationCancelled.
+        blend ({"techno": 0.7, "ambient": 0.3}) mezcla en modo IA los sub-modelos
+        de esos géneros token a token, en lugar del género de `style`.
         """
         
         # Aplicar modificadores de intención si existen
@@ -237,12 +256,15 @@ class PatternGenerator:
         # Si IA está disponible y habilitada, usarla (el generador IA podría recibir tokens extra)
         if should_use_ai and MARKOV_AVAILABLE and hasattr(self, 'markov'):
             # Inyectar tokens extra en el pensamiento si existen
-            result = self._generate_with_ai(temperature)
+            result = self._generate_with_ai(temperature, on_thought=on_thought, cancel=cancel,
+                                            style=style, pattern_type=pattern_type, blend=blend)
+            streamed = len(result["thoughts"])
             
             # --- FASE 36: CONTEXTUAL FRICTION ---
             # Si el patrón es idéntico o muy similar al anterior, forzar mutación
-            if self.pattern_history:
-                similarity = self._calculate_similarity(result["pattern"], self.pattern_history[-1])
+            previous = self._last_pattern()
+            if previous is not None:
+                similarity = self._calculate_similarity(result["pattern"], previous)
                 if similarity > 0.8:
                     mutation = self.mutate(result["pattern"], strength=0.6)
                     result["pattern"] = mutation["pattern"]
@@ -265,28 +287,32 @@ class PatternGenerator:
             
             # Post-procesar sintaxis (Fase 16: Asegurar espacio tras $)
             result["pattern"] = self._post_process_syntax(result["pattern"])
+            
+            # Pensamientos añadidos tras el muestreo (fricción, mods)
+            if on_thought:
+                for thought in result["thoughts"][streamed:]:
+                    on_thought(thought)
             return result
         
         # Sino, usar generación basada en reglas
-        self.rule_thoughts = [] # Limpiar para nueva generación
+        thoughts = []  # Propios de esta llamada: nada compartido entre peticiones
         density = max(0.0, min(1.0, density))
         complexity = max(0.0, min(1.0, complexity))
         
         pattern = ""
         if pattern_type == "drums":
-            pattern = self._generate_drums(density, complexity, style, musical_friction)
+            pattern = self._generate_drums(density, complexity, style, musical_friction, thoughts)
         elif pattern_type == "bass":
-            pattern = self._generate_bass(density, complexity, style, musical_friction)
+            pattern = self._generate_bass(density, complexity, style, musical_friction, thoughts)
         elif pattern_type == "melody":
-            pattern = self._generate_melody(density, complexity, style, musical_friction)
+            pattern = self._generate_melody(density, complexity, style, musical_friction, thoughts)
         elif pattern_type == "percussion":
-            pattern = self._generate_percussion(density, complexity, style, musical_friction)
+            pattern = self._generate_percussion(density, complexity, style, musical_friction, thoughts)
         elif pattern_type == "fx":
-            pattern = self._generate_fx(density, complexity, style, musical_friction)
+            pattern = self._generate_fx(density, complexity, style, musical_friction, thoughts)
         else:
             raise ValueError(f"Tipo de patrón no soportado: {pattern_type}")
-            
-        thoughts = self.rule_thoughts
+
         if intent_modifiers and intent_modifiers.get("extra_tokens"):
             for t in intent_modifiers["extra_tokens"]:
                 pattern += f" {t}"
@@ -295,10 +321,17 @@ class PatternGenerator:
         # Post-procesar sintaxis (Fase 16: Asegurar espacio tras $)
         pattern = self._post_process_syntax(pattern)
 
+        # Las reglas son instantáneas: publicar los pensamientos al final
+        if on_thought:
+            for thought in thoughts:
+                on_thought(thought)
+
         return {"pattern": pattern, "thoughts": thoughts}
     
-    def _generate_drums(self, density: float, complexity: float, style: str, friction: float = 0.2) -> str:
+    def _generate_drums(self, density: float, complexity: float, style: str, friction: float = 0.2,
+                        thoughts: List[Dict] = None) -> str:
         """Generar patrón de drums"""
+        thoughts = thoughts if thoughts is not None else []
         
         # Seleccionar samples según estilo
         if style == "techno":
@@ -330,7 +363,7 @@ class PatternGenerator:
                 elif target == 'snare': snare = swapped
                 else: hihat = swapped
                 
-                self.rule_thoughts.append({
+                thoughts.append({
                     "token": "FRICCIÓN", 
                     "prob": friction, 
                     "alternatives": [{"token": f"Swap {target} -> {swapped}", "prob": 1.0}]
@@ -341,7 +374,7 @@ class PatternGenerator:
         snare_density = int(1 + density * 3)  # 1-4 snares
         hihat_density = int(4 + density * 12)  # 4-16 hihats
 
-        self.rule_thoughts.append({
+        thoughts.append({
             "token": "REGLAS: DRUMS",
             "prob": 0.9,
             "alternatives": [
@@ -356,42 +389,44 @@ class PatternGenerator:
         if complexity < 0.3:
             # Patrón simple
             pattern = f'sound "{kick}*{kick_density} {snare}*{snare_density}"'
-            self.rule_thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Simple", "prob": 1.0}]})
+            thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Simple", "prob": 1.0}]})
         elif complexity < 0.7:
             # Patrón medio
             pattern = f'sound "{kick}*{kick_density} {snare}*{snare_density} {hihat}*{hihat_density}"'
-            self.rule_thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Estándar", "prob": 1.0}]})
+            thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Estándar", "prob": 1.0}]})
         else:
             # Patrón complejo con euclidean rhythms
             pattern = f'sound "{kick}({kick_density},{int(16*density)}) {snare}({snare_density},8) {hihat}*{hihat_density}"'
-            self.rule_thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Euclídea", "prob": 1.0}]})
+            thoughts.append({"token": "MODO", "prob": 1.0, "alternatives": [{"token": "Estructura Euclídea", "prob": 1.0}]})
         
         # Añadir efectos según complejidad
         effects = []
         if complexity > 0.4:
             effects.append(f"# speed {0.8 + random.random() * 0.4:.2f}")
-            self.rule_thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Variación Speed", "prob": complexity}]})
+            thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Variación Speed", "prob": complexity}]})
         if complexity > 0.6:
             effects.append(f"# room {random.random() * 0.3:.2f}")
-            self.rule_thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Reverb/Room", "prob": complexity}]})
+            thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Reverb/Room", "prob": complexity}]})
         if complexity > 0.8:
             effects.append(f"# gain {0.9 + random.random() * 0.2:.2f}")
-            self.rule_thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Compress/Gain", "prob": complexity}]})
+            thoughts.append({"token": "FX", "prob": 0.5, "alternatives": [{"token": "Compress/Gain", "prob": complexity}]})
         
         if effects:
             pattern += "\n  " + "\n  ".join(effects)
         
         return pattern
     
-    def _generate_bass(self, density: float, complexity: float, style: str, friction: float = 0.2) -> str:
+    def _generate_bass(self, density: float, complexity: float, style: str, friction: float = 0.2,
+                       thoughts: List[Dict] = None) -> str:
         """Generar patrón de bass"""
+        thoughts = thoughts if thoughts is not None else []
         
         sample = random.choice(self.bass_samples)
         
         # FRICCIÓN: Posibilidad de cambiar a un sample aleatorio de cualquier tipo
         if random.random() < friction:
             sample = random.choice(self.bass_samples + self.melody_samples)
-            self.rule_thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Swap bass -> {sample}", "prob": 1.0}]})
+            thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Swap bass -> {sample}", "prob": 1.0}]})
 
         # Generar secuencia de notas (MODIFICADO PARA SAMPLES: 0-15)
         # scale = self.scales['minor'] if style in ['techno', 'ambient'] else self.scales['major']
@@ -404,7 +439,7 @@ class PatternGenerator:
             note_index = random.choice([0, 1, 2, 3, 4, 5, 6, 7, 8]) 
             notes.append(f"{note_index}")
         
-        self.rule_thoughts.append({
+        thoughts.append({
             "token": "REGLAS: BASS",
             "prob": 0.85,
             "alternatives": [
@@ -424,15 +459,17 @@ class PatternGenerator:
         
         return pattern
     
-    def _generate_melody(self, density: float, complexity: float, style: str, friction: float = 0.2) -> str:
+    def _generate_melody(self, density: float, complexity: float, style: str, friction: float = 0.2,
+                         thoughts: List[Dict] = None) -> str:
         """Generar patrón melódico"""
+        thoughts = thoughts if thoughts is not None else []
         
         sample = random.choice(self.melody_samples)
 
         # FRICCIÓN: Posibilidad de cambiar sample
         if random.random() < friction:
             sample = random.choice(self.melody_samples + self.fx_samples)
-            self.rule_thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Swap melody -> {sample}", "prob": 1.0}]})
+            thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Swap melody -> {sample}", "prob": 1.0}]})
         
         # Detectar si es Synth (necesita notas MIDI) o Sample (necesita indices 0-11)
         # Lista ampliada con todos los super* detectados
@@ -469,13 +506,15 @@ class PatternGenerator:
         
         return pattern
     
-    def _generate_percussion(self, density: float, complexity: float, style: str, friction: float = 0.2) -> str:
+    def _generate_percussion(self, density: float, complexity: float, style: str, friction: float = 0.2,
+                             thoughts: List[Dict] = None) -> str:
         """Generar patrón de percusión"""
+        thoughts = thoughts if thoughts is not None else []
         
         sample = random.choice(self.perc_samples)
         repetitions = int(4 + density * 12)  # 4-16 hits
         
-        self.rule_thoughts.append({
+        thoughts.append({
             "token": "REGLAS: PERC",
             "prob": 0.75,
             "alternatives": [
@@ -493,18 +532,20 @@ class PatternGenerator:
             speed_var = 1.0
             if random.random() < friction:
                  speed_var = random.choice([0.5, 2.0, 1.5, 0.75])
-                 self.rule_thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Speed x{speed_var}", "prob": 1.0}]})
+                 thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Speed x{speed_var}", "prob": 1.0}]})
 
             pattern += f'\n  # speed (range 0.8 {1.5 * speed_var} $ slow 4 sine)'
         
         return pattern
     
-    def _generate_fx(self, density: float, complexity: float, style: str, friction: float = 0.2) -> str:
+    def _generate_fx(self, density: float, complexity: float, style: str, friction: float = 0.2,
+                     thoughts: List[Dict] = None) -> str:
         """Generar patrón de efectos/ambiente"""
+        thoughts = thoughts if thoughts is not None else []
         
         sample = random.choice(self.fx_samples)
         
-        self.rule_thoughts.append({
+        thoughts.append({
             "token": "REGLAS: FX",
             "prob": 0.7,
             "alternatives": [
@@ -521,36 +562,62 @@ class PatternGenerator:
         if random.random() < friction:
             cuts = random.choice([4, 8, 16, 32])
             pattern += f'\n  # striate {cuts}'
-            self.rule_thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Striate {cuts}", "prob": 1.0}]})
+            thoughts.append({"token": "FRICCIÓN", "prob": friction, "alternatives": [{"token": f"Striate {cuts}", "prob": 1.0}]})
 
         pattern += f'\n  # size {0.7 + complexity * 0.3:.2f}'
         
         return pattern
     
-    def _generate_with_ai(self, temperature: float = 1.0) -> Dict:
+    def _generate_with_ai(self, temperature: float = 1.0, on_thought: Callable[[Dict], None] = None, cancel=None,
+                          style: str = None, pattern_type: str = None, blend: Dict[str, float] = None) -> Dict:
         """
         Generar patrón usando modelo Markov.
         
         Args:
             temperature: Controla creatividad (0.5=conservador, 2.0=creativo)
+            on_thought: Callback por token; cada thought lleva "attempt" (reintentos de sintaxis)
+            cancel: Evento para abortar el muestreo
+            style, pattern_type: Sub-modelos de género e instrumento que se mezclan con
+                el global (AI_MIX_WEIGHTS); si no existen se usa solo el global
+            blend: Pesos por género del Latent Space; reparten el peso de género
+                entre sus sub-modelos (sustituye a style en la mezcla)
         
         Returns:
             Dict con {"pattern": str, "thoughts": list}
         """
         if not hasattr(self, 'markov'):
             raise ValueError("Modelo Markov no inicializado")
+        markov = self.markov  # Un reentrenamiento puede sustituirlo mientras tanto
+        
+        def token_callback(attempt):
+            if on_thought is None:
+                return None
+            return lambda thought: on_thought(dict(thought, attempt=attempt))
+        
+        mix = {}
+        blend_total = sum(w for w in (blend or {}).values() if w > 0)
+        if blend_total:
+            for genre, weight in blend.items():
+                if weight > 0:
+                    mix[f'genre:{genre}'] = AI_MIX_WEIGHTS['genre'] * weight / blend_total
+        elif style:
+            mix[f'genre:{style}'] = AI_MIX_WEIGHTS['genre']
+        if pattern_type:
+            mix[f'type:{pattern_type}'] = AI_MIX_WEIGHTS['type']
         
         # Generar patrón
         max_tokens = int(20 + temperature * 30)
-        result = self.markov.generate(max_tokens=max_tokens, temperature=temperature)
+        result = markov.generate(max_tokens=max_tokens, temperature=temperature,
+                                 on_token=token_callback(0), cancel=cancel, mix=mix)
         
         # Validar y retornar
         if self.validate(result["pattern"]):
             return result
         else:
             # Si no es válido, intentar de nuevo
-            for _ in range(2):
-                result = self.markov.generate(max_tokens=max_tokens, temperature=temperature)
+            for attempt in range(1, 3):
+                result = markov.generate(max_tokens=max_tokens, temperature=temperature,
+                                         on_token=token_callback(attempt), cancel=cancel, mix=mix)
                 if self.validate(result["pattern"]):
                     return result
             
@@ -669,14 +736,19 @@ class PatternGenerator:
         
         # 1. Fix broken floats (digit space digit digit) -> digit.digit digit
         # Catch "1 00" -> "1.00", "0 5" -> "0.5"
-        pattern = re.sub(r'(\d+)\s+(\d{1,2})(?!\d)', r'\1.\2', pattern)
+        # Solo fuera de comillas (en la mini-notación "0 3 7" son notas distintas)
+        # y nunca sobre un número que ya es decimal ("0.8 1.2")
+        parts = re.split(r'("[^"]*")', pattern)
+        for i in range(0, len(parts), 2):
+            parts[i] = re.sub(r'(?<![\d.])(\d+)\s+(\d{1,2})(?![\d.])', r'\1.\2', parts[i])
+        pattern = "".join(parts)
         
         # 2. Fix $ operator spacing
         pattern = re.sub(r'\$([^\s\)])', r'$ \1', pattern)
         
         # 3. Validar speed y gain rango
         # Si speed es 0, Tidal explota o no suena. Clamp a 0.1
-        pattern = re.sub(r'#\s*speed\s+0(\.0+)?(?!\d)', '# speed 0.1', pattern)
+        pattern = re.sub(r'#\s*speed\s+0(\.0+)?(?![\d.])', '# speed 0.1', pattern)
         
         return pattern
     
@@ -787,9 +859,9 @@ class PatternGenerator:
             if re.match(r'^\d+(\.\d+)?$', token) and mutation_seed < (strength * 0.4):
                 val = float(token)
                 factor = 0.5 if random.random() < 0.5 else 2.0
-                new_val = val * factor if val > 0 else 1
+                new_val = val * factor if val > 0 else 1.0
                 # Limitar valores razonables
-                if new_val > 32: new_val = 32
+                if new_val > 32: new_val = 32.0
                 token = str(int(new_val)) if new_val.is_integer() else f"{new_val:.2f}"
                 thoughts.append({"token": "NUM_MUT", "prob": strength, "alts": [f"{val} -> {token}"]})
             
@@ -980,7 +1052,7 @@ class PatternGenerator:
             result.append(next_token)
             current_state = result[-order:]
             
-        pattern_str = self._reconstruct(result) if hasattr(self, 'markov') else " ".join(result)
+        pattern_str = self.markov._reconstruct(result) if hasattr(self, 'markov') else " ".join(result)
         
         return {
             "pattern": pattern_str,
@@ -1041,18 +1113,22 @@ class PatternGenerator:
         union = set1.union(set2)
         return len(intersection) / len(union)
 
+    def _last_pattern(self) -> Optional[str]:
+        """Último patrón del historial (None si está vacío)."""
+        with self._history_lock:
+            return self.pattern_history[-1] if self.pattern_history else None
+
     def _update_history(self, pattern: str):
-        """Añade patrón al historial y mantiene tamaño máximo."""
-        self.pattern_history.append(pattern)
-        if len(self.pattern_history) > self.max_history:
-            self.pattern_history.pop(0)
+        """Añade patrón al historial (el deque descarta el más antiguo)."""
+        with self._history_lock:
+            self.pattern_history.append(pattern)
 
     def _humanize_pattern(self, pattern: str) -> str:
         """Añade sutiles desviaciones a los valores numéricos para sonar menos robótico."""
         import re
         
         def hum(match):
-            val = float(match.group(2))
+            val = float(match.group(3))
             # Desviación de +/- 2% máximo
             deviation = (random.random() * 0.04) - 0.02
             new_val = val + (val * deviation)
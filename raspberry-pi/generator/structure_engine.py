@@ -3,11 +3,24 @@
 Structure Engine (The Conductor)
 Gestiona la progresión de la canción a través de secciones definidas (Intro, Verse, Build, Drop, Outro).
 """
+import bisect
+import logging
+import threading
 import time
 
+logger = logging.getLogger(__name__)
+
+# Eventos emitidos por el reloj del Conductor a sus suscriptores
+CONDUCTOR_EVENTS = ("bar", "section_change", "transition_imminent", "finished", "stopped")
+
 class Conductor:
     def __init__(self):
         self.is_active = False
+        # Estado de la sesión (activa, estructura, reloj): start() lo publica y
+        # update() lo lee de una vez bajo este lock; el reloj y las consultas
+        # compiten además por el final
+        self._state_lock = threading.Lock()
+        self._session = 0  # Cambia con cada start(): un update() de la sesión anterior no para la nueva
         self.start_time = 0
         self.templates = {
             "standard": [
@@ -44,67 +57,181 @@ class Conductor:
         self.current_section_index = 0
         self.current_bar = 0
         self.bpm = 140
+        self._section_starts, self._section_ends = self._bounds(self.sections)
+        
+        # Reloj en segundo plano: las transiciones se disparan aunque nadie consulte
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._clock_stop = threading.Event()
+        self._clock_thread = None
+
+    @staticmethod
+    def _bounds(sections):
+        """Límites acumulados (inicios, finales) de cada sección, para búsqueda O(log n)"""
+        starts, ends = [], []
+        bars_accumulated = 0
+        for section in sections:
+            starts.append(bars_accumulated)
+            bars_accumulated += section["duration"]
+            ends.append(bars_accumulated)
+        return starts, ends
 
     def start(self, bpm=140, template_name="standard", custom_structure=None):
-        self.is_active = True
-        self.start_time = time.time()
-        self.current_section_index = 0
-        self.current_bar = 0
-        self.bpm = bpm
+        # Parar el reloj anterior antes de cambiar de estructura
+        self._clock_stop.set()
         
         if custom_structure:
-            self.current_template_name = "custom"
-            self.sections = custom_structure
+            template_name, sections = "custom", custom_structure
         elif template_name in self.templates:
+            sections = self.templates[template_name]
+        else:
+            template_name, sections = self.current_template_name, self.sections
+        starts, ends = self._bounds(sections)
+        
+        # Publicar la sesión entera de una vez y activarla al final: un update()
+        # concurrente ve la anterior completa o la nueva completa
+        with self._state_lock:
             self.current_template_name = template_name
-            self.sections = self.templates[template_name]
+            self.sections, self._section_starts, self._section_ends = sections, starts, ends
+            self.bpm = bpm
+            self.start_time = time.time()
+            self.current_section_index = 0
+            self.current_bar = 0
+            self._session += 1
+            self.is_active = True
+        
+        self._clock_stop = threading.Event()
+        self._clock_thread = threading.Thread(target=self._run_clock, args=(self._clock_stop,), name="conductor-clock", daemon=True)
+        self._clock_thread.start()
         
         print(f"🎻 Conductor Started: {self.sections[0]['name']} (Template: {self.current_template_name})")
 
     def stop(self):
-        self.is_active = False
-        print("🎻 Conductor Stopped")
+        """Parar la sesión a mano (emite "stopped"); True si estaba activa"""
+        stopped = self._deactivate()
+        if stopped:
+            self._emit("stopped", {"status": "stopped", "bar": self.current_bar})
+        return stopped
 
-    def update(self):
-        if not self.is_active:
+    def _deactivate(self, session=None):
+        """
+        Desactivar y parar el reloj; True solo para quien la para (las demás
+        llamadas no hacen nada). Con `session`, solo si sigue siendo la actual.
+        """
+        with self._state_lock:
+            if session is not None and session != self._session:
+                return False
+            was_active = self.is_active
+            self.is_active = False
+        self._clock_stop.set()
+        if was_active:
+            print("🎻 Conductor Stopped")
+        return was_active
+
+    # --- Eventos ---
+
+    def subscribe(self, callback):
+        """
+        Registrar callback(event, status) para los eventos del reloj
+        (ver CONDUCTOR_EVENTS). Se ejecuta en el hilo del reloj ("stopped", en el
+        de quien llama a stop()): debe ser rápido.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _emit(self, event, status):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event, status)
+            except Exception as e:
+                logger.error(f"Error en suscriptor del Conductor ({event}): {e}")
+
+    def _run_clock(self, stop_event):
+        """Avanzar compás a compás y notificar transiciones a tiempo"""
+        last_section = None
+        while not stop_event.is_set():
+            status = self.update()
+            if status is None or stop_event.is_set():
+                return
+            if status["status"] == "finished":
+                return  # update() ya ha emitido "finished"
+            
+            self._emit("bar", status)
+            if self.current_section_index != last_section:
+                last_section = self.current_section_index
+                self._emit("section_change", status)
+            if status["transition_imminent"]:
+                self._emit("transition_imminent", status)
+            
+            # Dormir hasta el siguiente límite de compás (+1ms para caer dentro)
+            next_bar_time = self.start_time + (status["bar"] + 1) * self.seconds_per_bar
+            stop_event.wait(max(0.0, next_bar_time - time.time()) + 0.001)
+
+    # --- Consulta ---
+
+    @property
+    def seconds_per_bar(self):
+        return self._bar_seconds(self.bpm)
+
+    def _bar_seconds(self, bpm):
+        return 60 / bpm * 4
+
+    def section_at(self, bar):
+        """Sección que suena en el compás `bar` (con sus límites), o None tras el final"""
+        with self._state_lock:
+            sections, starts, ends = self.sections, self._section_starts, self._section_ends
+        i = bisect.bisect_right(ends, bar)
+        if bar < 0 or i >= len(sections):
             return None
+        return dict(sections[i], start_bar=starts[i], end_bar=ends[i])
 
-        # Calcular compás actual basado en el tiempo
-        elapsed = time.time() - self.start_time
-        seconds_per_beat = 60 / self.bpm
-        seconds_per_bar = seconds_per_beat * 4
-        self.current_bar = int(elapsed / seconds_per_bar)
+    def update(self):
+        # Una sola lectura del estado: start() puede estar publicando otra sesión
+        with self._state_lock:
+            if not self.is_active:
+                return None
+            session, start_time, bpm = self._session, self.start_time, self.bpm
+            sections, starts, ends = self.sections, self._section_starts, self._section_ends
 
-        # Determinar sección actual
-        bars_accumulated = 0
-        target_section = None
-        
-        for i, section in enumerate(self.sections):
-            if self.current_bar < (bars_accumulated + section["duration"]):
-                target_section = section
-                self.current_section_index = i
-                break
-            bars_accumulated += section["duration"]
+        # Calcular compás actual basado en el tiempo
+        elapsed = time.time() - start_time
+        current_bar = int(elapsed / self._bar_seconds(bpm))
+        self.current_bar = current_bar
 
-        if not target_section:
-            # Fin de la canción
-            self.stop()
+        # Determinar sección actual (búsqueda binaria sobre los límites precalculados)
+        i = bisect.bisect_right(ends, current_bar)
+        if i >= len(sections):
+            # Fin de la canción (lo detecta el reloj o una consulta, lo que llegue antes):
+            # solo quien la para emite "finished", y nunca si ya ha empezado otra sesión
+            if self._deactivate(session):
+                self._emit("finished", {"status": "finished", "bar": current_bar})
             return {"status": "finished"}
 
+        self.current_section_index = i
+        target_section = sections[i]
+        section_start_bar = starts[i]
+
         # Calcular progreso dentro de la sección (0.0 - 1.0)
-        section_start_bar = bars_accumulated
-        section_progress = (self.current_bar - section_start_bar) / target_section["duration"]
+        section_progress = (current_bar - section_start_bar) / target_section["duration"]
 
         # SEÑALIZACIÓN DE TRANSICIÓN (Last bar detection)
-        is_transition_imminent = (self.current_bar == (bars_accumulated + target_section["duration"] - 1))
+        is_transition_imminent = (current_bar == ends[i] - 1)
 
         return {
             "status": "playing",
             "section": target_section["name"],
-            "bar": self.current_bar,
+            "bar": current_bar,
             "section_progress": section_progress,
             "target_density": target_section["density"],
             "target_complexity": target_section["complexity"],
             "transition_imminent": is_transition_imminent,
-            "next_section": self.sections[self.current_section_index + 1]["name"] if self.current_section_index + 1 < len(self.sections) else "FIN"
+            "next_section": sections[i + 1]["name"] if i + 1 < len(sections) else "FIN"
         }
@@ -0,0 +1,47 @@
+import json
+
+from corpus_reader import iter_corpus, iter_labeled_corpus, normalize
+from markov_model import MarkovModel
+
+
+def test_stream_skips_markers_normalises_and_dedups(tmp_path):
+    corpus = tmp_path / 'patterns.txt'
+    corpus.write_text(
+        '# Corpus\n'
+        '\n'
+        '# --- EVOLUTIONARY RUN 2025-01-01 ---\n'
+        'd1 $ sound "bd sn"\n'
+        'sound  "bd sn"   -- Bombo y caja\n'
+        'sound "hh*8" # gain 0.8\n',
+        encoding='utf-8'
+    )
+    favorites = tmp_path / 'favorites.json'
+    favorites.write_text(json.dumps([{'pattern': 'sound "hh*8" # gain 0.8'}, {'pattern': 'note "0 3 7" # sound "arpy"'}, {}]))
+
+    patterns = iter_corpus(str(corpus), str(favorites))
+    assert not isinstance(patterns, list)
+    assert list(patterns) == ['sound "bd sn"', 'sound "hh*8" # gain 0.8', 'note "0 3 7" # sound "arpy"']
+
+    model = MarkovModel(order=2)
+    assert model.train(iter_corpus(str(corpus), str(tmp_path / 'missing.json'))) == 2
+    assert model.trained
+
+
+
+def test_normalize_strips_prefix_comment_and_spacing():
+    assert normalize('  d1 $ sound "bd sn"  ') == 'sound "bd sn"'
+    assert normalize('d12$sound "bd"') == 'sound "bd"'
+    assert normalize('sound  "bd*2"   # gain 1.2 -- Bombo') == 'sound "bd*2" # gain 1.2'
+    assert normalize('d1 $') == ''
+
+
+def test_labeled_corpus_dedups_like_the_plain_stream(tmp_path):
+    corpus = tmp_path / 'patterns.txt'
+    corpus.write_text('# GENERO: Techno\nd1 $ sound "bd*4"\nsound "bd*4" -- Otra vez\n', encoding='utf-8')
+    favorites = tmp_path / 'favorites.json'
+    favorites.write_text(json.dumps([{'pattern': 'sound "bd*4"', 'style': 'house'},
+                                     {'pattern': 'sound "pad"', 'style': 'ambient'}]))
+
+    labeled = list(iter_labeled_corpus(str(corpus), str(favorites)))
+    assert labeled == [('sound "bd*4"', ['genre:techno', 'type:drums']), ('sound "pad"', ['genre:ambient', 'type:melody'])]
+    assert [p for p, _ in labeled] == list(iter_corpus(str(corpus), str(favorites)))
@@ -0,0 +1,72 @@
+import time
+
+from jam_engine import JamSession
+from structure_engine import Conductor
+
+SECTION = {"name": "A", "duration": 1000, "density": 0.5, "complexity": 0.5}
+
+
+class FakeGenerator:
+    def generate(self, **kwargs):
+        return {"pattern": 's "bd"'}
+
+
+class FakeTheory:
+    def sanitize_pattern(self, pattern):
+        return pattern
+
+
+class FakeOsc:
+    def __init__(self):
+        self.sent = []
+
+    def send_pattern(self, channel, pattern):
+        self.sent.append(channel)
+        return True
+
+    def stop_channel(self, channel):
+        pass
+
+
+def make_jam(conductor, **kwargs):
+    # 6000 BPM: compases de 40 ms
+    return JamSession(FakeGenerator(), FakeTheory(), conductor, FakeOsc(), channels=[1], pattern_types=["drums"],
+                      duration_minutes=0.05, interval=0.08, tempo=6000, **kwargs)
+
+
+def test_jam_follows_a_conductor_started_mid_session():
+    conductor = Conductor()
+    jam = make_jam(conductor)
+    jam.start()
+    try:
+        time.sleep(0.1)
+        assert jam.current_section is None
+
+        conductor.start(bpm=3000, custom_structure=[SECTION])
+        time.sleep(0.4)
+        assert (jam.bpm, jam.origin) == (3000, conductor.start_time)
+        assert jam.bars_per_change == 1  # 0.08 s a 3000 BPM
+        pending = jam.slot_bars[jam.slot_bars.index(jam.status()["next_bar"]):]
+        assert pending == list(range(pending[0], pending[0] + len(pending)))
+        assert jam.current_section == "A" and jam.running
+    finally:
+        jam.stop()
+        conductor.stop()
+
+
+def test_stopped_conductor_drops_slots_planned_for_its_sections():
+    conductor = Conductor()
+    conductor.start(bpm=6000, custom_structure=[SECTION])
+    jam = make_jam(conductor, lookahead_bars=8)
+    jam.start()
+    try:
+        time.sleep(0.1)
+        assert any(slot["section"] == "A" for slot in jam.status()["buffered"])
+
+        # El plan se para antes de tiempo (/api/conductor/stop): lo preparado para "A" ya no vale
+        conductor.stop()
+        assert all(slot["section"] is None for slot in jam.status()["buffered"])
+        time.sleep(0.1)
+        assert jam.status()["buffered"] and jam.current_section is None
+    finally:
+        jam.stop()
@@ -0,0 +1,26 @@
+import json
+import os
+
+from json_cache import JSONFileCache
+
+
+def test_read_through_and_write_through(tmp_path):
+    cache = JSONFileCache()
+    path = os.path.join(str(tmp_path), 'config.json')
+
+    assert cache.load(path, default={}) == {}
+
+    cache.write(path, {'pc': {'ip': '10.0.0.1'}})
+    assert cache.load(path)['pc']['ip'] == '10.0.0.1'
+    assert cache.stats()['hits'] == 1
+    assert [f for f in os.listdir(str(tmp_path))] == ['config.json']
+
+    # Cambio externo (p.ej. restore de un backup): se detecta por la firma del fichero
+    with open(path + '.new', 'w') as f:
+        json.dump({'pc': {'ip': '10.0.0.2'}}, f)
+    os.replace(path + '.new', path)
+    assert cache.load(path)['pc']['ip'] == '10.0.0.2'
+
+    editable = cache.load(path, copy=True)
+    editable['pc']['ip'] = 'x'
+    assert cache.load(path)['pc']['ip'] == '10.0.0.2'
@@ -0,0 +1,70 @@
+import numpy as np
+
+import latent_engine
+from genre_profiles import GenreProfiles
+from latent_engine import LatentEngine, SCALAR_FEATURES
+
+
+def test_matrix_blends_paths_and_nearest():
+    latent = LatentEngine(profiles_file=None)
+    assert latent.matrix.shape == (len(latent.genres), len(SCALAR_FEATURES) + len(latent.samples))
+    assert 'clubkick' in latent.samples  # Vocabulario completo de samples_v2.json
+
+    techno = latent.blend_multiple({'techno': 1.0})
+    assert techno['tempo_preference'] == 140 and techno['preferred_samples'][0] == 'bd'
+
+    mixed = latent.blend_multiple({'techno': 0.7, 'ambient': 0.3})
+    assert np.isclose(mixed['density_base'], 0.8 * 0.7 + 0.3 * 0.3)
+    assert {'bd', 'pad'} <= set(mixed['preferred_samples'])
+    assert mixed['blend_info'] == {'techno': 0.7, 'ambient': 0.3}
+
+    path = latent.path('techno', 'ambient', steps=5)
+    assert [p['position'] for p in path] == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert np.isclose(path[1]['density_base'], latent.interpolate('techno', 'ambient', 0.25)['density_base'])
+
+    assert latent.nearest({'techno': 0.9, 'house': 0.1}, k=2)[0]['genre'] == 'techno'
+    assert latent.path('techno', 'nope') is None
+
+
+def test_small_blends_match_matrix_path_and_truncate_tempo_per_genre(monkeypatch):
+    latent = LatentEngine(profiles_file=None)
+    blends = [{'house': 0.3, 'breakbeat': 0.7}, {'techno': 0.5, 'ambient': 0.3, 'house': 0.2}, {'nope': 1.0}]
+    small = [latent.blend_multiple(b) for b in blends]
+    monkeypatch.setattr(latent_engine, 'SMALL_BLEND', 0)
+    full = [latent.blend_multiple(b) for b in blends]
+
+    # Tempo entero por género: 37 + 94, no int(37.5 + 94.5)
+    assert small[0]['tempo_preference'] == full[0]['tempo_preference'] == 131
+    for fast, matrix in zip(small, full):
+        assert fast['preferred_samples'] == matrix['preferred_samples']
+        assert fast['tempo_preference'] == matrix['tempo_preference']
+        assert np.allclose([fast[f] for f in ('density_base', 'complexity_base', 'rhythmic_weight')],
+                           [matrix[f] for f in ('density_base', 'complexity_base', 'rhythmic_weight')])
+
+
+def test_profiles_refresh_incrementally_and_feed_custom_genres(tmp_path):
+    corpus = tmp_path / 'patterns.txt'
+    corpus.write_text('# GENERO: Trap\nsound "808bd(3,8) hh*8" # lpf 2000 # room 0.3\n', encoding='utf-8')
+    cache = str(tmp_path / 'genre_profiles.json')
+
+    profiles = GenreProfiles(cache)
+    assert profiles.refresh(str(corpus)) == 1
+    profiles.save()
+
+    # Solo se lee lo añadido; la sección abierta (trap) sigue vigente
+    with open(corpus, 'a', encoding='utf-8') as f:
+        f.write('sound "808bd*4"\n\n# --- EVOLUTIONARY RUN ---\nsound "bd"\n')
+    profiles = GenreProfiles(cache)
+    assert profiles.refresh(str(corpus)) == 1
+    assert profiles.refresh(str(corpus)) == 0
+    trap = profiles.genres()['trap']
+    assert trap['patterns'] == 2 and trap['events'] == 11 + 4 and trap['samples']['808bd'] == 2
+
+    # Una edición que no es un añadido al final obliga a recontar
+    corpus.write_text('# GENERO: Trap\nsound "hh*16"\n', encoding='utf-8')
+    assert profiles.refresh(str(corpus)) == 1 and profiles.genres()['trap']['patterns'] == 1
+    profiles.save()
+
+    latent = LatentEngine(profiles_file=cache)
+    trap = latent.blend_multiple({'trap': 1.0})
+    assert trap['density_base'] > 0.5 and trap['preferred_samples'] == ['hh']
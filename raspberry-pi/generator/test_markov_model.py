@@ -0,0 +1,86 @@
+import markov_model
+from markov_model import EXAMPLE_CORPUS, MarkovModel
+
+
+def counts(model):
+    return {state: dict(next_tokens) for state, next_tokens in model.transitions.items()}
+
+
+def test_parallel_training_and_merge_match_serial_counts():
+    corpus = EXAMPLE_CORPUS * 3
+
+    serial = MarkovModel(order=2)
+    serial.train(corpus)
+
+    parallel = MarkovModel(order=2)
+    assert parallel.train(iter(corpus), workers=2, shard_size=40) == len(corpus)
+    assert counts(parallel) == counts(serial)
+    assert parallel.starts == serial.starts
+
+    # Dos "máquinas" con mitades del corpus
+    half = len(corpus) // 2
+    a, b = MarkovModel(order=2), MarkovModel(order=2)
+    a.train(corpus[:half])
+    b.train(corpus[half:])
+    assert counts(a.merge(b)) == counts(serial)
+
+
+def test_labeled_sub_models_share_pool_and_mix(tmp_path):
+    items = [('sound "bd*4 sn*2"', ['genre:techno', 'type:drums']),
+             ('note "0 3 7" # sound "arpy"', ['type:melody']),
+             'sound "hh*8" # gain 0.8']
+
+    model = MarkovModel(order=2)
+    assert model.train(items * 2, workers=2, shard_size=2) == 6
+    assert sorted(model.sub_models) == ['genre:techno', 'type:drums', 'type:melody']
+
+    techno = model.sub_models['genre:techno']
+    state = next(iter(techno.transitions))
+    assert any(s is state for s in model.transitions)  # Misma tupla, no una copia
+    assert techno.transitions[('sound', '"')] == {'bd': 2}
+
+    # Sin sub-modelo para la etiqueta: solo el global
+    assert model.mixture({'genre:house': 0.5}) == [(1.0, model)]
+    weights = dict((id(m), w) for w, m in model.mixture({'genre:techno': 0.5}))
+    assert weights[id(techno)] < 0.5 and abs(sum(weights.values()) - 1.0) < 1e-9
+
+    path = str(tmp_path / 'model.json')
+    model.save(path)
+    loaded = MarkovModel()
+    loaded.load(path)
+    assert counts(loaded.sub_models['type:drums']) == counts(model.sub_models['type:drums'])
+    assert loaded.generate(mix={'genre:techno': 1.0, 'type:drums': 1.0})['pattern']
+
+
+def test_blend_tables_are_cached_per_weights():
+    items = [('sound "bd*4 sn*2"', ['genre:techno'])] * 60 + [('sound "pad*2 wind"', ['genre:ambient'])] * 60
+    model = MarkovModel(order=2)
+    model.train(items)
+
+    blend = {'genre:techno': 0.3, 'genre:ambient': 0.3}
+    table = model.mixed_table(blend)
+    assert model.mixed_table({'genre:ambient': 0.301, 'genre:techno': 0.3}) is table
+
+    # Tokens de ambos géneros en la misma distribución
+    choices, probs = table.row(('sound', '"'))
+    assert set(choices) == {'bd', 'pad'} and abs(sum(probs) - 1.0) < 1e-9
+    model.generate(mix=blend)
+    assert ('sound', '"') in table.rows
+
+    model.train(['sound "cp*2"'])
+    assert model.mixed_table(blend) is not table
+
+
+def test_blend_table_rows_are_bounded(monkeypatch):
+    monkeypatch.setattr(markov_model, 'MIX_TABLE_ROWS', 8)
+    model = MarkovModel(order=2)
+    model.train([(p, ['genre:techno']) for p in EXAMPLE_CORPUS])
+    table = model.mixed_table({'genre:techno': 0.5})
+
+    states = list(model.transitions)[:20]
+    first = table.row(states[0])
+    for state in states[1:]:
+        table.row(state)
+        assert len(table.rows) <= 8
+    assert states[0] not in table.rows
+    assert table.row(states[0]) == first  # Recalculado igual tras salir de la tabla
@@ -0,0 +1,27 @@
+from metrics import MetricsRegistry
+
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry()
+    metrics.histogram('stage_seconds', 'Etapas', buckets=(0.1, 1.0))
+    metrics.gauge('cache_hit_ratio', 'Caché', lambda: {(('cache', 'json'),): 0.5})
+    metrics.inc('osc_total', address='/tidal/pattern', result='ok')
+    metrics.inc('osc_total', 2, result='ok', address='/tidal/pattern')
+    metrics.observe('stage_seconds', 0.05, stage='sample')
+    metrics.observe('stage_seconds', 3.0, stage='sample')
+
+    lines = metrics.render().splitlines()
+    assert 'osc_total{address="/tidal/pattern",result="ok"} 3' in lines
+    assert '# TYPE stage_seconds histogram' in lines
+    assert 'stage_seconds_bucket{stage="sample",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="sample",le="1.0"} 1' in lines
+    assert 'stage_seconds_bucket{stage="sample",le="+Inf"} 2' in lines
+    assert 'stage_seconds_count{stage="sample"} 2' in lines
+    assert 'cache_hit_ratio{cache="json"} 0.5' in lines
+
+
+def test_disabled_registry_records_nothing():
+    metrics = MetricsRegistry(enabled=False)
+    with metrics.span('stage_seconds', stage='sample'):
+        metrics.inc('osc_total')
+    assert metrics.render() == ''
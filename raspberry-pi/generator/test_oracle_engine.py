@@ -0,0 +1,47 @@
+import json
+
+from oracle_engine import OracleEngine
+
+
+def test_phrases_accents_and_user_lexicon(tmp_path):
+    lexicon_file = tmp_path / 'oracle_lexicon.json'
+    lexicon_file.write_text(json.dumps({
+        'lexicon': {'drum and bass': {'style_pref': 'drum_and_bass', 'tempo_mod': 30}},
+        'synonyms': {'dnb': 'drum and bass', 'oscurito': 'oscuro'}
+    }), encoding='utf-8')
+    oracle = OracleEngine(lexicon_file=str(lexicon_file))
+
+    result = oracle.interpret('Mas CAOTICO, drum and bass')
+    assert result['detected_keywords'] == ['mas', 'caotico', 'drum and bass']
+    assert result['complexity_offset'] == 0.5 * 1.2
+    assert result['style_pref'] == 'drum_and_bass' and result['tempo_mod'] == 30
+
+    # La frase más larga gana; "drum" suelto no es nada
+    assert oracle.interpret('drum and')['detected_keywords'] == []
+    assert oracle.interpret('quiero dnb oscurito')['detected_keywords'] == ['dnb', 'oscurito']
+
+    # Resultados en caché, pero el llamante recibe listas propias
+    result['extra_tokens'].append('# x')
+    assert '# x' not in oracle.interpret('Mas CAOTICO, drum and bass')['extra_tokens']
+
+
+def test_same_result_as_word_by_word_lexicon():
+    oracle = OracleEngine(lexicon_file=None)
+    result = oracle.interpret('más agresivo y espacial')
+    assert result['detected_keywords'] == ['más', 'agresivo', 'espacial']
+    assert abs(result['density_offset'] - (0.3 - 0.2) * 1.2) < 1e-9
+    assert result['extra_tokens'] == ['*2', '# speed 1.2', '# delay 0.7 # delayfb 0.5']
+
+
+def test_fuzzy_matches_resolve_misspellings():
+    oracle = OracleEngine(lexicon_file=None)
+    result = oracle.interpret('algo agresibo y spacey')
+    assert result['detected_keywords'] == ['agresibo', 'spacey']
+    assert result['corrections'] == {'agresibo': 'agresivo', 'spacey': 'space'}
+    assert result['style_pref'] == 'ambient'
+
+    # Palabras cortas, de relleno o sin parecido suficiente no se corrigen
+    assert oracle.interpret('quiero un toque tribu')['detected_keywords'] == []
+
+    best = oracle.fuzzy_matches('agresibo')
+    assert best[0] == {'key': 'agresivo', 'score': 0.778} and len(best) == 3
@@ -0,0 +1,108 @@
+import os
+import random
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from markov_model import EXAMPLE_CORPUS, MarkovModel
+from pattern_generator import PatternGenerator
+
+RULE_TOKENS = {'drums': 'REGLAS: DRUMS', 'bass': 'REGLAS: BASS', 'percussion': 'REGLAS: PERC', 'fx': 'REGLAS: FX'}
+
+
+def make_generator():
+    generator = PatternGenerator(use_ai=False)
+    generator.markov = MarkovModel(order=2)
+    generator.markov.train(EXAMPLE_CORPUS)
+    return generator
+
+
+def test_concurrent_generations_stay_isolated():
+    generator = make_generator()
+    jobs = [(list(RULE_TOKENS)[i % 4], (i % 7) / 6, i % 3 == 0) for i in range(400)]
+
+    def run(job):
+        pattern_type, density, use_ai = job
+        streamed = []
+        result = generator.generate(pattern_type=pattern_type, density=density, complexity=0.9,
+                                    use_ai=use_ai, on_thought=streamed.append)
+        return job, result, streamed
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        outcomes = list(pool.map(run, jobs))
+
+    for (pattern_type, density, use_ai), result, streamed in outcomes:
+        assert result['pattern']
+        if use_ai:
+            # Los reintentos de esta llamada, en orden, y nada más
+            attempts = [t['attempt'] for t in streamed if 'attempt' in t]
+            assert attempts == sorted(attempts) and set(attempts) <= {0, 1, 2}
+            continue
+        assert streamed == result['thoughts']
+        rules = [t for t in result['thoughts'] if t['token'].startswith('REGLAS')]
+        assert [t['token'] for t in rules] == [RULE_TOKENS[pattern_type]]
+        if pattern_type == 'drums':
+            assert {'token': f'Kicks: {int(2 + density * 6)}', 'prob': density} in rules[0]['alternatives']
+
+    assert len(generator.pattern_history) <= generator.max_history
+
+
+def test_humanize_varies_values_only():
+    generator = PatternGenerator(use_ai=False)
+    pattern = generator._humanize_pattern('d1 $ s "bd*4" # speed 1.2 # gain 0.9 # room 0.3')
+
+    values = dict(re.findall(r'#\s+(\w+)\s+([\d.]+)', pattern))
+    assert pattern.startswith('d1 $ s "bd*4" # speed ')
+    for param, original in (('speed', 1.2), ('gain', 0.9), ('room', 0.3)):
+        assert abs(float(values[param]) - original) <= original * 0.02 + 0.0005  # ±2%, redondeado a 3 decimales
+
+
+def test_morph_reconstructs_with_markov_model():
+    generator = make_generator()
+    result = generator.morph('d1 $ s "bd*4" # gain 1.2', 'd1 $ s "hh*8" # speed 2', ratio=0.5)
+
+    assert result['pattern']
+    assert result['thoughts']
+
+
+def test_mutate_formats_reset_and_clamped_values():
+    # 0 se reinicia a 1 y 64 se limita a 32: ambos salen como enteros
+    generator = PatternGenerator(use_ai=False)
+    changes = set()
+    for seed in range(20):
+        random.seed(seed)
+        result = generator.mutate('d1 $ s "bd*4" # gain 0 # speed 64', strength=1.0)
+        changes.update(alt for t in result['thoughts'] if t['token'] == 'NUM_MUT' for alt in t['alts'])
+
+    assert {'0.0 -> 1', '64.0 -> 32'} <= changes
+
+
+def test_speed_clamp_leaves_decimals_alone():
+    generator = PatternGenerator(use_ai=False)
+
+    assert generator._post_process_syntax('s "bd" # speed 0') == 's "bd" # speed 0.1'
+    assert generator._post_process_syntax('s "bd" # speed 0.0') == 's "bd" # speed 0.1'
+    assert generator._post_process_syntax('s "bd" # speed 0.894') == 's "bd" # speed 0.894'
+
+
+def test_seeded_melodies_do_not_depend_on_hash_seed():
+    # Con la misma semilla, el mismo patrón aunque cambie el orden de los set()
+    script = ("import random; from pattern_generator import PatternGenerator; random.seed(7); "
+              "print(repr(PatternGenerator(use_ai=False).generate('melody')['pattern']))")
+    patterns = set()
+    for hash_seed in ('1', '2', '3'):
+        env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+        run = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             env=env, capture_output=True, text=True, check=True)
+        patterns.add(run.stdout.splitlines()[-1])
+
+    assert len(patterns) == 1
+
+
+def test_float_repair_skips_mini_notation_and_decimals():
+    generator = PatternGenerator(use_ai=False)
+
+    assert generator._post_process_syntax('s "bd" # gain 1 00') == 's "bd" # gain 1.00'
+    assert generator._post_process_syntax('n "1 0 7" # s "arpy"') == 'n "1 0 7" # s "arpy"'
+    assert generator._post_process_syntax('s "bd" # speed (range 0.8 1.2 sine)') == 's "bd" # speed (range 0.8 1.2 sine)'
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from structure_engine import Conductor
+
+
+class SlowConductor(Conductor):
+    def _bar_seconds(self, bpm):
+        time.sleep(0.005)  # Ensancha la ventana entre comprobar is_active y parar
+        return 60 / bpm * 4
+
+
+def end_song(conductor):
+    """Sesión activa de un compás que terminó hace un minuto, sin reloj"""
+    conductor.sections = [{"name": "A", "duration": 1, "density": 0.5, "complexity": 0.5}]
+    conductor._section_starts, conductor._section_ends = Conductor._bounds(conductor.sections)
+    conductor.is_active = True
+    conductor.start_time = time.time() - 60
+
+
+def test_finished_is_emitted_once_when_updates_race():
+    conductor = SlowConductor()
+    events = []
+    conductor.subscribe(lambda event, status: events.append(event))
+
+    # Solo compiten las consultas
+    end_song(conductor)
+    barrier = threading.Barrier(8)
+
+    def query():
+        barrier.wait()
+        conductor.update()
+
+    threads = [threading.Thread(target=query) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert events.count("finished") == 1 and "stopped" not in events
+    assert not conductor.is_active and conductor.update() is None
+
+
+def test_manual_stop_emits_stopped_once():
+    conductor = Conductor()
+    events = []
+    conductor.subscribe(lambda event, status: events.append(event))
+    conductor.start(bpm=140)
+
+    assert conductor.stop() and not conductor.stop()
+    assert [e for e in events if e in ("stopped", "finished")] == ["stopped"]
+
+
+def test_restart_is_not_stopped_by_an_update_of_the_previous_session():
+    conductor = SlowConductor()
+    events = []
+    conductor.subscribe(lambda event, status: events.append(event))
+    end_song(conductor)
+
+    # La consulta lee la sesión terminada y decide "finished" mientras empieza otra
+    query = threading.Thread(target=conductor.update)
+    query.start()
+    time.sleep(0.002)
+    conductor.start(bpm=140, template_name="extended")
+    query.join()
+
+    assert conductor.is_active and "finished" not in events
+    assert conductor.update()["section"] == "INTRO"
+    conductor.stop()
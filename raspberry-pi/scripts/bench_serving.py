@@ -0,0 +1,94 @@
+"""
+Benchmark de servicio HTTP: peticiones/segundo de /api/generate contra un servidor en marcha.
+
+    python3 bench_serving.py --url http://127.0.0.1:5000 --concurrency 8 --duration 20
+
+Imprime un JSON con rps, latencias (p50/p95/p99) y errores, para comparar
+el servidor de desarrollo (python3 app.py) con gunicorn (gunicorn.conf.py).
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+PAYLOAD = {
+    'pattern_type': 'drums',
+    'density': 0.6,
+    'complexity': 0.5,
+    'tempo': 140,
+    'style': 'techno',
+    'use_ai': True,
+    'temperature': 1.0
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(url, concurrency, duration, warmup):
+    endpoint = url.rstrip('/') + '/api/generate'
+    body = json.dumps(PAYLOAD).encode()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_at = time.time() + warmup
+    stop_at = start_at + duration
+
+    def client():
+        while True:
+            t0 = time.time()
+            if t0 >= stop_at:
+                return
+            ok = False
+            try:
+                request = urllib.request.Request(endpoint, data=body, headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    ok = json.loads(response.read()).get('success', False)
+            except Exception:
+                pass
+            t1 = time.time()
+            if t0 < start_at:
+                continue  # Calentamiento: no se mide
+            with lock:
+                if ok:
+                    latencies.append(t1 - t0)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99': round(percentile(latencies, 99) * 1000, 1) if latencies else None
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.url, args.concurrency, args.duration, args.warmup), indent=2))
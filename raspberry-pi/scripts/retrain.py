@@ -0,0 +1,48 @@
+"""
+Re-entrenamiento del modelo de Markov fuera del servidor, con el conteo de
+n-gramas repartido entre varios procesos.
+
+    python3 scripts/retrain.py                 # un worker por núcleo
+    python3 scripts/retrain.py --workers 1     # en serie (igual que /api/retrain)
+
+/api/retrain entrena siempre en serie: el servidor tiene hilos vivos y no debe
+lanzar procesos worker. Este script es un proceso aparte sin ese estado. Al
+terminar, reiniciar el servicio (o pulsar re-entrenar) para cargar el modelo.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'generator'))
+
+from corpus_reader import iter_labeled_corpus
+from markov_model import MarkovModel
+
+CORPUS_DIR = os.path.join(BASE_DIR, '..', '..', 'examples', 'corpus')
+MODEL_FILE = os.path.join(BASE_DIR, '..', 'generator', 'markov_model.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(CORPUS_DIR, 'patterns.txt'))
+    parser.add_argument('--favorites', default=os.path.join(CORPUS_DIR, 'favorites.json'))
+    parser.add_argument('-o', '--output', default=MODEL_FILE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    start = time.time()
+    model = MarkovModel(order=2)
+    count = model.train(iter_labeled_corpus(args.corpus, args.favorites), workers=args.workers)
+    if not count:
+        print("No hay patrones para entrenar", file=sys.stderr)
+        return 1
+    model.save(args.output)
+    print(f"{count} patrones en {time.time() - start:.1f}s con {args.workers} workers")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
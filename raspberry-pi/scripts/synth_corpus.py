@@ -0,0 +1,115 @@
+"""
+Generador de corpus sintético a gran escala (pruebas de entrenamiento, tamaño
+del modelo, to_graph_json...).
+
+    python3 synth_corpus.py -n 1000000 --seed 7 -o big_corpus.txt
+    python3 synth_corpus.py -n 5000 | head
+
+Combina los operadores del propio generador: patrones en modo reglas, mutate(),
+cambios de sample dentro de la misma categoría de samples_v2.json y
+transformaciones Tidal habituales (every, jux, slow...). Escribe en formato
+corpus (un patrón por línea, marcadores "# --- ... RUN" cada bloque).
+
+Es determinista para una semilla y una misma librería de samples, y funciona
+en streaming: nunca tiene más de un patrón en memoria.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'generator'))
+
+from pattern_generator import PatternGenerator
+
+PATTERN_TYPES = ['drums', 'bass', 'melody', 'percussion', 'fx']
+STYLES = ['techno', 'ambient', 'house', 'breakbeat', 'experimental']
+
+# Transformaciones de estructura frecuentes en el corpus real
+TRANSFORMS = [
+    'every 4 (fast 2) $ ', 'every 3 (rev) $ ', 'jux rev $ ', 'slow 2 $ ', 'slow 4 $ ',
+    'fast 2 $ ', 'sometimes (# speed 2) $ ', 'degradeBy 0.3 $ ', 'chop 8 $ ', 'striate 16 $ '
+]
+
+
+def synthesize(count, seed=0, mutation_rate=0.3, swap_rate=0.3, transform_rate=0.2, generator=None):
+    """
+    Producir `count` patrones (una línea cada uno) de forma perezosa.
+
+    El generador de reglas usa el `random` global: se resiembra al empezar,
+    así que no intercalar otros usos de `random` mientras se consume.
+    """
+    generator = generator or PatternGenerator(use_ai=False)
+    random.seed(seed)
+
+    for _ in range(count):
+        pattern = generator.generate(
+            pattern_type=random.choice(PATTERN_TYPES),
+            density=random.random(),
+            complexity=random.random(),
+            style=random.choice(STYLES),
+            use_ai=False
+        )['pattern']
+
+        if random.random() < mutation_rate:
+            pattern = generator.mutate(pattern, strength=random.uniform(0.2, 0.8))['pattern']
+
+        if random.random() < swap_rate:
+            # Cambio de sample dentro de su categoría de samples_v2.json
+            # (mismo criterio que suggest_samples: el primer sample entre comillas)
+            current = re.search(r'"(\w+)', pattern)
+            suggestions = generator.suggest_samples(pattern, count=1) if current else []
+            if suggestions:
+                pattern = generator.replace_sample(pattern, current.group(1), suggestions[0])
+
+        if random.random() < transform_rate:
+            pattern = random.choice(TRANSFORMS) + pattern
+
+        yield ' '.join(pattern.split())
+
+
+def write_corpus(out, count, seed=0, block=1000, progress=None, **options):
+    """Escribir el corpus en el stream `out`; devuelve el número de patrones"""
+    out.write(f"# Corpus sintético - {count} patrones, semilla {seed}\n")
+    written = 0
+    for pattern in synthesize(count, seed=seed, **options):
+        if written % block == 0:
+            out.write(f"\n# --- SYNTHETIC RUN seed={seed} block={written // block} ---\n")
+        out.write(pattern + '\n')
+        written += 1
+        if progress and written % 100000 == 0:
+            progress(written)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--count', type=int, default=10000, help='Número de patrones')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='Fichero de salida (por defecto stdout)')
+    parser.add_argument('--block', type=int, default=1000, help='Patrones entre marcadores "# --- RUN"')
+    parser.add_argument('--mutation-rate', type=float, default=0.3)
+    parser.add_argument('--swap-rate', type=float, default=0.3)
+    parser.add_argument('--transform-rate', type=float, default=0.2)
+    args = parser.parse_args()
+
+    generator = PatternGenerator(use_ai=False)  # Carga la librería antes de medir
+    start = time.time()
+
+    def report(n):
+        print(f"{n} patrones ({n / (time.time() - start):.0f}/s)", file=sys.stderr)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        written = write_corpus(
+            out, args.count, seed=args.seed, block=args.block, progress=report, generator=generator,
+            mutation_rate=args.mutation_rate, swap_rate=args.swap_rate, transform_rate=args.transform_rate
+        )
+    finally:
+        if args.output:
+            out.close()
+
+    report(written)
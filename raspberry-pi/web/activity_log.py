@@ -0,0 +1,80 @@
+"""
+TidalAI Companion - Activity Log
+Log de actividad en memoria: buffer circular de entradas estructuradas con
+número de secuencia, para que los clientes pidan solo lo nuevo.
+"""
+
+import threading
+import time
+from collections import deque
+from itertools import islice
+from datetime import datetime
+
+LEVELS = ('debug', 'info', 'warning', 'error')
+
+
+class ActivityLog:
+    """
+    Buffer circular de tamaño fijo (las entradas más antiguas se descartan).
+
+    Cada entrada lleva un `seq` estrictamente creciente que no se reinicia al
+    descartar entradas: un cliente guarda el último seq visto y pide since(seq).
+    """
+
+    def __init__(self, maxlen=200):
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def append(self, message, level='info', event='activity', payload=None):
+        """Añadir una entrada y devolverla"""
+        if level not in LEVELS:
+            level = 'info'
+        now = time.time()
+        with self._lock:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'ts': round(now, 3),
+                'time': datetime.fromtimestamp(now).strftime("%H:%M:%S"),
+                'level': level,
+                'event': event,
+                'message': message,
+                'payload': payload or {}
+            }
+            self._entries.append(entry)
+        return entry
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def since(self, seq=0, limit=None):
+        """
+        Entradas con seq > `seq`, en orden cronológico.
+
+        Devuelve (entradas, truncated): truncated indica que el cliente se ha
+        perdido entradas (el buffer ya las descartó, o `seq` es de un proceso
+        anterior del servidor y se le envía todo el buffer).
+        """
+        with self._lock:
+            if seq > self._seq:
+                seq = 0
+                truncated = True
+            else:
+                oldest = self._entries[0]['seq'] if self._entries else self._seq + 1
+                truncated = seq > 0 and oldest > seq + 1
+            # Los seq del buffer son consecutivos: el corte es directo
+            start = max(0, seq - oldest + 1) if seq else 0
+            entries = list(islice(self._entries, start, None))
+        if limit:
+            entries = entries[-limit:]
+        return entries, truncated
+
+    def recent(self, limit=None):
+        """Últimas `limit` entradas (todas si no se indica)"""
+        return self.since(0, limit)[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
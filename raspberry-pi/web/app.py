@@ -3,7 +3,8 @@ TidalAI Companion - Flask Web Server
 Servidor web que expone API REST y sirve interfaz de control.
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, g
+from flask_socketio import SocketIO, emit
 import sys
 import os
 
@@ -12,11 +13,19 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'generator'))
 
 from pattern_generator import PatternGenerator
 from structure_engine import Conductor
+from jam_engine import JamSession
 from theory_engine import TheoryEngine
 from latent_engine import LatentEngine
 from oracle_engine import OracleEngine
 from osc_client import OSCClient
+from markov_model import GenerationCancelled
 from database import DatabaseManager
+from json_stream import iter_object_arrays
+from corpus_reader import iter_corpus, iter_labeled_corpus
+from genre_profiles import GenreProfiles
+from json_cache import json_cache
+from activity_log import ActivityLog
+from metrics import metrics
 
 import json
 import logging
@@ -25,6 +34,9 @@ import threading
 import time
 import zipfile
 import io
+import atexit
+import queue
+import uuid
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -33,6 +45,38 @@ logger = logging.getLogger(__name__)
 # Crear app Flask
 app = Flask(__name__)
 
+# Canal Socket.IO: empuja log, eventos del Conductor, generaciones y stats (sin polling)
+socketio = SocketIO(app, async_mode='threading', cors_allowed_origins='*')
+
+# --- MÉTRICAS (latencia por ruta; TIDALAI_METRICS=0 las desactiva) ---
+@app.before_request
+def metrics_start_timer():
+    if metrics.enabled:
+        g.metrics_start = time.perf_counter()
+
+@app.after_request
+def metrics_record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        # La regla de la ruta (no la URL) mantiene acotada la cardinalidad
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('tidalai_http_request_duration_seconds', time.perf_counter() - start, route=route)
+        metrics.inc('tidalai_http_requests_total', route=route, method=request.method, status=response.status_code)
+    return response
+
+metrics.gauge(
+    'tidalai_cache_hit_ratio', 'Tasa de aciertos de las cachés',
+    lambda: {(('cache', 'json'),): json_cache.stats()['hit_rate']}
+)
+metrics.gauge(
+    'tidalai_cache_lookups_total', 'Consultas a las cachés por resultado',
+    lambda: {
+        (('cache', 'json'), ('result', 'hit')): json_cache.stats()['hits'],
+        (('cache', 'json'), ('result', 'miss')): json_cache.stats()['misses']
+    },
+    kind='counter'
+)
+
 def load_config():
     """Cargar configuración desde config.json"""
     config_path = os.path.join(os.path.dirname(__file__), '..', 'config.json')
@@ -49,15 +93,12 @@ def load_config():
         }
     }
     
-    if os.path.exists(config_path):
-        with open(config_path, 'r') as f:
-            return json.load(f)
+    config = json_cache.load(config_path)
+    if config is not None:
+        return config
     else:
-        # Crear config por defecto
-        # Asegurarse de que el directorio padre existe
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        with open(config_path, 'w') as f:
-            json.dump(default_config, f, indent=2)
+        # Crear config por defecto (json_cache crea el directorio padre si hace falta)
+        json_cache.write(config_path, default_config)
         logger.warning(f"Configuración no encontrada, creada en {config_path}")
         return default_config
 
@@ -77,10 +118,8 @@ def run_nightly_build():
             
             # Cargar config si existe
             config_path = os.path.join(os.path.dirname(__file__), '..', 'config_evolution.json')
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                
+            config = json_cache.load(config_path)
+            if config is not None:
                 weights = config.get('weights', {})
                 params = config.get('params', {})
                 
@@ -101,10 +140,55 @@ def run_nightly_build():
 scheduler_thread = threading.Thread(target=run_nightly_build, daemon=True)
 scheduler_thread.start()
 
+RETENTION_MIN_INTERVAL_HOURS = 1
+
+def get_retention_config():
+    """Política de retención del historial (config.json -> history_retention)"""
+    retention = {
+        'archive_after_days': 90,
+        'thoughts_ttl_days': 7,
+        'interval_hours': 24
+    }
+    retention.update(load_config().get('history_retention', {}))
+    # Mínimo 1 hora: 0 (o un valor no numérico) haría girar la compactación en bucle
+    try:
+        retention['interval_hours'] = max(RETENTION_MIN_INTERVAL_HOURS, float(retention['interval_hours']))
+    except (TypeError, ValueError):
+        retention['interval_hours'] = 24
+    return retention
+
+def run_history_retention():
+    """Archiva historial antiguo y elimina 'thoughts' caducados periódicamente"""
+    while True:
+        try:
+            retention = get_retention_config()
+            time.sleep(60 * 60 * retention['interval_hours'])
+            
+            result = state.db.compact_history(
+                archive_after_days=retention['archive_after_days'],
+                thoughts_ttl_days=retention['thoughts_ttl_days']
+            )
+            state.log_activity(f"🧹 [Auto] Historial compactado: {result['archived']} archivados, {result['thoughts_dropped']} pensamientos eliminados")
+        except Exception as e:
+            logger.error(f"Error en retención de historial: {e}")
+            time.sleep(60)
+
+retention_thread = threading.Thread(target=run_history_retention, daemon=True)
+retention_thread.start()
+
 # Estado global de la aplicación
 class AppState:
+    # Único lugar del estado compartido entre peticiones e hilos de fondo.
+    # Es estado de proceso: el servidor corre siempre con un solo worker
+    # (ver gunicorn.conf.py), la concurrencia viene de los hilos.
     def __init__(self):
-        self.db = DatabaseManager()  # Initialize Database
+        # TIDALAI_DB: otra base de datos (benchmarks); por defecto raspberry-pi/tidal.db
+        self.db = DatabaseManager(os.environ.get('TIDALAI_DB') or None)
+        # Migración única de los antiguos almacenes JSON a la base de datos
+        self.db.migrate_json_stores(
+            presets_file=os.path.join(os.path.dirname(__file__), '..', 'presets.json'),
+            history_file=os.path.join(os.path.dirname(__file__), '..', 'history.json')
+        )
         self.generator = PatternGenerator(use_ai=True)
         self.conductor = Conductor()
         self.theory = TheoryEngine()
@@ -117,6 +201,7 @@ class AppState:
             target_ip=config['pc']['ip'],
             target_port=config['pc']['osc_port']
         )
+        self.osc_lock = threading.Lock()  # Serializa la sustitución del cliente OSC
         
         self.mode = "suggestions"
         self.config = {
@@ -128,19 +213,179 @@ class AppState:
         }
         self.last_pattern = None
         self.autonomous_running = False
-        self.activity_log = []
+        self.jam = None  # JamSession en curso (o la última terminada)
+        self.generation_streams = {}  # stream_id -> threading.Event de cancelación
+        self.activity_log = ActivityLog(maxlen=200)
+        self.import_progress = {'running': False, 'history': 0, 'favorites': 0, 'skipped': 0}
+    
+    def log_activity(self, message: str, level: str = 'info', event: str = 'activity', **payload):
+        """Añadir entrada al log de actividad (estructurada: nivel, tipo de evento y datos)"""
+        entry = self.activity_log.append(message, level=level, event=event, payload=payload)
+        getattr(logger, entry['level'])(message)
+        push_event('activity', {'entry': entry})
+
+    def osc_client_for(self, target_ip=None, target_port=None):
+        """
+        Cliente OSC para un destino: el actual si coincide, si no uno nuevo que
+        lo sustituye. Sin destino devuelve el cliente global (creándolo si falta).
+        """
+        with self.osc_lock:
+            client = self.osc_client
+            if target_ip and target_port:
+                if not client or client.target_ip != target_ip or client.target_port != int(target_port):
+                    client = OSCClient(target_ip=target_ip, target_port=int(target_port))
+                    logger.info(f"OSC Client actualizado a target específico: {target_ip}:{target_port}")
+            elif client is None:
+                config = load_config()
+                client = OSCClient(
+                    target_ip=config['pc']['ip'],
+                    target_port=config['pc']['osc_port']
+                )
+            self.osc_client = client
+            return client
+
+    def reset_osc_client(self, target_ip, target_port):
+        """Sustituir el cliente OSC global (cambio de configuración)"""
+        with self.osc_lock:
+            self.osc_client = OSCClient(target_ip=target_ip, target_port=target_port)
+            return self.osc_client
+
+# --- REALTIME (Socket.IO) ---
+realtime_clients = 0  # Clientes conectados: sin clientes no se emite nada
+realtime_stats_running = False
+realtime_lock = threading.Lock()
+REALTIME_STATS_INTERVAL = 2  # segundos
+REALTIME_OSC_EVERY = 3  # ticks (el estado OSC hace ping: no en cada tick)
+
+def push_event(event, data):
+    """Emitir un evento a todos los clientes conectados (no-op si no hay ninguno)"""
+    if realtime_clients:
+        socketio.emit(event, data)
+
+def push_generation(payload):
+    """Publicar un resultado de generación y después sus 'thoughts' uno a uno"""
+    if not realtime_clients:
+        return
+    thoughts = payload.get('thoughts') or []
+    summary = {k: v for k, v in payload.items() if k != 'thoughts'}
+    summary['thought_count'] = len(thoughts)
+    socketio.emit('generation', summary)
+    for index, thought in enumerate(thoughts):
+        socketio.emit('thought', {'timestamp': payload.get('timestamp'), 'index': index, 'thought': thought})
+
+def collect_system_stats():
+    """Estadísticas del sistema (CPU, RAM, Temp, Disk) para /api/system/stats y el canal realtime"""
+    import psutil
+    
+    # CPU
+    cpu_percent = psutil.cpu_percent(interval=None)
+    
+    # RAM
+    ram = psutil.virtual_memory()
+    ram_percent = ram.percent
+    ram_used = round(ram.used / (1024**2), 1) # MB
+    ram_total = round(ram.total / (1024**2), 1) # MB
+    
+    # Temperatura (Raspberry Pi specific)
+    temp = "N/A"
+    try:
+        temps = psutil.sensors_temperatures()
+        if 'cpu_thermal' in temps:
+            temp = temps['cpu_thermal'][0].current
+        elif 'coretemp' in temps: # PC Fallback
+            temp = temps['coretemp'][0].current
+    except:
+        pass
+        
+    # Disk
+    disk = psutil.disk_usage('/')
+    disk_percent = disk.percent
+    
+    # Uptime
+    boot_time = datetime.fromtimestamp(psutil.boot_time())
+    uptime = str(datetime.now() - boot_time).split('.')[0]
+    
+    return {
+        'cpu': cpu_percent,
+        'ram_percent': ram_percent,
+        'ram_used': ram_used,
+        'ram_total': ram_total,
+        'temp': temp,
+        'disk': disk_percent,
+        'uptime': uptime
+    }
+
+def run_realtime_stats():
+    """Empujar solo los campos de stats que cambian, mientras haya clientes conectados"""
+    global realtime_stats_running
+    last = {}
+    tick = 0
+    while True:
+        with realtime_lock:
+            if not realtime_clients:
+                realtime_stats_running = False
+                return  # Se relanza con la siguiente conexión
+        try:
+            stats = collect_system_stats()
+            if tick % REALTIME_OSC_EVERY == 0:
+                stats['osc'] = state.osc_client.get_status()
+            else:
+                stats['osc'] = last.get('osc')
+            delta = {k: v for k, v in stats.items() if last.get(k) != v}
+            if delta:
+                socketio.emit('system_stats', delta)
+            last = stats
+        except Exception as e:
+            logger.error(f"Error empujando stats: {e}")
+        tick += 1
+        socketio.sleep(REALTIME_STATS_INTERVAL)
+
+@socketio.on('connect')
+def realtime_connect():
+    global realtime_clients, realtime_stats_running
+    with realtime_lock:
+        realtime_clients += 1
+        start_stats = not realtime_stats_running
+        realtime_stats_running = True
+    if start_stats:
+        socketio.start_background_task(run_realtime_stats)
     
-    def log_activity(self, message: str):
-        """Añadir entrada al log de actividad"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        entry = f"[{timestamp}] {message}"
-        self.activity_log.append(entry)
-        if len(self.activity_log) > 50:
-            self.activity_log = self.activity_log[-50:]
-        logger.info(message)
+    # Instantánea inicial para este cliente: después solo llegan deltas
+    # (si el bucle acaba de arrancar, su primer envío ya es completo)
+    if not start_stats:
+        try:
+            emit('system_stats', dict(collect_system_stats(), osc=state.osc_client.get_status()))
+        except Exception as e:
+            logger.error(f"Error enviando stats iniciales: {e}")
+    emit('activity_snapshot', {'logs': state.activity_log.recent(), 'last_seq': state.activity_log.last_seq})
+    conductor_status = state.conductor.update()
+    if conductor_status:
+        emit('conductor', {'event': 'snapshot', 'status': conductor_status})
+
+@socketio.on('disconnect')
+def realtime_disconnect():
+    global realtime_clients
+    with realtime_lock:
+        realtime_clients = max(0, realtime_clients - 1)
 
 state = AppState()
 
+def on_conductor_event(event, status):
+    """Registrar en el log las transiciones del Conductor (las emite su reloj) y empujarlas a la UI"""
+    push_event('conductor', {'event': event, 'status': status})
+    if event == "section_change":
+        state.log_activity(f"🎻 Sección {status['section']} (compás {status['bar']}, siguiente: {status['next_section']})",
+                           event='conductor', section=status['section'], bar=status['bar'])
+    elif event == "finished":
+        state.log_activity("🎻 Conductor: fin de la estructura", event='conductor')
+    elif event == "stopped":
+        state.log_activity("🎻 Conductor detenido", event='conductor')
+
+state.conductor.subscribe(on_conductor_event)
+
+# Volcar el historial pendiente (write-behind) y cerrar conexiones al apagar
+atexit.register(state.db.close)
+
 
 @app.route('/')
 def index():
@@ -298,6 +543,32 @@ def blend_genres():
         logger.error(f"Error blending genres: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/latent/path', methods=['GET'])
+def latent_path():
+    """Trayectoria de parámetros entre dos géneros (?from=techno&to=ambient&steps=16) para automatizar morphs"""
+    try:
+        steps = min(int(request.args.get('steps', 16)), 1024)
+        path = state.latent.path(request.args.get('from'), request.args.get('to'), steps)
+        if path is None:
+            return jsonify({'success': False, 'message': 'Invalid genres'}), 400
+        return jsonify({'success': True, 'path': path})
+    except Exception as e:
+        logger.error(f"Error computing latent path: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/latent/nearest', methods=['POST'])
+def latent_nearest():
+    """Géneros más cercanos a una mezcla: {"blend": {...}, "k": 3}"""
+    try:
+        data = request.json or {}
+        blend_config = data.get('blend')
+        if not blend_config:
+            return jsonify({'success': False, 'message': 'Missing blend config'}), 400
+        return jsonify({'success': True, 'nearest': state.latent.nearest(blend_config, k=int(data.get('k', 3)))})
+    except Exception as e:
+        logger.error(f"Error finding nearest genres: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 
 @app.route('/api/samples/upload', methods=['POST'])
 def upload_samples():
@@ -313,8 +584,7 @@ def upload_samples():
         custom_samples_path = os.path.join(os.path.dirname(__file__), '..', 'generator', 'custom_samples.json')
         
         # Guardar archivo
-        with open(custom_samples_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        json_cache.write(custom_samples_path, data)
             
         # Recargar generador
         state.generator.reload_library()
@@ -328,67 +598,78 @@ def upload_samples():
         logger.error(f"Error uploading samples: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/generate', methods=['POST'])
-def generate_pattern():
+STAGE_METRIC = 'tidalai_generation_stage_seconds'
+
+def run_generation(data, emit=None, cancel=None):
     """
-    Generar nuevo patrón con parámetros especificados.
+    Pipeline completo de generación (latent, conductor, oráculo, reintentos de teoría,
+    insight, historial). Devuelve el dict de respuesta de /api/generate.
+    
+    emit(event, data) recibe cada token ('token') y cada validación ('validation')
+    según ocurren; cancel (threading.Event) aborta con GenerationCancelled.
     """
-    try:
-        data = request.get_json()
-        
-        # Extraer parámetros con valores por defecto
-        pattern_type = data.get('pattern_type', 'drums')
-        density = float(data.get('density', 0.6))
-        complexity = float(data.get('complexity', 0.5))
-        tempo = int(data.get('tempo', 140))
-        style = data.get('style', 'techno')
-        blend = data.get('blend', None)  # NEW: {"techno": 0.7, "ambient": 0.3}
-        use_ai = data.get('use_ai', state.generator.use_ai)
-        temperature = float(data.get('temperature', 1.0))
-        musical_friction = float(data.get('musical_friction', 0.2))
-        
-        # --- LATENT SPACE OVERRIDE (Phase 18) ---
-        # Si se proporciona un blend, calcular parámetros interpolados
-        if blend:
+    def emit_event(event, payload):
+        if emit:
+            emit(event, payload)
+    
+    on_thought = (lambda thought: emit('token', thought)) if emit else None
+    
+    # Extraer parámetros con valores por defecto
+    pattern_type = data.get('pattern_type', 'drums')
+    density = float(data.get('density', 0.6))
+    complexity = float(data.get('complexity', 0.5))
+    tempo = int(data.get('tempo', 140))
+    style = data.get('style', 'techno')
+    blend = data.get('blend', None)  # NEW: {"techno": 0.7, "ambient": 0.3}
+    use_ai = data.get('use_ai', state.generator.use_ai)
+    temperature = float(data.get('temperature', 1.0))
+    musical_friction = float(data.get('musical_friction', 0.2))
+    
+    # --- LATENT SPACE OVERRIDE (Phase 18) ---
+    # Si se proporciona un blend, calcular parámetros interpolados
+    if blend:
+        with metrics.span(STAGE_METRIC, stage='latent'):
             latent_params = state.latent.blend_multiple(blend)
-            if latent_params:
-                # Sobrescribir density/complexity con valores interpolados
-                density = latent_params["density_base"]
-                complexity = latent_params["complexity_base"]
-                tempo = latent_params["tempo_preference"]
-                # El estilo se usa para validación (género dominante)
-                dominant_genre = max(blend.items(), key=lambda x: x[1])[0]
-                style = dominant_genre
-                logger.info(f"🌀 Latent Blend: {blend} -> D:{density:.2f}, C:{complexity:.2f}")
-        
-        # --- CONDUCTOR OVERRIDE ---
-        # Si el "Director de Orquesta" está activo, sus parámetros tienen prioridad
-        conductor_status = state.conductor.update()
-        if conductor_status and conductor_status["status"] == "playing":
-            # Mezclar valores del conductor (bias del 80%) con los del usuario (20%)
-            # Esto permite "guiar" la canción pero obedece al plan maestro
-            c_dens = conductor_status["target_density"]
-            c_comp = conductor_status["target_complexity"]
-            
-            density = (c_dens * 0.8) + (density * 0.2)
-            complexity = (c_comp * 0.8) + (complexity * 0.2)
-            
-            # Loggear intervención del conductor
-            logger.info(f"🎻 Conductor Override: {conductor_status['section']} (D:{density:.2f}, C:{complexity:.2f})")
-
-        # Si se proporciona una intención, procesarla con el Oráculo
-        intent = data.get('intent')
-        intent_mods = None
-        if intent:
+        if latent_params:
+            # Sobrescribir density/complexity con valores interpolados
+            density = latent_params["density_base"]
+            complexity = latent_params["complexity_base"]
+            tempo = latent_params["tempo_preference"]
+            # El estilo se usa para validación (género dominante)
+            dominant_genre = max(blend.items(), key=lambda x: x[1])[0]
+            style = dominant_genre
+            logger.info(f"🌀 Latent Blend: {blend} -> D:{density:.2f}, C:{complexity:.2f}")
+    
+    # --- CONDUCTOR OVERRIDE ---
+    # Si el "Director de Orquesta" está activo, sus parámetros tienen prioridad
+    conductor_status = state.conductor.update()
+    if conductor_status and conductor_status["status"] == "playing":
+        # Mezclar valores del conductor (bias del 80%) con los del usuario (20%)
+        # Esto permite "guiar" la canción pero obedece al plan maestro
+        c_dens = conductor_status["target_density"]
+        c_comp = conductor_status["target_complexity"]
+        
+        density = (c_dens * 0.8) + (density * 0.2)
+        complexity = (c_comp * 0.8) + (complexity * 0.2)
+        
+        # Loggear intervención del conductor
+        logger.info(f"🎻 Conductor Override: {conductor_status['section']} (D:{density:.2f}, C:{complexity:.2f})")
+
+    # Si se proporciona una intención, procesarla con el Oráculo
+    intent = data.get('intent')
+    intent_mods = None
+    if intent:
+        with metrics.span(STAGE_METRIC, stage='oracle'):
             intent_mods = state.oracle.interpret(intent)
-            # Mezclar offsets del oráculo con los parámetros base
-            density = max(0.0, min(1.0, density + intent_mods.get("density_offset", 0.0)))
-            complexity = max(0.0, min(1.0, complexity + intent_mods.get("complexity_offset", 0.0)))
-            tempo += intent_mods.get("tempo_mod", 0)
-            if intent_mods.get("style_pref"):
-                style = intent_mods["style_pref"]
-
-        # Generar patrón (ahora devuelve dict con pattern y thoughts)
+        # Mezclar offsets del oráculo con los parámetros base
+        density = max(0.0, min(1.0, density + intent_mods.get("density_offset", 0.0)))
+        complexity = max(0.0, min(1.0, complexity + intent_mods.get("complexity_offset", 0.0)))
+        tempo += intent_mods.get("tempo_mod", 0)
+        if intent_mods.get("style_pref"):
+            style = intent_mods["style_pref"]
+
+    # Generar patrón (ahora devuelve dict con pattern y thoughts)
+    with metrics.span(STAGE_METRIC, stage='sample'):
         result = state.generator.generate(
             pattern_type=pattern_type,
             density=density,
@@ -398,34 +679,42 @@ def generate_pattern():
             use_ai=use_ai,
             temperature=temperature,
             musical_friction=musical_friction,
-            intent_modifiers=intent_mods
+            intent_modifiers=intent_mods,
+            on_thought=on_thought,
+            cancel=cancel,
+            blend=blend
         )
-        
-        # --- THEORY VALIDATION LOOP (Phase 17) ---
-        pattern = state.theory.sanitize_pattern(result["pattern"])
-        thoughts = result["thoughts"]
-        validation_info = {"valid": True, "issues": []}
-        
-        # Solo validar si se solicita y el motor tiene reglas para este estilo
-        # Por defecto validamos 'techno', 'house', etc.
-        if use_ai:
-            attempts = 0
-            max_attempts = 3
-            is_valid = False
-            
-            while attempts < max_attempts:
-                # Validar patrón actual
+    
+    # --- THEORY VALIDATION LOOP (Phase 17) ---
+    pattern = state.theory.sanitize_pattern(result["pattern"])
+    thoughts = result["thoughts"]
+    validation_info = {"valid": True, "issues": []}
+    
+    # Solo validar si se solicita y el motor tiene reglas para este estilo
+    # Por defecto validamos 'techno', 'house', etc.
+    if use_ai:
+        attempts = 0
+        max_attempts = 3
+        is_valid = False
+        
+        while attempts < max_attempts:
+            # Validar patrón actual
+            with metrics.span(STAGE_METRIC, stage='validate'):
                 is_valid, issues = state.theory.validate(pattern, style)
+            
+            if is_valid:
+                validation_info = {"valid": True, "issues": []}
+                emit_event('validation', {"valid": True, "issues": [], "attempt": attempts})
+                break # Éxito
+            else:
+                # Fallo: Reintentar (los tokens del siguiente intento llegan a continuación)
+                emit_event('validation', {"valid": False, "issues": issues, "attempt": attempts, "retrying": attempts + 1 < max_attempts})
+                attempts += 1
+                metrics.inc('tidalai_generation_retries_total', style=style)
+                logger.warning(f"⚠️ Theory Violation ({style}): {issues}. Retrying {attempts}/{max_attempts}...")
                 
-                if is_valid:
-                    validation_info = {"valid": True, "issues": []}
-                    break # Éxito
-                else:
-                    # Fallo: Reintentar
-                    attempts += 1
-                    logger.warning(f"⚠️ Theory Violation ({style}): {issues}. Retrying {attempts}/{max_attempts}...")
-                    
-                    # Regenerar (quizás variando temp o seed)
+                # Regenerar (quizás variando temp o seed)
+                with metrics.span(STAGE_METRIC, stage='sample'):
                     result = state.generator.generate(
                         pattern_type=pattern_type,
                         density=density,
@@ -435,29 +724,35 @@ def generate_pattern():
                         use_ai=use_ai,
                         temperature=temperature + (attempts * 0.1), # Aumentar caos ligeramente
                         musical_friction=musical_friction,
-                        intent_modifiers=intent_mods
+                        intent_modifiers=intent_mods,
+                        on_thought=on_thought,
+                        cancel=cancel,
+                        blend=blend
                     )
-                    pattern = state.theory.sanitize_pattern(result["pattern"])
-                    thoughts = result["thoughts"]
-            
-            # Si tras 3 intentos sigue fallando, marcamos como inválido pero enviamos igual (fallback)
-            if not is_valid:
-                validation_info = {"valid": False, "issues": issues}
-                thoughts.append(f"⚠️ Theory Breaker: {', '.join(issues)}")
+                pattern = state.theory.sanitize_pattern(result["pattern"])
+                thoughts = result["thoughts"]
         
-        # Obtener capas y detectar alucinaciones
+        # Si tras 3 intentos sigue fallando, marcamos como inválido pero enviamos igual (fallback)
+        if not is_valid:
+            validation_info = {"valid": False, "issues": issues}
+            thoughts.append(f"⚠️ Theory Breaker: {', '.join(issues)}")
+    
+    # Obtener capas y detectar alucinaciones
+    with metrics.span(STAGE_METRIC, stage='layers'):
         layers = state.generator.get_layers(pattern)
-        is_hallucination = any(l.get('is_hallucination', False) for l in layers)
-        
-        # --- MUSICAL INSIGHT (Theorist Insight) ---
+    is_hallucination = any(l.get('is_hallucination', False) for l in layers)
+    
+    # --- MUSICAL INSIGHT (Theorist Insight) ---
+    with metrics.span(STAGE_METRIC, stage='insight'):
         musical_insight = state.theory.get_musical_insight(pattern, style)
-        
-        # Guardar último patrón
-        state.last_pattern = pattern
-        mode_str = "IA" if use_ai else "Reglas"
-        temp_str = f" (T={temperature})" if use_ai else ""
-        
-        # Save to Database History
+    
+    # Guardar último patrón
+    state.last_pattern = pattern
+    mode_str = "IA" if use_ai else "Reglas"
+    temp_str = f" (T={temperature})" if use_ai else ""
+    
+    # Save to Database History
+    with metrics.span(STAGE_METRIC, stage='db_write'):
         state.db.add_history_entry(
             pattern=pattern,
             style=style,
@@ -466,21 +761,33 @@ def generate_pattern():
             tempo=tempo,
             thoughts=thoughts
         )
-        
-        state.log_activity(f"Patrón generado con {mode_str}{temp_str}: {pattern_type} (densidad={density:.2f}, complejidad={complexity:.2f})")
-        
-        return jsonify({
-            'success': True,
-            'pattern': pattern,
-            'thoughts': thoughts,
-            'insight': musical_insight,
-            'mode': mode_str,
-            'temperature': temperature if use_ai else None,
-            'layers': layers,
-            'is_hallucination': is_hallucination,
-            'validation': validation_info,
-            'timestamp': int(datetime.now().timestamp())
-        })
+    
+    state.log_activity(f"Patrón generado con {mode_str}{temp_str}: {pattern_type} (densidad={density:.2f}, complejidad={complexity:.2f})",
+                       event='generation', pattern_type=pattern_type, style=style, mode=mode_str)
+    
+    response = {
+        'success': True,
+        'pattern': pattern,
+        'thoughts': thoughts,
+        'insight': musical_insight,
+        'mode': mode_str,
+        'temperature': temperature if use_ai else None,
+        'layers': layers,
+        'is_hallucination': is_hallucination,
+        'validation': validation_info,
+        'timestamp': int(datetime.now().timestamp())
+    }
+    push_generation(response)
+    return response
+
+
+@app.route('/api/generate', methods=['POST'])
+def generate_pattern():
+    """
+    Generar nuevo patrón con parámetros especificados.
+    """
+    try:
+        return jsonify(run_generation(request.get_json()))
         
     except Exception as e:
         logger.error(f"Error generando patrón: {e}")
@@ -490,6 +797,69 @@ def generate_pattern():
         }), 500
 
 
+def sse_event(event, data):
+    """Formatear un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/generate/stream', methods=['POST'])
+def generate_pattern_stream():
+    """
+    Variante en streaming de /api/generate (Server-Sent Events).
+    
+    Eventos: start {stream_id} -> token (uno por token muestreado, con alternativas)
+    -> validation (por intento) -> result (mismo JSON que /api/generate),
+    o cancelled / error. Cerrar la conexión o llamar a /api/generate/cancel
+    detiene el muestreo y libera la CPU.
+    """
+    data = request.get_json() or {}
+    stream_id = uuid.uuid4().hex[:12]
+    cancel = threading.Event()
+    events = queue.Queue()
+    state.generation_streams[stream_id] = cancel
+    
+    def worker():
+        try:
+            events.put(('result', run_generation(data, emit=lambda e, d: events.put((e, d)), cancel=cancel)))
+        except GenerationCancelled:
+            events.put(('cancelled', {'stream_id': stream_id}))
+        except Exception as e:
+            logger.error(f"Error en generación streaming: {e}")
+            events.put(('error', {'success': False, 'error': str(e)}))
+        finally:
+            events.put(None)
+    
+    def stream():
+        try:
+            yield sse_event('start', {'stream_id': stream_id})
+            while True:
+                item = events.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+        finally:
+            # Fin normal o cliente desconectado: en ambos casos el worker no debe seguir
+            cancel.set()
+            state.generation_streams.pop(stream_id, None)
+    
+    threading.Thread(target=worker, name=f"generate-{stream_id}", daemon=True).start()
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/generate/cancel', methods=['POST'])
+def cancel_generation():
+    """Cancelar una generación en streaming por su stream_id"""
+    data = request.get_json() or {}
+    cancel = state.generation_streams.get(data.get('stream_id'))
+    if cancel is None:
+        return jsonify({'success': False, 'error': 'Stream no encontrado'}), 404
+    cancel.set()
+    return jsonify({'success': True})
+
+
 @app.route('/api/generate/macro', methods=['POST'])
 def generate_macro_wave():
     """
@@ -634,6 +1004,20 @@ def oracle_interpret():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/oracle/suggest', methods=['GET'])
+def oracle_suggest():
+    """Entradas del léxico más parecidas a una palabra (?word=agresibo&limit=3), con puntuación"""
+    try:
+        word = request.args.get('word', '').strip()
+        if not word:
+            return jsonify({'success': False, 'message': 'Missing word'}), 400
+        limit = min(int(request.args.get('limit', 3)), 20)
+        return jsonify({'success': True, 'matches': state.oracle.fuzzy_matches(word, limit)})
+    except Exception as e:
+        logger.error(f"Error en sugerencias del oráculo: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/send', methods=['POST'])
 def send_pattern():
     """
@@ -676,21 +1060,9 @@ def send_pattern():
         target_ip = data.get('target_ip')
         target_port = data.get('target_port')
         
-        if target_ip and target_port:
-             # Si los parámetros son diferentes a los actuales, recrear cliente
-             if not state.osc_client or state.osc_client.target_ip != target_ip or state.osc_client.target_port != int(target_port):
-                state.osc_client = OSCClient(target_ip=target_ip, target_port=int(target_port))
-                logger.info(f"OSC Client actualizado a target específico: {target_ip}:{target_port}")
-             client_to_use = state.osc_client
-        else:
-            # Fallback al cliente global
-            if state.osc_client is None:
-                config = load_config()
-                state.osc_client = OSCClient(
-                    target_ip=config['pc']['ip'],
-                    target_port=config['pc']['osc_port']
-                )
-            client_to_use = state.osc_client
+        # Si los parámetros son diferentes a los actuales se recrea el cliente;
+        # sin destino, fallback al cliente global
+        client_to_use = state.osc_client_for(target_ip, target_port)
 
         # 1. DETECTAR SI ES UN PATRÓN MULTI-CANAL (MACRO)
         import re
@@ -858,7 +1230,7 @@ def status():
         'osc': osc_status,
         'last_pattern': state.last_pattern,
         'autonomous_running': state.autonomous_running,
-        'activity_log': state.activity_log[-10:]  # Últimas 10 entradas
+        'activity_log': state.activity_log.recent(10)  # Últimas 10 entradas
     })
 
 
@@ -928,42 +1300,123 @@ def favorites():
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Obtener historial desde la base de datos"""
+    """Obtener historial desde la base de datos (paginación por cursor con ?before_id=&before_ts=)"""
     try:
         limit = int(request.args.get('limit', 50))
-        history = state.db.get_history(limit)
+        before_id = request.args.get('before_id', type=int)
+        # before_ts es opcional: sin él el cursor se busca por id (también en history_archive)
+        before_ts = request.args.get('before_ts')
+        history = state.db.get_history(limit, before_id=before_id, before_ts=before_ts)
+        more = len(history) == limit
         return jsonify({
             'success': True,
-            'history': history
+            'history': history,
+            # Cursor para la siguiente página (None si no hay más)
+            'next_before_id': history[-1]['id'] if more else None,
+            'next_before_ts': history[-1]['timestamp'] if more else None
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/history/compact', methods=['POST'])
+def compact_history():
+    """Ejecutar manualmente la retención del historial"""
+    try:
+        retention = get_retention_config()
+        data = request.get_json(silent=True) or {}
+        
+        result = state.db.compact_history(
+            archive_after_days=data.get('archive_after_days', retention['archive_after_days']),
+            thoughts_ttl_days=data.get('thoughts_ttl_days', retention['thoughts_ttl_days'])
+        )
+        state.log_activity(f"🧹 Historial compactado: {result['archived']} archivados, {result['thoughts_dropped']} pensamientos eliminados")
+        
+        return jsonify({'success': True, 'result': result})
+    except Exception as e:
+        logger.error(f"Error compactando historial: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/search', methods=['GET'])
+def search_patterns():
+    """
+    Búsqueda full-text y estructural en historial y favoritos.
+    
+    Query params:
+        q: texto libre y/o campo:valor (ej: "uses 808bd and jux, style techno", "sample:bd fn:every")
+        source: history | favorites (opcional)
+        limit: máximo de resultados (default 20)
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        source = request.args.get('source')
+        limit = min(int(request.args.get('limit', 20)), 200)
+        
+        if not query:
+            return jsonify({'success': False, 'error': 'Consulta vacía'}), 400
+        
+        results = state.db.search_patterns(query, limit=limit, source=source)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'count': len(results)
+        })
+    except Exception as e:
+        logger.error(f"Error en búsqueda: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/data/import', methods=['POST'])
 def import_data():
-    """Importar datos masivos desde localStorage (Migración)"""
+    """
+    Importar datos masivos desde localStorage (Migración).
+    El cuerpo {"history": [...], "favorites": [...]} se procesa en streaming:
+    nunca se carga entero en memoria y cada bloque se inserta en su propia
+    transacción corta (el lock de escritura no espera a la red). Si falla a
+    mitad, los bloques ya confirmados se quedan y la respuesta dice cuántos.
+    """
     try:
-        data = request.get_json()
-        history = data.get('history', [])
-        favorites = data.get('favorites', [])
+        state.import_progress = {'running': True, 'history': 0, 'favorites': 0, 'skipped': 0}
         
-        h_count, f_count = state.db.import_client_data(history, favorites)
+        def on_progress(counts):
+            state.import_progress.update(counts)
         
+        records = (
+            (key, item) for key, item in iter_object_arrays(request.stream)
+            if key in ('history', 'favorites')
+        )
+        result = state.db.bulk_import(records, progress=on_progress)
+        state.import_progress = dict(result, running=False)
+        
+        h_count, f_count = result['history'], result['favorites']
         state.log_activity(f"📦 Migración de datos: {h_count} historial, {f_count} favoritos.")
         
-        return jsonify({
-            'success': True,
+        response = {
+            'success': 'error' not in result,
             'imported': {
                 'history': h_count,
                 'favorites': f_count
-            }
-        })
+            },
+            'skipped': result['skipped']
+        }
+        if 'error' in result:
+            response.update(error=result['error'], resume=result['resume'])
+            return jsonify(response), 500
+        return jsonify(response)
     except Exception as e:
+        state.import_progress['running'] = False
         logger.error(f"Error import data: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/data/import/status', methods=['GET'])
+def import_data_status():
+    """Progreso de la migración en curso (o resultado de la última)"""
+    return jsonify({'success': True, 'progress': state.import_progress})
+
+
 @app.route('/api/retrain', methods=['POST'])
 def retrain_model():
     """
@@ -979,47 +1432,44 @@ def retrain_model():
         favorites_file = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'favorites.json')
         model_file = os.path.join(os.path.dirname(__file__), '..', 'generator', 'markov_model.json')
         
-        # Cargar corpus base
-        patterns = []
-        if os.path.exists(corpus_file):
-            with open(corpus_file, 'r') as f:
-                patterns = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        # Entrenar modelo leyendo el corpus en streaming (corpus base + favoritos)
+        state.log_activity("Re-entrenando modelo con el corpus...")
         
-        # Añadir favoritos (extraer solo los patrones)
-        if os.path.exists(favorites_file):
-            with open(favorites_file, 'r') as f:
-                favorites_data = json.load(f)
-                # Extraer patrones de objetos JSON
-                favorite_patterns = [fav['pattern'] for fav in favorites_data if 'pattern' in fav]
-                patterns.extend(favorite_patterns)
+        model = MarkovModel(order=2)
+        # En serie: el servidor no lanza procesos worker (ver scripts/retrain.py
+        # para el entrenamiento paralelo). Sub-modelos por género y tipo según
+        # las etiquetas del corpus
+        pattern_count = model.train(iter_labeled_corpus(corpus_file, favorites_file))
         
-        if not patterns:
+        if not pattern_count:
             return jsonify({
                 'success': False,
                 'error': 'No hay patrones para entrenar'
             }), 400
         
-        # Entrenar modelo
-        state.log_activity(f"Re-entrenando modelo con {len(patterns)} patrones...")
-        
-        model = MarkovModel(order=2)
-        model.train(patterns)
         model.save(model_file)
         
         # Recargar modelo en el generador
         state.generator._init_markov_model()
         
-        state.log_activity(f"✓ Modelo re-entrenado exitosamente")
+        # Perfiles de género: solo se lee lo añadido al corpus desde el último
+        # re-entrenamiento. El motor latente nuevo sustituye al anterior de una vez
+        profiles = GenreProfiles()
+        profiled = profiles.refresh(corpus_file, favorites_file)
+        profiles.save()
+        state.latent = LatentEngine()
+        
+        state.log_activity(f"✓ Modelo re-entrenado con {pattern_count} patrones")
         
         return jsonify({
             'success': True,
-            'message': f'Modelo re-entrenado con {len(patterns)} patrones',
-            'pattern_count': len(patterns)
+            'message': f'Modelo re-entrenado con {pattern_count} patrones',
+            'pattern_count': pattern_count,
+            'profiled_patterns': profiled
         })
         
     except Exception as e:
-        logger.error(f"Error re-entrenando modelo: {e}")
-        state.log_activity(f"✗ Error re-entrenando modelo: {str(e)}")
+        state.log_activity(f"✗ Error re-entrenando modelo: {str(e)}", level='error', event='training')
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1107,9 +1557,9 @@ def config_evolution():
     
     if request.method == 'GET':
         try:
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    return jsonify(json.load(f))
+            config = json_cache.load(config_path)
+            if config is not None:
+                return jsonify(config)
             else:
                 return jsonify({
                     "weights": {"density": 1.0, "variety": 1.0, "complexity": 1.0, "euclidean": 1.0},
@@ -1122,8 +1572,7 @@ def config_evolution():
     elif request.method == 'POST':
         try:
             new_config = request.get_json()
-            with open(config_path, 'w') as f:
-                json.dump(new_config, f, indent=4)
+            json_cache.write(config_path, new_config, indent=4)
             return jsonify({'success': True})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
@@ -1157,19 +1606,11 @@ def presets():
     POST: Guardar nuevo preset
     DELETE: Eliminar preset
     """
-    presets_file = os.path.join(os.path.dirname(__file__), '..', 'presets.json')
-    
     if request.method == 'GET':
         try:
-            if os.path.exists(presets_file):
-                with open(presets_file, 'r') as f:
-                    presets_data = json.load(f)
-            else:
-                presets_data = []
-            
             return jsonify({
                 'success': True,
-                'presets': presets_data
+                'presets': state.db.get_presets()
             })
         except Exception as e:
             logger.error(f"Error leyendo presets: {e}")
@@ -1183,16 +1624,6 @@ def presets():
             if not name:
                 return jsonify({'success': False, 'error': 'Nombre vacío'}), 400
             
-            # Leer presets existentes
-            presets_data = []
-            if os.path.exists(presets_file):
-                with open(presets_file, 'r') as f:
-                    presets_data = json.load(f)
-            
-            # Verificar si ya existe
-            if any(p['name'] == name for p in presets_data):
-                return jsonify({'success': False, 'error': 'Preset ya existe'}), 400
-            
             # Crear nuevo preset
             new_preset = {
                 'name': name,
@@ -1205,11 +1636,10 @@ def presets():
                 'temperature': data.get('temperature', 1.0),
                 'timestamp': int(datetime.now().timestamp())
             }
-            presets_data.append(new_preset)
             
-            # Guardar
-            with open(presets_file, 'w') as f:
-                json.dump(presets_data, f, indent=2)
+            # El nombre es UNIQUE: la comprobación y la inserción son atómicas
+            if not state.db.add_preset(new_preset):
+                return jsonify({'success': False, 'error': 'Preset ya existe'}), 400
             
             state.log_activity(f"Preset '{name}' guardado")
             
@@ -1227,21 +1657,9 @@ def presets():
             if not name:
                 return jsonify({'success': False, 'error': 'Nombre vacío'}), 400
             
-            if not os.path.exists(presets_file):
-                return jsonify({'success': False, 'error': 'No hay presets'}), 404
-            
-            with open(presets_file, 'r') as f:
-                presets_data = json.load(f)
-            
-            original_count = len(presets_data)
-            presets_data = [p for p in presets_data if p['name'] != name]
-            
-            if len(presets_data) == original_count:
+            if not state.db.delete_preset(name):
                 return jsonify({'success': False, 'error': 'Preset no encontrado'}), 404
             
-            with open(presets_file, 'w') as f:
-                json.dump(presets_data, f, indent=2)
-            
             state.log_activity(f"Preset '{name}' eliminado")
             
             return jsonify({'success': True, 'message': 'Preset eliminado'})
@@ -1258,20 +1676,11 @@ def history():
     POST: Añadir patrón al historial
     DELETE: Limpiar historial
     """
-    history_file = os.path.join(os.path.dirname(__file__), '..', 'history.json')
-    MAX_HISTORY = 100
-    
     if request.method == 'GET':
         try:
-            if os.path.exists(history_file):
-                with open(history_file, 'r') as f:
-                    history_data = json.load(f)
-            else:
-                history_data = []
-            
             return jsonify({
                 'success': True,
-                'history': history_data
+                'history': state.db.get_session_history()
             })
         except Exception as e:
             logger.error(f"Error leyendo historial: {e}")
@@ -1285,13 +1694,7 @@ def history():
             if not pattern:
                 return jsonify({'success': False, 'error': 'Patrón vacío'}), 400
             
-            # Leer historial existente
-            history_data = []
-            if os.path.exists(history_file):
-                with open(history_file, 'r') as f:
-                    history_data = json.load(f)
-            
-            # Añadir nuevo patrón
+            # Añadir nuevo patrón (la tabla conserva solo los últimos SESSION_HISTORY_MAX)
             new_entry = {
                 'pattern': pattern,
                 'type': data.get('type', 'unknown'),
@@ -1299,14 +1702,8 @@ def history():
                 'temperature': data.get('temperature'),
                 'timestamp': int(datetime.now().timestamp())
             }
-            history_data.insert(0, new_entry)  # Añadir al principio
-            
-            # Mantener solo últimos MAX_HISTORY
-            history_data = history_data[:MAX_HISTORY]
-            
-            # Guardar
-            with open(history_file, 'w') as f:
-                json.dump(history_data, f, indent=2)
+            if not state.db.add_session_history(new_entry):
+                return jsonify({'success': False, 'error': 'No se pudo guardar'}), 500
             
             return jsonify({'success': True, 'message': 'Añadido al historial'})
             
@@ -1317,9 +1714,7 @@ def history():
     elif request.method == 'DELETE':
         try:
             # Limpiar historial
-            if os.path.exists(history_file):
-                with open(history_file, 'w') as f:
-                    json.dump([], f)
+            state.db.replace_session_history([])
             
             state.log_activity("Historial limpiado")
             
@@ -1458,17 +1853,18 @@ def stop():
         data = request.get_json()
         channel = data.get('channel', 'all')
         
-        if state.osc_client is None:
+        osc_client = state.osc_client
+        if osc_client is None:
             return jsonify({
                 'success': False,
                 'error': 'OSC client no inicializado'
             }), 400
         
         if channel == 'all':
-            success = state.osc_client.stop_all()
+            success = osc_client.stop_all()
             state.log_activity("Todos los canales detenidos")
         else:
-            success = state.osc_client.stop_channel(channel)
+            success = osc_client.stop_channel(channel)
             state.log_activity(f"Canal {channel} detenido")
         
         return jsonify({
@@ -1499,51 +1895,31 @@ def corpus_stats():
         corpus_file = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'patterns.txt')
         favorites_file = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'favorites.json')
         
-        # Cargar patrones
-        patterns = []
-        if os.path.exists(corpus_file):
-            with open(corpus_file, 'r') as f:
-                patterns = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-        
-        # Añadir favoritos
-        if os.path.exists(favorites_file):
-            with open(favorites_file, 'r') as f:
-                favorites_data = json.load(f)
-                favorite_patterns = [fav['pattern'] for fav in favorites_data if 'pattern' in fav]
-                patterns.extend(favorite_patterns)
+        # Una sola pasada sobre el corpus en streaming
+        effect_keywords = ['lpf', 'hpf', 'delay', 'reverb', 'crush', 'distort', 'gain', 'pan', 'speed', 'slow', 'fast']
+        sample_counter = Counter()
+        effect_counter = Counter()
+        total_patterns = 0
+        total_length = 0
+        
+        for pattern in iter_corpus(corpus_file, favorites_file):
+            total_patterns += 1
+            total_length += len(pattern)
+            # Buscar sound "..."
+            sample_counter.update(re.findall(r'sound\s+"([^"]+)"', pattern))
+            effect_counter.update(effect for effect in effect_keywords if effect in pattern)
         
-        if not patterns:
+        if not total_patterns:
             return jsonify({
                 'success': False,
                 'error': 'No hay patrones en el corpus'
             }), 400
         
-        # Análisis
-        total_patterns = len(patterns)
-        
-        # Contar samples más usados
-        samples = []
-        for pattern in patterns:
-            # Buscar sound "..."
-            sound_matches = re.findall(r'sound\s+"([^"]+)"', pattern)
-            samples.extend(sound_matches)
-        
-        sample_counter = Counter(samples)
         top_samples = sample_counter.most_common(10)
-        
-        # Contar efectos más usados
-        effects = []
-        effect_keywords = ['lpf', 'hpf', 'delay', 'reverb', 'crush', 'distort', 'gain', 'pan', 'speed', 'slow', 'fast']
-        for pattern in patterns:
-            for effect in effect_keywords:
-                if effect in pattern:
-                    effects.append(effect)
-        
-        effect_counter = Counter(effects)
         top_effects = effect_counter.most_common(10)
         
         # Longitud promedio
-        avg_length = sum(len(p) for p in patterns) / len(patterns)
+        avg_length = total_length / total_patterns
         
         # Distribución por tipo (si están categorizados en favoritos)
         type_distribution = {}
@@ -1574,51 +1950,18 @@ def corpus_stats():
 # ADMIN ROUTES
 # ==========================================
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas en formato de texto de Prometheus (vacío si TIDALAI_METRICS=0)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/system/stats', methods=['GET'])
 def system_stats():
     """Retornar estadísticas del sistema (CPU, RAM, Temp, Disk)"""
     try:
-        import psutil
-        
-        # CPU
-        cpu_percent = psutil.cpu_percent(interval=None)
-        
-        # RAM
-        ram = psutil.virtual_memory()
-        ram_percent = ram.percent
-        ram_used = round(ram.used / (1024**2), 1) # MB
-        ram_total = round(ram.total / (1024**2), 1) # MB
-        
-        # Temperatura (Raspberry Pi specific)
-        temp = "N/A"
-        try:
-            temps = psutil.sensors_temperatures()
-            if 'cpu_thermal' in temps:
-                temp = temps['cpu_thermal'][0].current
-            elif 'coretemp' in temps: # PC Fallback
-                temp = temps['coretemp'][0].current
-        except:
-            pass
-            
-        # Disk
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
-        
-        # Uptime
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = str(datetime.now() - boot_time).split('.')[0]
-        
         return jsonify({
             'success': True,
-            'stats': {
-                'cpu': cpu_percent,
-                'ram_percent': ram_percent,
-                'ram_used': ram_used,
-                'ram_total': ram_total,
-                'temp': temp,
-                'disk': disk_percent,
-                'uptime': uptime
-            }
+            'stats': collect_system_stats()
         })
         
     except ImportError:
@@ -1629,10 +1972,21 @@ def system_stats():
 
 @app.route('/api/system/logs', methods=['GET'])
 def system_logs():
-    """Retornar log de actividad interno"""
+    """
+    Retornar log de actividad interno.
+    
+    Con ?since=<seq> solo se devuelven las entradas posteriores (polling
+    incremental); el cliente guarda `last_seq` para la siguiente petición.
+    `truncated` indica que se ha perdido entradas y debe repintar el log.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    logs, truncated = state.activity_log.since(max(0, since), limit)
     return jsonify({
         'success': True,
-        'logs': state.activity_log
+        'logs': logs,
+        'last_seq': logs[-1]['seq'] if logs else state.activity_log.last_seq,
+        'truncated': truncated
     })
 
 @app.route('/api/system/restart', methods=['POST'])
@@ -1646,6 +2000,8 @@ def system_restart():
         def kill_later():
             import time
             time.sleep(1)
+            # os._exit no ejecuta atexit: volcar historial pendiente antes
+            state.db.close()
             os._exit(1)
             
         import threading
@@ -1666,11 +2022,7 @@ def system_config():
     
     if request.method == 'GET':
         try:
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-            else:
-                config = {'pc': {'ip': '127.0.0.1', 'osc_port': 6010}}
+            config = json_cache.load(config_file, default={'pc': {'ip': '127.0.0.1', 'osc_port': 6010}})
             
             return jsonify({'success': True, 'config': config})
         except Exception as e:
@@ -1686,12 +2038,8 @@ def system_config():
             if not target_ip:
                 return jsonify({'success': False, 'error': 'IP requerida'}), 400
             
-            # Cargar config actual
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-            else:
-                config = {'pc': {'ip': '127.0.0.1', 'osc_port': 6010}}
+            # Cargar config actual (copia: se modifica antes de guardar)
+            config = json_cache.load(config_file, default={'pc': {'ip': '127.0.0.1', 'osc_port': 6010}}, copy=True)
             
             # Actualizar
             config['pc']['ip'] = target_ip
@@ -1699,14 +2047,10 @@ def system_config():
                 config['pc']['osc_port'] = int(target_port)
             
             # Guardar
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            json_cache.write(config_file, config)
             
             # Reiniciar cliente OSC con nueva IP
-            state.osc_client = OSCClient(
-                target_ip=config['pc']['ip'],
-                target_port=config['pc']['osc_port']
-            )
+            state.reset_osc_client(config['pc']['ip'], config['pc']['osc_port'])
             
             state.log_activity(f"Configuración actualizada: IP PC = {target_ip}")
             
@@ -1720,15 +2064,18 @@ def system_config():
 @app.route('/api/jam-session', methods=['POST'])
 def jam_session():
     """
-    Iniciar sesión de jam (generación continua)
+    Iniciar sesión de jam (generación continua en segundo plano)
     
     Request JSON:
     {
         "duration": 10,  # minutos
-        "interval": 8,   # segundos entre patrones
+        "interval": 8,   # segundos entre patrones (se redondea a compases)
         "channels": ["d1", "d2"],
         "types": ["drums", "bass"]
     }
+    
+    Los patrones se generan con antelación y se envían en los límites de compás,
+    siguiendo las secciones del Conductor si está activo.
     """
     try:
         data = request.get_json()
@@ -1745,23 +2092,48 @@ def jam_session():
         if interval < 2 or interval > 60:
             return jsonify({'success': False, 'error': 'Intervalo debe estar entre 2 y 60 segundos'}), 400
         
-        # Calcular cuántos patrones generar
-        total_seconds = duration * 60
-        pattern_count = total_seconds // interval
+        if not channels or not pattern_types:
+            return jsonify({'success': False, 'error': 'Se necesita al menos un canal y un tipo'}), 400
+        
+        # Destino OSC (prioridad: request > cliente global), igual que /api/send
+        osc_client = state.osc_client_for(data.get('target_ip'), data.get('target_port'))
+        
+        # Una sola jam a la vez: la nueva reemplaza a la anterior
+        if state.jam and state.jam.running:
+            state.jam.stop()
+        
+        use_ai = data.get('use_ai', state.generator.use_ai)
+        state.jam = JamSession(
+            generator=state.generator,
+            theory=state.theory,
+            conductor=state.conductor,
+            osc_client=osc_client,
+            channels=channels,
+            pattern_types=pattern_types,
+            duration_minutes=duration,
+            interval=interval,
+            tempo=int(data.get('tempo', state.config['tempo'])),
+            style=data.get('style', state.config['style']),
+            density=float(data.get('density', state.config['density'])),
+            complexity=float(data.get('complexity', state.config['complexity'])),
+            use_ai=use_ai,
+            temperature=float(data.get('temperature', 1.0)),
+            log=lambda message: state.log_activity(message, event='jam')
+        )
+        state.jam.start()
         
         state.log_activity(f"Jam session iniciada: {duration}min, {interval}s intervalo, {len(channels)} canales")
         
-        # Nota: La generación continua se haría con threading o async
-        # Por ahora retornamos la configuración
         return jsonify({
             'success': True,
-            'message': 'Jam session configurada',
+            'message': 'Jam session iniciada',
             'config': {
                 'duration': duration,
                 'interval': interval,
                 'channels': channels,
                 'types': pattern_types,
-                'estimated_patterns': pattern_count
+                'bars_per_change': state.jam.bars_per_change,
+                'estimated_patterns': len(state.jam.slot_bars)
             }
         })
         
@@ -1770,6 +2142,30 @@ def jam_session():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/jam-session/status', methods=['GET'])
+def jam_session_status():
+    """Estado de la jam: compás actual, buffer de lookahead y últimos patrones enviados"""
+    if state.jam is None:
+        return jsonify({'success': True, 'active': False})
+    
+    status = state.jam.status()
+    return jsonify({'success': True, 'active': status['running'], 'jam': status})
+
+
+@app.route('/api/jam-session/stop', methods=['POST'])
+def jam_session_stop():
+    """Detener la jam (opcionalmente silenciando sus canales)"""
+    data = request.get_json(silent=True) or {}
+    
+    if state.jam is None or not state.jam.running:
+        return jsonify({'success': False, 'error': 'No hay jam en curso'}), 400
+    
+    state.jam.stop(silence=data.get('silence', False))
+    state.log_activity("Jam session detenida")
+    
+    return jsonify({'success': True, 'jam': state.jam.status()})
+
+
 @app.route('/api/backup', methods=['GET'])
 def create_backup():
     """
@@ -1791,8 +2187,6 @@ def create_backup():
         # Archivos a incluir
         files_to_backup = [
             ('favorites.json', os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'favorites.json')),
-            ('presets.json', os.path.join(os.path.dirname(__file__), '..', 'presets.json')),
-            ('history.json', os.path.join(os.path.dirname(__file__), '..', 'history.json')),
             ('markov_model.json', os.path.join(os.path.dirname(__file__), '..', 'generator', 'markov_model.json'))
         ]
         
@@ -1801,6 +2195,10 @@ def create_backup():
             for filename, filepath in files_to_backup:
                 if os.path.exists(filepath):
                     zipf.write(filepath, filename)
+            
+            # Presets e historial viven en la base de datos: exportar con el formato JSON de siempre
+            zipf.writestr('presets.json', json.dumps(state.db.get_presets(), indent=2))
+            zipf.writestr('history.json', json.dumps(state.db.get_session_history(), indent=2))
         
         state.log_activity(f"Backup creado: {backup_name}")
         
@@ -1846,12 +2244,19 @@ def restore_backup():
         files_restored = []
         with zipfile.ZipFile(temp_path, 'r') as zipf:
             for filename in zipf.namelist():
+                # Presets e historial se restauran directamente en la base de datos
+                if filename in ('presets.json', 'history.json'):
+                    with zipf.open(filename) as source:
+                        restored = json.load(source)
+                    if filename == 'presets.json':
+                        state.db.replace_presets(restored)
+                    else:
+                        state.db.replace_session_history(restored)
+                    files_restored.append(filename)
+                    continue
+                
                 if filename == 'favorites.json':
                     target = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'favorites.json')
-                elif filename == 'presets.json':
-                    target = os.path.join(os.path.dirname(__file__), '..', 'presets.json')
-                elif filename == 'history.json':
-                    target = os.path.join(os.path.dirname(__file__), '..', 'history.json')
                 elif filename == 'markov_model.json':
                     target = os.path.join(os.path.dirname(__file__), '..', 'generator', 'markov_model.json')
                 else:
@@ -1907,11 +2312,8 @@ def export_tidal():
         
         # Cargar patrones según fuente
         if source == 'history':
-            history_file = os.path.join(os.path.dirname(__file__), '..', 'history.json')
-            if os.path.exists(history_file):
-                with open(history_file, 'r') as f:
-                    history_data = json.load(f)
-                    patterns = [{'pattern': h['pattern'], 'type': h.get('type', 'unknown'), 'mode': h.get('mode', 'unknown')} for h in history_data]
+            history_data = state.db.get_session_history()
+            patterns = [{'pattern': h['pattern'], 'type': h.get('type') or 'unknown', 'mode': h.get('mode') or 'unknown'} for h in history_data]
         
         elif source == 'favorites':
             favorites_file = os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'corpus', 'favorites.json')
@@ -1977,12 +2379,8 @@ def get_song_templates():
     try:
         templates_file = os.path.join(os.path.dirname(__file__), '..', 'song_templates.json')
         
-        if os.path.exists(templates_file):
-            with open(templates_file, 'r') as f:
-                templates = json.load(f)
-        else:
-            # Templates por defecto si no existe el archivo
-            templates = []
+        # Templates por defecto si no existe el archivo
+        templates = json_cache.load(templates_file, default=[])
         
         return jsonify({
             'success': True,
@@ -2015,12 +2413,10 @@ def generate_song():
         # Cargar template
         templates_file = os.path.join(os.path.dirname(__file__), '..', 'song_templates.json')
         
-        if not os.path.exists(templates_file):
+        templates = json_cache.load(templates_file)
+        if templates is None:
             return jsonify({'success': False, 'error': 'No hay templates disponibles'}), 400
         
-        with open(templates_file, 'r') as f:
-            templates = json.load(f)
-        
         template = next((t for t in templates if t['name'] == template_name), None)
         
         if not template:
@@ -2145,10 +2541,8 @@ def handle_samples():
     
     if request.method == 'GET':
         try:
-            if os.path.exists(samples_file):
-                with open(samples_file, 'r') as f:
-                    samples = json.load(f)
-            else:
+            samples = json_cache.load(samples_file)
+            if samples is None:
                 # Si no existe, devolver valores actuales del generador
                 # Esto es un fallback, pero idealmente samples.json debería existir
                 samples = {
@@ -2170,8 +2564,7 @@ def handle_samples():
                 return jsonify({'success': False, 'error': 'Datos inválidos'}), 400
             
             # Guardar en archivo
-            with open(samples_file, 'w') as f:
-                json.dump(new_samples, f, indent=2)
+            json_cache.write(samples_file, new_samples)
             
             # Recargar generador
             state.generator._init_pattern_library()
@@ -2260,11 +2653,8 @@ def run_evolution_manual():
         
         # Cargar config si existe
         config_path = os.path.join(os.path.dirname(__file__), '..', 'config_evolution.json')
-        weights = {}
-        if os.path.exists(config_path):
-             with open(config_path, 'r') as f:
-                 config = json.load(f)
-                 weights = config.get('weights', {})
+        config = json_cache.load(config_path, default={})
+        weights = config.get('weights', {})
 
         result = trainer.run_evolution(weights=weights)
         
@@ -2290,4 +2680,10 @@ if __name__ == '__main__':
     logger.info(f"Iniciando en http://{host}:{port}")
     logger.info(f"OSC target: {config['pc']['ip']}:{config['pc']['osc_port']}")
     
-    app.run(host=host, port=port, debug=True)
+    # Servidor de desarrollo: el reloader arranca un segundo proceso que importa
+    # (y entrena) todo otra vez. Solo con TIDALAI_DEBUG=1; en producción usar
+    # gunicorn -c gunicorn.conf.py (ver ese fichero para el modelo de workers/hilos).
+    # Sin TIDALAI_DEBUG=1, Flask-SocketIO se niega a arrancar Werkzeug fuera de
+    # una terminal (p.ej. como servicio de systemd)
+    debug = os.environ.get('TIDALAI_DEBUG') == '1'
+    socketio.run(app, host=host, port=port, debug=debug, use_reloader=debug, allow_unsafe_werkzeug=debug)
@@ -1,28 +1,395 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
+import itertools
+import queue
+import re
+import threading
+from datetime import datetime, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Per-connection prepared statement cache size
+STATEMENT_CACHE_SIZE = 128
+
+# Seconds a connection waits for another writer's lock before "database is locked"
+BUSY_TIMEOUT = 10.0
+
+# Shared SQL text so every call hits the connection's statement cache
+SQL_INSERT_HISTORY = '''
+    INSERT INTO history (pattern, style, density, complexity, tempo, thoughts, timestamp, samples, functions)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_SELECT_HISTORY = '''
+    SELECT * FROM history 
+    ORDER BY timestamp DESC, id DESC 
+    LIMIT ?
+'''
+# Keyset page: rows strictly older than the (timestamp, id) of the cursor row.
+# The retention job may have moved the cursor row to history_archive between
+# two page requests (ids are preserved there), so look it up in both tables.
+SQL_SELECT_HISTORY_BEFORE = '''
+    SELECT * FROM history 
+    WHERE (timestamp, id) < (
+        SELECT timestamp, id FROM history WHERE id = ?
+        UNION ALL
+        SELECT timestamp, id FROM history_archive WHERE id = ?
+        LIMIT 1
+    )
+    ORDER BY timestamp DESC, id DESC 
+    LIMIT ?
+'''
+# Same page from an explicit (timestamp, id) cursor: no lookup of the cursor row at all
+SQL_SELECT_HISTORY_BEFORE_KEY = '''
+    SELECT * FROM history 
+    WHERE (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC 
+    LIMIT ?
+'''
+SQL_ARCHIVE_HISTORY = '''
+    INSERT OR IGNORE INTO history_archive
+    SELECT * FROM history WHERE timestamp < datetime('now', ?)
+'''
+SQL_DELETE_ARCHIVED_HISTORY = "DELETE FROM history WHERE timestamp < datetime('now', ?)"
+SQL_STRIP_HISTORY_THOUGHTS = '''
+    UPDATE history SET thoughts = '[]'
+    WHERE timestamp < datetime('now', ?) AND thoughts IS NOT NULL AND thoughts != '[]'
+'''
+SQL_INSERT_FAVORITE = '''
+    INSERT INTO favorites (pattern, name, style, tags, metadata, samples, functions)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_SELECT_FAVORITES = 'SELECT * FROM favorites ORDER BY timestamp DESC'
+SQL_DELETE_FAVORITE = 'DELETE FROM favorites WHERE id = ?'
+SQL_IMPORT_HISTORY = '''
+    INSERT INTO history (pattern, style, density, complexity, tempo, timestamp, samples, functions)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_IMPORT_FAVORITE = '''
+    INSERT INTO favorites (pattern, name, style, tags, timestamp, samples, functions)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# --- SEARCH (FTS5) ---
+# One FTS row per history/favorite row. rowid = id*2 (history) or id*2+1 (favorites)
+# so triggers can delete by rowid instead of scanning the index.
+# The structural columns (samples, functions) are computed in Python when a row is
+# written and stored as plain columns on history/favorites: the triggers only copy
+# them, so any SQLite client (CLI, backup tools, scripts) can write these tables.
+SQL_CREATE_SEARCH = '''
+    CREATE VIRTUAL TABLE pattern_search USING fts5(
+        pattern, name, tags, style, samples, functions,
+        source UNINDEXED, ref_id UNINDEXED,
+        tokenize = "unicode61 tokenchars '_'"
+    )
+'''
+# Tables that carry the extracted search columns (history_archive mirrors history for SELECT *)
+SEARCH_COLUMN_TABLES = ['history', 'history_archive', 'favorites']
+SQL_INDEX_HISTORY = '''
+        INSERT INTO pattern_search (rowid, pattern, name, tags, style, samples, functions, source, ref_id)
+        VALUES (new.id * 2, new.pattern, '', '', new.style,
+                coalesce(new.samples, ''), coalesce(new.functions, ''), 'history', new.id);'''
+SQL_INDEX_FAVORITE = '''
+        INSERT INTO pattern_search (rowid, pattern, name, tags, style, samples, functions, source, ref_id)
+        VALUES (new.id * 2 + 1, new.pattern, new.name, new.tags, new.style,
+                coalesce(new.samples, ''), coalesce(new.functions, ''), 'favorites', new.id);'''
+SQL_SEARCH_TRIGGERS = {
+    'history_search_ai': 'AFTER INSERT ON history BEGIN' + SQL_INDEX_HISTORY,
+    'history_search_ad': 'AFTER DELETE ON history BEGIN DELETE FROM pattern_search WHERE rowid = old.id * 2;',
+    'history_search_au': 'AFTER UPDATE OF pattern, style, samples, functions ON history BEGIN '
+                         'DELETE FROM pattern_search WHERE rowid = old.id * 2;' + SQL_INDEX_HISTORY,
+    'favorites_search_ai': 'AFTER INSERT ON favorites BEGIN' + SQL_INDEX_FAVORITE,
+    'favorites_search_ad': 'AFTER DELETE ON favorites BEGIN DELETE FROM pattern_search WHERE rowid = old.id * 2 + 1;',
+    'favorites_search_au': 'AFTER UPDATE OF pattern, name, tags, style, samples, functions ON favorites BEGIN '
+                           'DELETE FROM pattern_search WHERE rowid = old.id * 2 + 1;' + SQL_INDEX_FAVORITE,
+}
+SQL_BACKFILL_SEARCH = '''
+    INSERT INTO pattern_search (rowid, pattern, name, tags, style, samples, functions, source, ref_id)
+    SELECT id * 2, pattern, '', '', style, coalesce(samples, ''), coalesce(functions, ''), 'history', id
+    FROM history
+    UNION ALL
+    SELECT id * 2 + 1, pattern, name, tags, style, coalesce(samples, ''), coalesce(functions, ''), 'favorites', id
+    FROM favorites
+'''
+# bm25 column weights: pattern, name, tags, style, samples, functions
+SQL_SEARCH = '''
+    SELECT source, ref_id AS id, pattern, name, tags, style, samples, functions,
+           bm25(pattern_search, 1.0, 4.0, 4.0, 2.0, 3.0, 3.0) AS score
+    FROM pattern_search
+    WHERE pattern_search MATCH ? AND (? IS NULL OR source = ?)
+    ORDER BY score
+    LIMIT ?
+'''
+
+# Structural search fields: "field:value" -> FTS column
+SEARCH_FIELDS = {
+    'sample': 'samples', 'samples': 'samples', 'uses': 'samples',
+    'fn': 'functions', 'function': 'functions', 'functions': 'functions',
+    'style': 'style', 'genre': 'style',
+    'tag': 'tags', 'tags': 'tags',
+    'name': 'name',
+}
+# Filler words ignored in free-text queries ("uses 808bd and jux, style techno")
+SEARCH_STOPWORDS = {'and', 'with', 'uses', 'using', 'or', 'the', 'a', 'y', 'con', 'usa', 'el', 'la', 'de'}
+
+def extract_samples(pattern):
+    """Sample names used inside sound/s "..." strings (bd*4, 808bd:3, hh(3,8) -> bd, 808bd, hh)"""
+    if not pattern:
+        return []
+    names = []
+    for body in re.findall(r'\b(?:sound|s)\s+"([^"]*)"', pattern):
+        for name in re.findall(r'[A-Za-z0-9_]*[A-Za-z][A-Za-z0-9_]*', body):
+            if name not in names:
+                names.append(name)
+    return names
+
+def extract_functions(pattern):
+    """Function/effect identifiers outside string literals (jux, rev, lpf, every...)"""
+    if not pattern:
+        return []
+    code = re.sub(r'"[^"]*"', ' ', pattern)
+    code = re.sub(r'--.*$', '', code, flags=re.MULTILINE)
+    names = []
+    for name in re.findall(r'\b[A-Za-z_][A-Za-z0-9_\']*', code):
+        if re.fullmatch(r'd\d+', name):
+            continue
+        if name not in names:
+            names.append(name)
+    return names
+
+def search_columns(pattern):
+    """(samples, functions) text stored next to a pattern for the search index"""
+    return " ".join(extract_samples(pattern)), " ".join(extract_functions(pattern))
+
+def _fts_phrase(term):
+    """Quote a term for FTS5 (trailing * keeps prefix search)"""
+    prefix = term.endswith('*')
+    term = term.rstrip('*')
+    if not term:
+        return None
+    return '"' + term.replace('"', '""') + '"' + (' *' if prefix else '')
+
+def build_search_query(text):
+    """
+    Convert a user query into an FTS5 MATCH expression.
+    Supports free terms, "field:value" and "style techno" forms, all ANDed:
+        'uses 808bd and jux, style techno' -> "808bd" AND "jux" AND style : "techno"
+    """
+    words = re.findall(r'[\w\'*]+(?::[\w\'*]+)?', (text or '').lower())
+    clauses = []
+    pending_field = None
+    
+    for word in words:
+        if ':' in word:
+            field, value = word.split(':', 1)
+            column = SEARCH_FIELDS.get(field)
+            phrase = _fts_phrase(value)
+            if phrase:
+                clauses.append(f"{column} : {phrase}" if column else phrase)
+            continue
+        
+        # "style techno": field name followed by its value
+        if word in SEARCH_FIELDS and word != 'uses' and pending_field is None:
+            pending_field = SEARCH_FIELDS[word]
+            continue
+        
+        if word in SEARCH_STOPWORDS:
+            continue
+        
+        phrase = _fts_phrase(word)
+        if not phrase:
+            continue
+        if pending_field:
+            clauses.append(f"{pending_field} : {phrase}")
+            pending_field = None
+        else:
+            clauses.append(phrase)
+    
+    return " AND ".join(clauses)
+
+# --- IMPORT ---
+IMPORT_CHUNK_SIZE = 500
+
+def _normalize_timestamp(value):
+    """Client timestamps (epoch s/ms, ISO string) -> 'YYYY-MM-DD HH:MM:SS' UTC, like CURRENT_TIMESTAMP"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # localStorage uses Date.now() (milliseconds)
+            seconds = value / 1000 if value > 1e11 else value
+            dt = datetime.fromtimestamp(seconds, timezone.utc)
+        elif isinstance(value, str) and value:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(timezone.utc)
+        else:
+            dt = datetime.now(timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        dt = datetime.now(timezone.utc)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def _as_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _validate_import_row(kind, item):
+    """Validate one imported record and build its parameter tuple (None = skip)"""
+    if not isinstance(item, dict):
+        return None
+    pattern = item.get('pattern')
+    if not isinstance(pattern, str) or not pattern.strip():
+        return None
+    
+    timestamp = _normalize_timestamp(item.get('timestamp'))
+    if kind == 'history':
+        return (
+            pattern,
+            str(item.get('style') or 'unknown'),
+            _as_float(item.get('density'), 0.5),
+            _as_float(item.get('complexity'), 0.5),
+            int(_as_float(item.get('tempo'), 140)),
+            timestamp,
+            *search_columns(pattern)
+        )
+    if kind == 'favorites':
+        tags = item.get('tags', 'imported')
+        if isinstance(tags, list):
+            tags = ",".join(str(t) for t in tags)
+        return (
+            pattern,
+            str(item.get('name') or 'Imported Favorite'),
+            str(item.get('style') or item.get('type') or 'unknown'),
+            str(tags or ''),
+            timestamp,
+            *search_columns(pattern)
+        )
+    return None
+
+# --- PRESETS / SESSION HISTORY (formerly presets.json / history.json) ---
+# Preset JSON keys <-> columns
+PRESET_FIELDS = [
+    ('name', 'name'), ('genMode', 'gen_mode'), ('patternType', 'pattern_type'),
+    ('density', 'density'), ('complexity', 'complexity'), ('tempo', 'tempo'),
+    ('style', 'style'), ('temperature', 'temperature'), ('timestamp', 'timestamp')
+]
+SQL_INSERT_PRESET = '''
+    INSERT INTO presets (name, gen_mode, pattern_type, density, complexity, tempo, style, temperature, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_SELECT_PRESETS = 'SELECT * FROM presets ORDER BY id'
+SQL_DELETE_PRESET = 'DELETE FROM presets WHERE name = ?'
+SQL_INSERT_SESSION_HISTORY = '''
+    INSERT INTO session_history (pattern, type, mode, temperature, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_SELECT_SESSION_HISTORY = 'SELECT pattern, type, mode, temperature, timestamp FROM session_history ORDER BY id DESC LIMIT ?'
+# Keep only the newest N rows
+SQL_TRIM_SESSION_HISTORY = '''
+    DELETE FROM session_history
+    WHERE id <= (SELECT id FROM session_history ORDER BY id DESC LIMIT 1 OFFSET ?)
+'''
+SESSION_HISTORY_MAX = 100
+
+def _preset_row(preset):
+    """Preset dict (JSON keys) -> insert tuple"""
+    return (
+        preset['name'],
+        preset.get('genMode', 'rules'),
+        preset.get('patternType', 'drums'),
+        preset.get('density', 0.6),
+        preset.get('complexity', 0.5),
+        preset.get('tempo', 140),
+        preset.get('style', 'techno'),
+        preset.get('temperature', 1.0),
+        preset.get('timestamp', int(datetime.now().timestamp()))
+    )
+
+def _session_history_row(entry):
+    """Session history dict -> insert tuple"""
+    return (
+        entry['pattern'],
+        entry.get('type', 'unknown'),
+        entry.get('mode', 'rules'),
+        entry.get('temperature'),
+        entry.get('timestamp', int(datetime.now().timestamp()))
+    )
+
+# History retention defaults (overridable via config.json -> "history_retention")
+HISTORY_ARCHIVE_AFTER_DAYS = 90
+HISTORY_THOUGHTS_TTL_DAYS = 7
+
+# Write-behind history defaults: flush every N seconds or every N queued rows
+HISTORY_FLUSH_INTERVAL = 0.5
+HISTORY_BATCH_SIZE = 50
+# Consecutive "database is locked" flushes before the queued rows are dropped
+HISTORY_FLUSH_MAX_RETRIES = 5
+
 class DatabaseManager:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, history_flush_interval=HISTORY_FLUSH_INTERVAL,
+                 history_batch_size=HISTORY_BATCH_SIZE):
         if db_path is None:
             # Default to 'tidal.db' in the parent directory (raspberry-pi root)
             base_dir = os.path.dirname(os.path.dirname(__file__))
             self.db_path = os.path.join(base_dir, 'tidal.db')
         else:
             self.db_path = db_path
+        
+        # Reusable connections: one per thread (sqlite3 connections are not shared across threads)
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        
+        # Write-behind history: generate calls enqueue, a background thread batches the inserts
+        self.history_flush_interval = history_flush_interval
+        self.history_batch_size = history_batch_size
+        self._history_queue = queue.Queue()
+        self._history_flush_lock = threading.Lock()
+        self._history_wakeup = threading.Event()
+        self._history_stop = threading.Event()
+        self._history_retries = 0  # consecutive flushes deferred by a locked database
             
         self._init_db()
+        
+        self._history_writer = threading.Thread(target=self._history_writer_loop, name="history-writer", daemon=True)
+        self._history_writer.start()
 
     def _get_conn(self):
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
+        """Get this thread's reusable connection (WAL, synchronous=NORMAL, statement cache)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
         conn.row_factory = sqlite3.Row
+        # WAL: readers don't block the writer; NORMAL: no fsync per commit (safe under WAL)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        
+        self._local.conn = conn
+        with self._conns_lock:
+            self._conns.append(conn)
         return conn
 
+    def close(self):
+        """Flush pending history and close every pooled connection (call on shutdown)"""
+        self._history_stop.set()
+        self._history_wakeup.set()
+        if self._history_writer.is_alive() and self._history_writer is not threading.current_thread():
+            self._history_writer.join(timeout=5)
+        self.flush_history()
+        
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error closing connection: {e}")
+        self._local = threading.local()
+
     def _init_db(self):
         """Initialize database schema"""
         try:
@@ -40,10 +407,34 @@ class DatabaseManager:
                     tempo INTEGER,
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
                     thoughts TEXT,
-                    is_favorite INTEGER DEFAULT 0
+                    is_favorite INTEGER DEFAULT 0,
+                    samples TEXT,
+                    functions TEXT
+                )
+            ''')
+            
+            # Archive for rows moved out by the retention job (same columns as history)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS history_archive (
+                    id INTEGER PRIMARY KEY,
+                    pattern TEXT NOT NULL,
+                    style TEXT,
+                    density REAL,
+                    complexity REAL,
+                    tempo INTEGER,
+                    timestamp DATETIME,
+                    thoughts TEXT,
+                    is_favorite INTEGER DEFAULT 0,
+                    samples TEXT,
+                    functions TEXT
                 )
             ''')
             
+            # History indexes (timestamp index also covers id: it is the rowid)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_style ON history (style)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_is_favorite ON history (is_favorite)')
+            
             # Favorites Table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS favorites (
@@ -53,53 +444,171 @@ class DatabaseManager:
                     style TEXT,
                     tags TEXT,
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT
+                    metadata TEXT,
+                    samples TEXT,
+                    functions TEXT
+                )
+            ''')
+            
+            # Presets (formerly presets.json)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS presets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    gen_mode TEXT,
+                    pattern_type TEXT,
+                    density REAL,
+                    complexity REAL,
+                    tempo INTEGER,
+                    style TEXT,
+                    temperature REAL,
+                    timestamp INTEGER
+                )
+            ''')
+            
+            # Session history from the UI (formerly history.json, capped at SESSION_HISTORY_MAX)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS session_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pattern TEXT NOT NULL,
+                    type TEXT,
+                    mode TEXT,
+                    temperature REAL,
+                    timestamp INTEGER
+                )
+            ''')
+            
+            # Key/value flags (one-time migrations, etc.)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
                 )
             ''')
             
+            # Search columns on databases created before they existed
+            self._add_search_columns(cursor)
+            
+            # Full-text search index over history + favorites
+            self.search_available = True
+            try:
+                exists = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pattern_search'"
+                ).fetchone()
+                if not exists:
+                    cursor.execute(SQL_CREATE_SEARCH)
+                    cursor.execute(SQL_BACKFILL_SEARCH)
+                # Recreated on every start: replaces older triggers that called Python functions
+                for name, body in SQL_SEARCH_TRIGGERS.items():
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                    cursor.execute(f'CREATE TRIGGER {name} {body} END')
+            except sqlite3.OperationalError as e:
+                # SQLite compiled without FTS5: search falls back to LIKE
+                self.search_available = False
+                logger.warning(f"FTS5 not available, search will use LIKE: {e}")
+            
             conn.commit()
-            conn.close()
             logger.info(f"💾 Database initialized at: {self.db_path}")
             
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
 
+    def _add_search_columns(self, cursor):
+        """Add and fill samples/functions on tables that predate them"""
+        for table in SEARCH_COLUMN_TABLES:
+            columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+            for column in ('samples', 'functions'):
+                if column not in columns:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+            rows = cursor.execute(f'SELECT id, pattern FROM {table} WHERE samples IS NULL').fetchall()
+            if rows:
+                cursor.executemany(
+                    f'UPDATE {table} SET samples = ?, functions = ? WHERE id = ?',
+                    [(*search_columns(row[1]), row[0]) for row in rows]
+                )
+
     # --- HISTORY METHODS ---
     
     def add_history_entry(self, pattern, style, density, complexity, tempo, thoughts=None):
-        """Add a generated pattern to history"""
+        """Queue a generated pattern for the background history writer"""
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
-            
             thoughts_json = json.dumps(thoughts) if thoughts else "[]"
+            # Same format as CURRENT_TIMESTAMP, captured now rather than at flush time
+            timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
             
-            cursor.execute('''
-                INSERT INTO history (pattern, style, density, complexity, tempo, thoughts)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (pattern, style, density, complexity, tempo, thoughts_json))
-            
-            conn.commit()
-            conn.close()
+            self._history_queue.put((pattern, style, density, complexity, tempo, thoughts_json, timestamp))
+            if self._history_queue.qsize() >= self.history_batch_size:
+                self._history_wakeup.set()
             return True
         except Exception as e:
             logger.error(f"Error adding history: {e}")
             return False
 
-    def get_history(self, limit=50):
-        """Get recent history entries"""
-        try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
+    def flush_history(self):
+        """Write all queued history rows in a single transaction. Returns rows written."""
+        with self._history_flush_lock:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._history_queue.get_nowait())
+                except queue.Empty:
+                    break
             
-            cursor.execute('''
-                SELECT * FROM history 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (limit,))
+            if not rows:
+                return 0
             
-            rows = cursor.fetchall()
-            conn.close()
+            conn = self._get_conn()
+            try:
+                conn.executemany(SQL_INSERT_HISTORY, [row + search_columns(row[0]) for row in rows])
+                conn.commit()
+                self._history_retries = 0
+                return len(rows)
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                transient = 'locked' in str(e) or 'busy' in str(e)
+                if transient and self._history_retries < HISTORY_FLUSH_MAX_RETRIES:
+                    # Another writer holds the lock: keep the rows, the writer backs off
+                    self._history_retries += 1
+                    logger.warning(f"History flush deferred ({len(rows)} rows, "
+                                   f"retry {self._history_retries}/{HISTORY_FLUSH_MAX_RETRIES}): {e}")
+                    for row in rows:
+                        self._history_queue.put(row)
+                else:
+                    # Not transient (no such table, disk I/O, read-only) or still locked
+                    # after every retry: retrying would only grow the queue
+                    self._history_retries = 0
+                    logger.error(f"Error flushing history ({len(rows)} rows lost): {e}")
+                return 0
+            except Exception as e:
+                logger.error(f"Error flushing history ({len(rows)} rows lost): {e}")
+                conn.rollback()
+                return 0
+
+    def _history_writer_loop(self):
+        """Background writer: flush every history_flush_interval seconds or once a batch fills"""
+        while not self._history_stop.is_set():
+            # Exponential backoff while the database stays locked
+            self._history_wakeup.wait(self.history_flush_interval * 2 ** self._history_retries)
+            self._history_wakeup.clear()
+            self.flush_history()
+
+    def get_history(self, limit=50, before_id=None, before_ts=None):
+        """Get recent history entries, newest first.
+
+        Pass before_id (last id of the previous page) to page back; with before_ts
+        (that row's timestamp) as well, the cursor no longer depends on the row
+        still being in the table.
+        """
+        try:
+            # Read-your-writes: persist anything still queued first
+            self.flush_history()
+            conn = self._get_conn()
+            if before_id is None:
+                rows = conn.execute(SQL_SELECT_HISTORY, (limit,)).fetchall()
+            elif before_ts is not None:
+                rows = conn.execute(SQL_SELECT_HISTORY_BEFORE_KEY, (before_ts, before_id, limit)).fetchall()
+            else:
+                rows = conn.execute(SQL_SELECT_HISTORY_BEFORE, (before_id, before_id, limit)).fetchall()
             
             # Convert to list of dicts
             return [dict(row) for row in rows]
@@ -107,40 +616,244 @@ class DatabaseManager:
             logger.error(f"Error getting history: {e}")
             return []
 
+    def compact_history(self, archive_after_days=HISTORY_ARCHIVE_AFTER_DAYS,
+                        thoughts_ttl_days=HISTORY_THOUGHTS_TTL_DAYS):
+        """
+        Retention job: move rows older than archive_after_days to history_archive
+        and drop the 'thoughts' blob of rows older than thoughts_ttl_days.
+        A value of None disables that step. Returns counts per step.
+        """
+        self.flush_history()
+        conn = self._get_conn()
+        try:
+            archived = 0
+            stripped = 0
+            
+            if archive_after_days is not None:
+                age = f'-{int(archive_after_days)} days'
+                conn.execute(SQL_ARCHIVE_HISTORY, (age,))
+                archived = conn.execute(SQL_DELETE_ARCHIVED_HISTORY, (age,)).rowcount
+            
+            if thoughts_ttl_days is not None:
+                age = f'-{int(thoughts_ttl_days)} days'
+                stripped = conn.execute(SQL_STRIP_HISTORY_THOUGHTS, (age,)).rowcount
+            
+            conn.commit()
+            # Refresh planner statistics after bulk changes
+            conn.execute('PRAGMA optimize')
+            
+            logger.info(f"🧹 History compacted: {archived} archived, {stripped} thoughts dropped")
+            return {'archived': archived, 'thoughts_dropped': stripped}
+        except Exception as e:
+            logger.error(f"Error compacting history: {e}")
+            conn.rollback()
+            return {'archived': 0, 'thoughts_dropped': 0}
+
+    # --- SEARCH METHODS ---
+
+    def search_patterns(self, query, limit=20, source=None):
+        """
+        Ranked search over history and favorites.
+        query: free text and/or field:value terms (sample:, fn:, style:, tag:, name:)
+        source: 'history' | 'favorites' | None (both)
+        """
+        self.flush_history()
+        if not self.search_available:
+            return self._search_patterns_like(query, limit, source)
+        
+        match = build_search_query(query)
+        if not match:
+            return []
+        if source not in ('history', 'favorites'):
+            source = None
+        
+        try:
+            conn = self._get_conn()
+            rows = conn.execute(SQL_SEARCH, (match, source, source, limit)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error searching patterns ({match}): {e}")
+            return []
+
+    def _search_patterns_like(self, query, limit, source):
+        """Unranked fallback when FTS5 is not compiled in"""
+        terms = [t for t in re.findall(r'\w+', (query or '').lower()) if t not in SEARCH_STOPWORDS]
+        if not terms:
+            return []
+        where = " AND ".join(["pattern LIKE ?"] * len(terms))
+        params = [f"%{t}%" for t in terms]
+        
+        tables = [source] if source in ('history', 'favorites') else ['history', 'favorites']
+        results = []
+        try:
+            conn = self._get_conn()
+            for table in tables:
+                name_col = "name" if table == 'favorites' else "''"
+                rows = conn.execute(
+                    f"SELECT '{table}' AS source, id, pattern, {name_col} AS name, style FROM {table} "
+                    f"WHERE {where} ORDER BY id DESC LIMIT ?", params + [limit]
+                ).fetchall()
+                results.extend(dict(row) for row in rows)
+            return results[:limit]
+        except Exception as e:
+            logger.error(f"Error searching patterns: {e}")
+            return []
+
+    # --- PRESETS METHODS ---
+
+    def get_presets(self):
+        """Get all presets (same keys as the old presets.json)"""
+        try:
+            conn = self._get_conn()
+            rows = conn.execute(SQL_SELECT_PRESETS).fetchall()
+            return [{key: row[column] for key, column in PRESET_FIELDS} for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting presets: {e}")
+            return []
+
+    def add_preset(self, preset):
+        """Insert a preset. Returns False if the name already exists."""
+        conn = self._get_conn()
+        try:
+            conn.execute(SQL_INSERT_PRESET, _preset_row(preset))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
+        except Exception as e:
+            logger.error(f"Error adding preset: {e}")
+            conn.rollback()
+            raise
+
+    def delete_preset(self, name):
+        """Delete a preset by name. Returns False if not found."""
+        conn = self._get_conn()
+        try:
+            deleted = conn.execute(SQL_DELETE_PRESET, (name,)).rowcount
+            conn.commit()
+            return deleted > 0
+        except Exception as e:
+            logger.error(f"Error deleting preset: {e}")
+            conn.rollback()
+            return False
+
+    def replace_presets(self, presets):
+        """Replace every preset (backup restore)"""
+        conn = self._get_conn()
+        try:
+            conn.execute('DELETE FROM presets')
+            conn.executemany(SQL_INSERT_PRESET, [_preset_row(p) for p in presets if p.get('name')])
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing presets: {e}")
+            conn.rollback()
+            return False
+
+    # --- SESSION HISTORY METHODS ---
+
+    def add_session_history(self, entry, max_entries=SESSION_HISTORY_MAX):
+        """Add a UI history entry, keeping only the newest max_entries"""
+        conn = self._get_conn()
+        try:
+            conn.execute(SQL_INSERT_SESSION_HISTORY, _session_history_row(entry))
+            conn.execute(SQL_TRIM_SESSION_HISTORY, (max_entries,))
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error adding session history: {e}")
+            conn.rollback()
+            return False
+
+    def get_session_history(self, limit=SESSION_HISTORY_MAX):
+        """Get UI history entries, newest first"""
+        try:
+            conn = self._get_conn()
+            rows = conn.execute(SQL_SELECT_SESSION_HISTORY, (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting session history: {e}")
+            return []
+
+    def replace_session_history(self, entries):
+        """Replace the UI history (clear with an empty list). entries are newest first."""
+        conn = self._get_conn()
+        try:
+            conn.execute('DELETE FROM session_history')
+            rows = [_session_history_row(e) for e in reversed(entries[:SESSION_HISTORY_MAX]) if e.get('pattern')]
+            conn.executemany(SQL_INSERT_SESSION_HISTORY, rows)
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing session history: {e}")
+            conn.rollback()
+            return False
+
+    # --- ONE-TIME MIGRATION ---
+
+    def migrate_json_stores(self, presets_file=None, history_file=None):
+        """
+        Import the legacy presets.json / history.json files once.
+        A flag in 'meta' marks each file as migrated; the files are left untouched.
+        """
+        migrated = {}
+        stores = [
+            ('presets_json', presets_file, self._migrate_presets),
+            ('history_json', history_file, self.replace_session_history),
+        ]
+        conn = self._get_conn()
+        for key, path, importer in stores:
+            try:
+                if not path or not os.path.exists(path):
+                    continue
+                if conn.execute('SELECT 1 FROM meta WHERE key = ?', (f'migrated_{key}',)).fetchone():
+                    continue
+                
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                
+                if importer(data):
+                    conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                 (f'migrated_{key}', datetime.now(timezone.utc).isoformat()))
+                    conn.commit()
+                    migrated[key] = len(data)
+                    logger.info(f"📦 Migrated {len(data)} entries from {path}")
+            except Exception as e:
+                logger.error(f"Error migrating {path}: {e}")
+        return migrated
+
+    def _migrate_presets(self, presets):
+        """Add presets from the legacy file, skipping names that already exist"""
+        for preset in presets:
+            if preset.get('name'):
+                self.add_preset(preset)
+        return True
+
     # --- FAVORITES METHODS ---
 
     def add_favorite(self, pattern, name, style, tags=None, metadata=None):
         """Save a pattern as favorite"""
+        conn = self._get_conn()
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
-            
             # Check for duplicates? For now, allow duplicates with different names
             metadata_json = json.dumps(metadata) if metadata else "{}"
             
-            cursor.execute('''
-                INSERT INTO favorites (pattern, name, style, tags, metadata)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (pattern, name, style, tags or "", metadata_json))
-            
+            cursor = conn.execute(SQL_INSERT_FAVORITE, (pattern, name, style, tags or "", metadata_json,
+                                                        *search_columns(pattern)))
             new_id = cursor.lastrowid
             conn.commit()
-            conn.close()
             return new_id
         except Exception as e:
             logger.error(f"Error adding favorite: {e}")
+            conn.rollback()
             return None
 
     def get_favorites(self):
         """Get all favorites"""
         try:
             conn = self._get_conn()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM favorites ORDER BY timestamp DESC')
-            
-            rows = cursor.fetchall()
-            conn.close()
+            rows = conn.execute(SQL_SELECT_FAVORITES).fetchall()
             return [dict(row) for row in rows]
         except Exception as e:
             logger.error(f"Error getting favorites: {e}")
@@ -148,62 +861,73 @@ class DatabaseManager:
 
     def delete_favorite(self, fav_id):
         """Delete a favorite by ID"""
+        conn = self._get_conn()
         try:
-            conn = self._get_conn()
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM favorites WHERE id = ?', (fav_id,))
+            conn.execute(SQL_DELETE_FAVORITE, (fav_id,))
             conn.commit()
-            conn.close()
             return True
         except Exception as e:
             logger.error(f"Error deleting favorite: {e}")
+            conn.rollback()
             return False
 
     def import_client_data(self, history_list, favorites_list):
         """Bulk import data from client localStorage"""
+        records = itertools.chain(
+            (('history', h) for h in history_list),
+            (('favorites', f) for f in favorites_list)
+        )
+        result = self.bulk_import(records)
+        return result['history'], result['favorites']
+
+    def bulk_import(self, records, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        """
+        Import (kind, row) records streamed from a client migration.
+        kind is 'history' or 'favorites'; invalid rows are skipped.
+        Records are read and validated into chunks with no transaction open (the
+        source may be a slow network upload); each full chunk is then written
+        with executemany in its own short transaction, so the write lock is only
+        held while SQLite inserts. A failure keeps the chunks already committed:
+        the result then adds 'error' and 'resume', the number of input records
+        of each kind already committed (a retry sends the arrays from there on).
+        progress(counts) is called after every chunk.
+        Returns {'history': n, 'favorites': n, 'skipped': n}.
+        """
+        counts = {'history': 0, 'favorites': 0, 'skipped': 0}
+        pending = {'history': [], 'favorites': []}
+        read = {'history': 0, 'favorites': 0}  # input records seen per kind
+        resume = {'history': 0, 'favorites': 0}  # ...of which committed
+        statements = {'history': SQL_IMPORT_HISTORY, 'favorites': SQL_IMPORT_FAVORITE}
+        
         conn = self._get_conn()
+        
+        def write(kind):
+            rows = pending[kind]
+            if rows:
+                with conn:  # BEGIN ... COMMIT (ROLLBACK on error)
+                    conn.executemany(statements[kind], rows)
+                counts[kind] += len(rows)
+                resume[kind] = read[kind]
+                pending[kind] = []
+                if progress:
+                    progress(dict(counts))
+        
         try:
-            cursor = conn.cursor()
-            
-            # Import History
-            count_h = 0
-            for h in history_list:
-                # Basic validation
-                if 'pattern' in h:
-                    cursor.execute('''
-                        INSERT INTO history (pattern, style, density, complexity, tempo, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        h.get('pattern'),
-                        h.get('style', 'unknown'),
-                        h.get('density', 0.5),
-                        h.get('complexity', 0.5),
-                        h.get('tempo', 140),
-                        h.get('timestamp', datetime.now())
-                    ))
-                    count_h += 1
-            
-            # Import Favorites
-            count_f = 0
-            for f in favorites_list:
-                if 'pattern' in f:
-                    cursor.execute('''
-                        INSERT INTO favorites (pattern, name, style, tags, timestamp)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        f.get('pattern'),
-                        f.get('name', 'Imported Favorite'),
-                        f.get('style', 'unknown'),
-                        f.get('tags', 'imported'),
-                        f.get('timestamp', datetime.now())
-                    ))
-                    count_f += 1
+            for kind, item in records:
+                if kind in read:
+                    read[kind] += 1
+                row = _validate_import_row(kind, item)
+                if row is None:
+                    counts['skipped'] += 1
+                    continue
+                pending[kind].append(row)
+                if len(pending[kind]) >= chunk_size:
+                    write(kind)
             
-            conn.commit()
-            return count_h, count_f
+            write('history')
+            write('favorites')
+            return counts
         except Exception as e:
-            logger.error(f"Error importing data: {e}")
-            conn.rollback()
-            return 0, 0
-        finally:
-            conn.close()
+            logger.error(f"Error importing data after {counts['history']} history / "
+                         f"{counts['favorites']} favorites rows: {e}")
+            return dict(counts, error=str(e), resume=resume)
@@ -0,0 +1,45 @@
+"""
+TidalAI Companion - Configuración de gunicorn (modo producción)
+
+    cd raspberry-pi/web && python3 -m gunicorn -c gunicorn.conf.py
+
+Modelo de ejecución:
+- UN solo proceso worker. Todo el estado compartido (modelo Markov, Conductor
+  y su reloj, jam, cliente OSC, cola write-behind de la base de datos) vive en
+  AppState dentro de ese proceso. Con varios workers cada uno tendría su propio
+  Conductor y su propia jam enviando OSC a la vez.
+- Hilos (gthread) para la concurrencia: las peticiones normales, los streams SSE
+  de /api/generate/stream y las conexiones Socket.IO ocupan un hilo cada una.
+  La generación es CPU (GIL), pero casi todo lo demás es E/S.
+- preload_app desactivado: app.py arranca hilos al importarse (scheduler,
+  retención, escritor del historial, reloj del Conductor) y esos hilos no
+  sobreviven al fork del master.
+"""
+
+import json
+import os
+
+_config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')
+try:
+    with open(_config_path, 'r') as f:
+        _port = json.load(f).get('raspberry_pi', {}).get('flask_port', 5000)
+except (OSError, ValueError):
+    _port = 5000
+
+wsgi_app = 'app:app'
+bind = os.environ.get('TIDALAI_BIND', f'0.0.0.0:{_port}')
+
+workers = 1  # Ver arriba: el estado es de proceso único
+worker_class = 'gthread'
+threads = int(os.environ.get('TIDALAI_THREADS', 32))
+preload_app = False
+
+# Los streams SSE y el long-polling de Socket.IO mantienen la petición abierta:
+# el timeout solo vigila que el worker siga vivo, no la duración de cada petición
+timeout = 120
+graceful_timeout = 10
+keepalive = 5
+
+accesslog = None  # El log de actividad ya registra lo relevante
+errorlog = '-'
+loglevel = os.environ.get('TIDALAI_LOG_LEVEL', 'info')
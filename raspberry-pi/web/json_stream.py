@@ -0,0 +1,112 @@
+"""
+TidalAI Companion - Streaming JSON
+Lectura incremental de documentos JSON grandes sin cargarlos enteros en memoria.
+"""
+
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',:]}'
+
+
+class _StreamBuffer:
+    """Buffer de texto que se rellena bajo demanda desde un stream binario"""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Leer otro bloque. Devuelve False si el stream está agotado."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.text = self.text[self.pos:] + self.decoder.decode(b'', final=True)
+        else:
+            # Descartar lo ya consumido para mantener la memoria plana
+            self.text = self.text[self.pos:] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Siguiente carácter significativo (saltando espacios), o '' al final"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON inválido: se esperaba '{char}' en posición {self.pos}")
+        self.pos += 1
+
+    def value(self, decoder):
+        """Decodificar el siguiente valor JSON completo, leyendo más datos si hace falta"""
+        self.peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.text, self.pos)
+                # Un número cortado al final del bloque ("2.5" de "2.5e3") aún no está completo
+                if self.eof or (end < len(self.text) and self.text[end] in _DELIMITERS):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Valor incompleto: leer otro bloque (en EOF el siguiente intento devuelve o lanza)
+            self.fill()
+
+
+def iter_object_arrays(stream, chunk_size=64 * 1024):
+    """
+    Recorrer un objeto JSON de nivel superior produciendo (clave, elemento)
+    por cada elemento de sus arrays, sin materializar los arrays completos.
+
+        {"history": [{...}, {...}], "favorites": [{...}]}
+        -> ("history", {...}), ("history", {...}), ("favorites", {...})
+
+    Las claves cuyo valor no es un array se decodifican y se ignoran.
+    """
+    decoder = json.JSONDecoder()
+    buf = _StreamBuffer(stream, chunk_size)
+
+    buf.expect('{')
+    while True:
+        char = buf.peek()
+        if char == '}':
+            return
+        if char == ',':
+            buf.pos += 1
+            continue
+        if char != '"':
+            raise ValueError(f"JSON inválido: clave esperada en posición {buf.pos}")
+
+        key = buf.value(decoder)
+        buf.expect(':')
+
+        if buf.peek() != '[':
+            buf.value(decoder)
+            continue
+
+        buf.pos += 1
+        while True:
+            char = buf.peek()
+            if char == ']':
+                buf.pos += 1
+                break
+            if char == ',':
+                buf.pos += 1
+                continue
+            if char == '':
+                raise ValueError("JSON inválido: array sin cerrar")
+            yield key, buf.value(decoder)
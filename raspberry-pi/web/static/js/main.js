@@ -10,6 +10,7 @@ import * as phase2 from '../phase2-features.js';
 import * as phase3 from '../phase3-features.js';
 import * as visuals from './modules/visuals-hydra.js';
 import * as conductor from './modules/conductor.js';
+import { onRealtime, isRealtimeConnected } from './modules/realtime.js';
 import { renderTimeline, initTimeline } from './modules/timeline-visualizer.js';
 import { initKeyboardShortcuts } from './modules/keyboard-shortcuts.js';
 import { initAllKnobs } from './modules/luxury-knobs.js';
@@ -130,6 +131,44 @@ async function addNewRuleAPI() {
 
 // --- CONTROLLER LOGIC ---
 
+// Generación en streaming en curso: una nueva petición (o cancelGeneration) la aborta
+let generationController = null;
+
+async function streamGeneration(payload) {
+    if (generationController) generationController.abort();
+    const controller = new AbortController();
+    generationController = controller;
+
+    const thoughtStream = document.getElementById('thought-stream');
+    if (thoughtStream) thoughtStream.innerHTML = '';
+    let currentAttempt = 0;
+
+    try {
+        const data = await api.streamGeneratePatternAPI(payload, (event, msg) => {
+            if (event === 'token') {
+                // Reintento de sintaxis en el modelo: empezar a dibujar de nuevo
+                if ((msg.attempt || 0) !== currentAttempt && thoughtStream) thoughtStream.innerHTML = '';
+                currentAttempt = msg.attempt || 0;
+                panels.appendThought(msg);
+            } else if (event === 'validation' && msg.retrying) {
+                // Reintento por teoría musical: llegan tokens de un patrón nuevo
+                if (thoughtStream) thoughtStream.innerHTML = '';
+                currentAttempt = 0;
+            }
+        }, controller.signal);
+        return data || { success: false, cancelled: true };
+    } catch (e) {
+        if (e.name === 'AbortError') return { success: false, cancelled: true };
+        throw e;
+    } finally {
+        if (generationController === controller) generationController = null;
+    }
+}
+
+window.cancelGeneration = () => {
+    if (generationController) generationController.abort();
+};
+
 async function generatePattern(options = {}) {
     const btn = elements.generateBtn;
 
@@ -182,7 +221,10 @@ async function generatePattern(options = {}) {
         const leds = document.querySelectorAll('.led-indicator');
         leds.forEach(led => led.classList.add('blink'));
 
-        const data = await api.generatePatternAPI(payload);
+        // Modo IA: streaming token a token (los pensamientos se dibujan mientras se muestrea)
+        const data = payload.use_ai
+            ? await streamGeneration(payload)
+            : await api.generatePatternAPI(payload);
 
         // Mantener LEDs encendidos (active) al recibir datos
         leds.forEach(led => {
@@ -219,8 +261,10 @@ async function generatePattern(options = {}) {
             updateFavoriteUI();
 
             logActivity(`Patrón generado (${state.config.style})`, 'success');
+        } else if (data.cancelled) {
+            logActivity('Generación cancelada', 'info');
         } else {
-            logActivity(`Error: ${data.message}`, 'error');
+            logActivity(`Error: ${data.message || data.error}`, 'error');
         }
     } catch (error) {
         console.error('Error generating:', error);
@@ -679,8 +723,13 @@ export function init() {
     // Initial Theme
     updateTheme(state.config.style);
 
-    // Status Loop
+    // Status Loop (push por Socket.IO; polling solo si no hay canal realtime)
+    onRealtime('system_stats', (delta) => {
+        if (delta.osc) updateStatusUI(delta.osc);
+    });
+
     const checkStatus = async () => {
+        if (isRealtimeConnected()) return;
         try {
             const status = await api.checkStatusAPI();
             updateStatusUI(status.osc);
@@ -962,6 +1011,7 @@ initArranger();
 
 // --- OSC STATUS POLLING ---
 async function checkOSCStatus() {
+    if (isRealtimeConnected()) return;
     try {
         const response = await fetch('/api/osc/status');
         const status = await response.json();
@@ -1110,9 +1160,11 @@ window.checkDataMigration = async function () {
         const history = historyStr ? JSON.parse(historyStr) : [];
         const favorites = favoritesStr ? JSON.parse(favoritesStr) : [];
 
+        // Una migración interrumpida guarda hasta dónde llegó el servidor: no reenviar lo ya importado
+        const resume = JSON.parse(localStorage.getItem('db_migration_resume') || '{}');
         const payload = {
-            history: history.map(h => typeof h === 'string' ? { pattern: h } : h),
-            favorites: favorites.map(f => typeof f === 'string' ? { pattern: f } : f)
+            history: history.slice(resume.history || 0).map(h => typeof h === 'string' ? { pattern: h } : h),
+            favorites: favorites.slice(resume.favorites || 0).map(f => typeof f === 'string' ? { pattern: f } : f)
         };
 
         const res = await fetch('/api/data/import', {
@@ -1122,8 +1174,15 @@ window.checkDataMigration = async function () {
         });
 
         const data = await res.json();
+        if (data.resume) {
+            localStorage.setItem('db_migration_resume', JSON.stringify({
+                history: (resume.history || 0) + data.resume.history,
+                favorites: (resume.favorites || 0) + data.resume.favorites
+            }));
+        }
         if (data.success) {
             localStorage.setItem('db_migration_done', 'true');
+            localStorage.removeItem('db_migration_resume');
             const msg = `✅ Migración completada: ${data.imported.history} en historial, ${data.imported.favorites} favoritos.`;
             if (window.showNotification) window.showNotification(msg, "success");
             if (window.logActivity) window.logActivity(msg);
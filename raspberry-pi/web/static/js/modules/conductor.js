@@ -4,6 +4,7 @@
  */
 
 import * as api from './network.js';
+import { onRealtime, offRealtime, isRealtimeConnected } from './realtime.js';
 
 let conductorInterval = null;
 let isVisible = false;
@@ -180,12 +181,27 @@ async function stopConductor() {
 
 function startPolling() {
     if (conductorInterval) clearInterval(conductorInterval);
-    conductorInterval = setInterval(updateStatus, 1000); // Poll every 1s
+    offRealtime('conductor', handleConductorEvent);
+
+    // Con Socket.IO el reloj del servidor empuja cada compás: sin polling
+    onRealtime('conductor', handleConductorEvent);
+    conductorInterval = setInterval(() => {
+        if (!isRealtimeConnected()) updateStatus();
+    }, 1000); // Poll every 1s (fallback)
 }
 
 function stopPolling() {
     if (conductorInterval) clearInterval(conductorInterval);
     conductorInterval = null;
+    offRealtime('conductor', handleConductorEvent);
+}
+
+function handleConductorEvent(message) {
+    if (message.event === 'finished') {
+        handleConductorFinished();
+    } else if (message.status && message.status.status === 'playing') {
+        updateUI(message.status);
+    }
 }
 
 async function updateStatus() {
@@ -197,23 +213,27 @@ async function updateStatus() {
             updateUI(status);
         } else {
             // Si el backend se detiene solo (fin de canción)
-            document.getElementById('conductor-play').disabled = false;
-            document.getElementById('conductor-stop').disabled = true;
-            stopPolling(); // IMPORTANT: Stop polling to prevent loop
-
-            // Check if we were recording
-            if (window.sessionRecorder && window.sessionRecorder.isRecording) {
-                window.sessionRecorder.stop();
-                if (confirm("🏁 Canción finalizada.\n\n¿Quieres descargar el código fuente (.tidal)?")) {
-                    window.sessionRecorder.download();
-                }
-            }
+            handleConductorFinished();
         }
     } catch (e) {
         console.error(e);
     }
 }
 
+function handleConductorFinished() {
+    document.getElementById('conductor-play').disabled = false;
+    document.getElementById('conductor-stop').disabled = true;
+    stopPolling(); // IMPORTANT: Stop polling to prevent loop
+
+    // Check if we were recording
+    if (window.sessionRecorder && window.sessionRecorder.isRecording) {
+        window.sessionRecorder.stop();
+        if (confirm("🏁 Canción finalizada.\n\n¿Quieres descargar el código fuente (.tidal)?")) {
+            window.sessionRecorder.download();
+        }
+    }
+}
+
 function updateUI(status) {
     document.getElementById('conductor-section-name').innerText = status.section;
     document.getElementById('conductor-params').innerText =
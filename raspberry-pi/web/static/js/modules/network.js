@@ -9,6 +9,59 @@ export async function generatePatternAPI(payload) {
     return await response.json();
 }
 
+/**
+ * Generación en streaming (Server-Sent Events sobre POST).
+ * onEvent(event, data) recibe start, token, validation, result, cancelled o error.
+ * Abortar `signal` cierra la conexión y el servidor deja de muestrear.
+ */
+export async function streamGeneratePatternAPI(payload, onEvent, signal) {
+    const response = await fetch('/api/generate/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload),
+        signal
+    });
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Los eventos SSE se separan por una línea en blanco
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+
+            const parsed = data ? JSON.parse(data) : null;
+            if (event === 'result' || event === 'error') result = parsed;
+            onEvent(event, parsed);
+        }
+    }
+    return result;
+}
+
+export async function cancelGenerationAPI(streamId) {
+    const response = await fetch('/api/generate/cancel', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ stream_id: streamId })
+    });
+    return await response.json();
+}
+
 export async function generateMacroWaveAPI(payload) {
     const response = await fetch('/api/generate/macro', {
         method: 'POST',
@@ -112,6 +165,20 @@ export async function startJamSessionAPI(payload) {
     return await response.json();
 }
 
+export async function getJamSessionStatusAPI() {
+    const response = await fetch('/api/jam-session/status');
+    return await response.json();
+}
+
+export async function stopJamSessionAPI(silence = false) {
+    const response = await fetch('/api/jam-session/stop', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ silence })
+    });
+    return await response.json();
+}
+
 export async function createBackupAPI() {
     const response = await fetch('/api/backup');
     return await response.json();
@@ -315,8 +382,9 @@ export async function getSystemStatsAPI() {
     return await response.json();
 }
 
-export async function getSystemLogsAPI() {
-    const response = await fetch('/api/system/logs');
+export async function getSystemLogsAPI(since = 0) {
+    // since: último seq recibido -> solo entradas nuevas
+    const response = await fetch(`/api/system/logs?since=${since}`);
     return await response.json();
 }
 
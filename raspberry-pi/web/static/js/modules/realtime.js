@@ -0,0 +1,31 @@
+/**
+ * Realtime Module
+ * Canal Socket.IO con el servidor: log de actividad, eventos del Conductor,
+ * resultados de generación y stats del sistema llegan por push (sin polling).
+ * Si el cliente Socket.IO no está disponible, los módulos siguen haciendo polling.
+ */
+
+let socket = null;
+
+export function connectRealtime() {
+    if (socket || typeof io === 'undefined') return socket;
+
+    socket = io();
+    socket.on('connect', () => console.log('⚡ Realtime conectado'));
+    socket.on('disconnect', () => console.log('⚡ Realtime desconectado (volviendo a polling)'));
+    return socket;
+}
+
+export function isRealtimeConnected() {
+    return !!(socket && socket.connected);
+}
+
+export function onRealtime(event, handler) {
+    const s = connectRealtime();
+    if (s) s.on(event, handler);
+    return !!s;
+}
+
+export function offRealtime(event, handler) {
+    if (socket) socket.off(event, handler);
+}
@@ -329,10 +329,24 @@ export function renderThoughts(thoughts) {
 
     thoughtStream.innerHTML = '';
 
-    thoughts.forEach((t, i) => {
-        const entry = document.createElement('div');
-        entry.className = 'thought-entry';
+    thoughts.forEach(t => appendThought(t));
+}
+
+/**
+ * Añadir un único pensamiento al panel (usado por la generación en streaming).
+ */
+export function appendThought(t) {
+    const thoughtStream = document.getElementById('thought-stream');
+    if (!thoughtStream) return;
+
+    const entry = document.createElement('div');
+    entry.className = 'thought-entry';
 
+    // Las entradas de texto plano (p.ej. "Theory Breaker") no tienen probabilidad
+    if (typeof t === 'string') {
+        entry.classList.add('warning');
+        entry.textContent = `• ${t}`;
+    } else {
         const prob = (t.prob || 0) * 100;
 
         // Add type-specific class
@@ -341,16 +355,15 @@ export function renderThoughts(thoughts) {
         else entry.classList.add('warning');
 
         const alternatives = (t.alternatives || t.alts || []).slice(0, 3).map(a =>
-            `${a.token} (${(a.prob * 100).toFixed(0)}%)`
+            typeof a === 'string' ? a : `${a.token} (${(a.prob * 100).toFixed(0)}%)`
         ).join(', ');
 
         const altText = alternatives ? ` [alt: ${alternatives}]` : '';
 
         entry.textContent = `• ${t.token}${window.state?.genMode === 'ai' ? ` (${prob.toFixed(0)}%)` : ''}${altText}`;
+    }
 
-        thoughtStream.appendChild(entry);
-    });
-
+    thoughtStream.appendChild(entry);
     thoughtStream.scrollTop = thoughtStream.scrollHeight;
 }
 
@@ -139,7 +139,22 @@ export async function startJamSession() {
     }
 
     try {
-        const data = await api.startJamSessionAPI({ duration, interval, channels, types });
+        // La jam corre en el servidor: generación con antelación y envío en límites de compás
+        const useAI = state.genMode === 'ai';
+        const data = await api.startJamSessionAPI({
+            duration,
+            interval,
+            channels,
+            types,
+            density: state.config.density,
+            complexity: state.config.complexity,
+            tempo: state.config.tempo,
+            style: state.config.style,
+            use_ai: useAI,
+            temperature: useAI ? state.config.temperature : 1.0,
+            target_ip: localStorage.getItem('target_ip') || '127.0.0.1',
+            target_port: parseInt(localStorage.getItem('target_port') || '6010')
+        });
 
         if (data.success) {
             jamSessionConfig = data.config;
@@ -148,7 +163,7 @@ export async function startJamSession() {
             closeJamSessionModal();
             logActivity(`Jam session iniciada: ${duration}min, ${channels.length} canales`);
 
-            // Iniciar generación automática
+            // Seguir el progreso de la jam del servidor
             runJamSession();
 
             // Actualizar UI
@@ -167,64 +182,36 @@ export async function startJamSession() {
 function runJamSession() {
     if (!jamSessionActive || !jamSessionConfig) return;
 
-    let patternIndex = 0;
-    const totalPatterns = jamSessionConfig.estimated_patterns;
+    let lastSent = 0;
 
     jamSessionInterval = setInterval(async () => {
-        if (patternIndex >= totalPatterns) {
-            stopJamSession();
-            return;
-        }
+        try {
+            const data = await api.getJamSessionStatusAPI();
+            const jam = data.jam;
 
-        // Seleccionar canal y tipo aleatorio
-        const channel = jamSessionConfig.channels[Math.floor(Math.random() * jamSessionConfig.channels.length)];
-        const type = jamSessionConfig.types[Math.floor(Math.random() * jamSessionConfig.types.length)];
+            if (!data.active) {
+                resetJamSessionUI();
+                logActivity(jam ? `Jam finalizada: ${jam.sent} cambios enviados` : 'Jam session detenida');
+                return;
+            }
 
-        // Generar patrón
-        try {
-            const useAI = state.genMode === 'ai';
-
-            const requestData = {
-                type: type,
-                density: state.config.density,
-                complexity: state.config.complexity,
-                tempo: state.config.tempo,
-                style: state.config.style,
-                use_ai: useAI,
-                temperature: useAI ? state.config.temperature : 1.0
-            };
-
-            const genData = await api.generatePatternAPI(requestData);
-
-            if (genData.success) {
-                // Enviar a canal
-                const targetIp = localStorage.getItem('target_ip') || '127.0.0.1';
-                const targetPort = parseInt(localStorage.getItem('target_port') || '6010');
-
-                const sendData = await api.sendPatternAPI({
-                    channel: channel,
-                    pattern: genData.pattern,
-                    target_ip: targetIp,
-                    target_port: targetPort
-                });
-
-                if (sendData.success) {
-                    // ACTUALIZACIÓN VISUAL CLAVE: Mostrar código en pantalla
-                    const displayCode = `-- Jam: ${channel} (${type})\n${channel} $ ${genData.pattern}`;
-                    const outputElem = document.getElementById('pattern-output');
-                    if (outputElem) outputElem.textContent = displayCode;
-
-                    logActivity(`Jam: ${channel} <- ${type} patrón`);
-                    patternIndex++;
-
-                    // Actualizar progreso
-                    const progress = Math.round((patternIndex / totalPatterns) * 100);
-                    document.getElementById('jam-status-text').textContent =
-                        `🎵 Jam activa: ${jamSessionConfig.channels.join(', ')} | ${progress}%`;
-                } else {
-                    logActivity(`Error enviando OSC: ${sendData.error}`, 'error');
-                }
+            if (jam.sent > lastSent) {
+                lastSent = jam.sent;
+
+                // ACTUALIZACIÓN VISUAL CLAVE: Mostrar código en pantalla
+                const displayCode = Object.entries(jam.current)
+                    .map(([channel, pattern]) => `${channel} $ ${pattern}`)
+                    .join('\n');
+                const outputElem = document.getElementById('pattern-output');
+                if (outputElem) outputElem.textContent = `-- Jam: compás ${jam.bar}${jam.section ? ` (${jam.section})` : ''}\n${displayCode}`;
+
+                logActivity(`Jam: ${Object.keys(jam.current).join(', ')} actualizados`);
             }
+
+            // Actualizar progreso
+            const progress = Math.round((jam.sent / jam.total) * 100);
+            document.getElementById('jam-status-text').textContent =
+                `🎵 Jam activa: ${jam.channels.join(', ')} | ${progress}%`;
         } catch (error) {
             console.error('Error en jam session:', error);
             // Mostrar error visualmente
@@ -232,10 +219,10 @@ function runJamSession() {
             if (outputElem) outputElem.textContent = `-- Error de conexión con Raspberry Pi --\nComprueba la IP configurada.`;
         }
 
-    }, jamSessionConfig.interval * 1000);
+    }, 2000);
 }
 
-export function stopJamSession() {
+function resetJamSessionUI() {
     if (jamSessionInterval) {
         clearInterval(jamSessionInterval);
         jamSessionInterval = null;
@@ -246,6 +233,16 @@ export function stopJamSession() {
 
     const status = document.getElementById('jam-status');
     if (status) status.style.display = 'none';
+}
+
+export async function stopJamSession() {
+    resetJamSessionUI();
+
+    try {
+        await api.stopJamSessionAPI();
+    } catch (error) {
+        console.error('Error deteniendo jam:', error);
+    }
     logActivity('Jam session detenida');
 }
 
@@ -0,0 +1,22 @@
+from activity_log import ActivityLog
+
+
+def test_ring_buffer_cursor_reads():
+    log = ActivityLog(maxlen=5)
+    for i in range(8):
+        log.append(f'msg {i}', event='generation', payload={'i': i})
+
+    assert [e['seq'] for e in log.recent()] == [4, 5, 6, 7, 8]
+    assert log.since(6) == (log.recent()[-2:], False)
+    assert log.since(8) == ([], False)
+
+    # El cliente se ha perdido las entradas 2 y 3
+    entries, truncated = log.since(1)
+    assert truncated and entries[0]['seq'] == 4
+
+    # Cursor de un proceso anterior del servidor: se reenvía todo
+    entries, truncated = log.since(50)
+    assert truncated and len(entries) == 5
+
+    entry = log.append('x', level='nope')
+    assert entry['level'] == 'info' and entry['payload'] == {}
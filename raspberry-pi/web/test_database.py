@@ -0,0 +1,167 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+
+from database import DatabaseManager, build_search_query, extract_samples
+from json_stream import iter_object_arrays
+
+
+def make_db(tmp_path):
+    return DatabaseManager(os.path.join(str(tmp_path), 'test.db'))
+
+
+def test_history_write_behind_and_pagination(tmp_path):
+    db = make_db(tmp_path)
+    for i in range(7):
+        db.add_history_entry(f'sound "bd*{i}"', 'techno', 0.5, 0.5, 140, ["t"])
+
+    page1 = db.get_history(limit=3)
+    page2 = db.get_history(limit=3, before_id=page1[-1]['id'])
+    page3 = db.get_history(limit=3, before_id=page2[-1]['id'])
+
+    ids = [h['id'] for h in page1 + page2 + page3]
+    assert ids == [7, 6, 5, 4, 3, 2, 1]
+    db.close()
+
+
+def test_history_pagination_survives_archiving_the_cursor_row(tmp_path):
+    db = make_db(tmp_path)
+    for i in range(5):
+        db.add_history_entry(f'sound "bd*{i}"', 'techno', 0.5, 0.5, 140, ["t"])
+    page1 = db.get_history(limit=2)
+    cursor = page1[-1]
+
+    # Retention moved the cursor row out of history between two page requests
+    conn = db._get_conn()
+    conn.execute("INSERT INTO history_archive SELECT * FROM history WHERE id = ?", (cursor['id'],))
+    conn.execute("DELETE FROM history WHERE id = ?", (cursor['id'],))
+    conn.commit()
+
+    assert [h['id'] for h in db.get_history(limit=2, before_id=cursor['id'])] == [3, 2]
+    page2 = db.get_history(limit=2, before_id=cursor['id'], before_ts=cursor['timestamp'])
+    assert [h['id'] for h in page2] == [3, 2]
+    db.close()
+
+
+def test_search_history_and_favorites(tmp_path):
+    db = make_db(tmp_path)
+    db.add_history_entry('jux rev $ sound "808bd*4 hh"', 'techno', 0.5, 0.5, 140)
+    db.add_history_entry('sound "808bd*4"', 'house', 0.5, 0.5, 125)
+    db.add_history_entry('every 4 (fast 2) $ sound "arpy"', 'ambient', 0.3, 0.3, 90)
+    fav_id = db.add_favorite('sound "cp*2" # room 0.4', 'Dark claps', 'techno', 'dark')
+
+    results = db.search_patterns('uses 808bd and jux, style techno')
+    assert [r['pattern'] for r in results] == ['jux rev $ sound "808bd*4 hh"']
+
+    assert db.search_patterns('sample:arpy fn:every')[0]['style'] == 'ambient'
+    assert db.search_patterns('dark', source='favorites')[0]['id'] == fav_id
+    assert db.search_patterns('dark', source='history') == []
+
+    db.delete_favorite(fav_id)
+    assert db.search_patterns('dark') == []
+    db.close()
+
+
+def test_search_query_parsing():
+    assert build_search_query('uses 808bd and jux, style techno') == '"808bd" AND "jux" AND style : "techno"'
+    assert build_search_query('sample:bd') == 'samples : "bd"'
+    assert extract_samples('sound "808bd*4 [sn:2 hh(3,8)] ~"') == ['808bd', 'sn', 'hh']
+
+
+def test_streaming_bulk_import(tmp_path):
+    db = make_db(tmp_path)
+    body = json.dumps({
+        'version': 1,
+        'history': [{'pattern': f'sound "bd*{i}"', 'timestamp': 1706378800000 + i} for i in range(1200)],
+        'favorites': [{'pattern': 'sound "cp"', 'tags': ['a', 'b']}, {'name': 'no pattern'}, 5]
+    }).encode()
+
+    records = iter_object_arrays(io.BytesIO(body), chunk_size=7)
+    seen = []
+    result = db.bulk_import(records, chunk_size=500, progress=seen.append)
+
+    assert result == {'history': 1200, 'favorites': 1, 'skipped': 2}
+    assert [p['history'] for p in seen] == [500, 1000, 1200, 1200]
+    assert db.get_history(limit=1)[0]['timestamp'] == '2024-01-27 18:06:41'
+    assert db.get_favorites()[0]['tags'] == 'a,b'
+    db.close()
+
+
+def test_migrate_json_stores(tmp_path):
+    presets_file = os.path.join(str(tmp_path), 'presets.json')
+    history_file = os.path.join(str(tmp_path), 'history.json')
+    with open(presets_file, 'w') as f:
+        json.dump([{'name': 'A', 'genMode': 'ai', 'tempo': 138}], f)
+    with open(history_file, 'w') as f:
+        json.dump([{'pattern': f'p{i}', 'timestamp': i} for i in range(150, 0, -1)], f)
+
+    db = make_db(tmp_path)
+    db.migrate_json_stores(presets_file, history_file)
+    db.migrate_json_stores(presets_file, history_file)
+
+    assert [p['name'] for p in db.get_presets()] == ['A']
+    assert db.get_presets()[0]['genMode'] == 'ai'
+    assert not db.add_preset({'name': 'A'})
+    history = db.get_session_history()
+    assert len(history) == 100 and history[0]['pattern'] == 'p150'
+    db.close()
+
+
+def test_bulk_import_commits_per_chunk_and_reports_resume_point(tmp_path):
+    db = make_db(tmp_path)
+
+    def records():
+        for i in range(5):
+            yield 'history', {'pattern': f'sound "bd*{i}"'}
+        yield 'history', 'invalid'
+        # Another thread (another connection) can write while the next chunk arrives
+        writer = threading.Thread(target=lambda: added.append(db.add_favorite('sound "cp"', 'During', 'techno')))
+        writer.start()
+        writer.join()
+        raise IOError('client disconnected')
+
+    added = []
+    result = db.bulk_import(records(), chunk_size=2)
+    assert added[0] is not None
+    assert result['history'] == 4 and result['resume'] == {'history': 4, 'favorites': 0}
+    assert 'client disconnected' in result['error']
+    assert len(db.get_history(limit=10)) == 4
+    db.close()
+
+
+def test_history_flush_drops_rows_on_non_transient_errors(tmp_path):
+    db = DatabaseManager(os.path.join(str(tmp_path), 'test.db'), history_flush_interval=60)
+    db.add_history_entry('sound "bd"', 'techno', 0.5, 0.5, 140)
+    conn = db._get_conn()
+    conn.execute('ALTER TABLE history RENAME TO history_old')
+    conn.commit()
+
+    # "no such table" is not retried: the queue does not grow
+    assert db.flush_history() == 0
+    assert db._history_queue.qsize() == 0 and db._history_retries == 0
+    db.close()
+
+
+def test_search_index_works_for_other_sqlite_clients_and_updates(tmp_path):
+    db = make_db(tmp_path)
+    fav_id = db.add_favorite('jux rev $ sound "arpy*4"', 'Old name', 'ambient', 'calm')
+
+    # A plain connection (sqlite3 CLI, backup tool) has none of the app's functions
+    other = sqlite3.connect(db.db_path)
+    other.execute("INSERT INTO favorites (pattern, name, style, tags) VALUES ('sound \"cp\"', 'From CLI', 'house', '')")
+    other.execute("UPDATE favorites SET name = 'Renamed' WHERE id = ?", (fav_id,))
+    other.commit()
+    other.close()
+
+    assert db.search_patterns('name:renamed')[0]['id'] == fav_id
+    assert db.search_patterns('name:old') == []
+    assert db.search_patterns('cli')[0]['name'] == 'From CLI'
+    assert db.search_patterns('sample:arpy fn:jux')[0]['id'] == fav_id
+    db.close()
+
+    # Rows written without the search columns are filled in on the next start
+    db = make_db(tmp_path)
+    assert db.search_patterns('sample:cp')[0]['name'] == 'From CLI'
+    db.close()
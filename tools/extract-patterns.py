@@ -8,8 +8,13 @@ import os
 import re
 import json
 import argparse
+import sys
 from pathlib import Path
 
+# Las heurísticas de clasificación se comparten con el entrenamiento de sub-modelos
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'raspberry-pi', 'generator'))
+from corpus_reader import categorize_type as categorize_pattern
+
 def extract_patterns_from_file(filepath):
     """Extrae patrones de un archivo .tidal"""
     patterns = []
@@ -34,67 +39,6 @@ def extract_patterns_from_file(filepath):
         print(f"Error leyendo {filepath}: {e}")
         return []
 
-def categorize_pattern(pattern):
-    """Categoriza el patrón con heurísticas mejoradas"""
-    pattern_lower = pattern.lower()
-    
-    sound_match = re.search(r's\s+"([^"]+)"', pattern_lower)
-    sound_source = sound_match.group(1) if sound_match else ""
-    has_note = 'note' in pattern_lower or re.search(r'n\s+"', pattern_lower)
-    
-    drum_sounds = ['bd', 'kick', 'sn', 'snare', 'hh', 'hat', 'hihat', 'cp', 'clap',
-                   'clubkick', 'sd', 'rim', 'tom', 'cymbal', 'crash', 'ride', 'hh27', 'ch', 'oh']
-    bass_sounds = ['bass', 'sub', 'jungbass', 'reese', 'wobble', 'superfm', 'bassdm', 'bassdrums']
-    melody_sounds = ['arpy', 'arp', 'piano', 'superpiano', 'rhodes', 'keys', 'supersquare', 
-                     'supersaw', 'superpwm', 'pluck', 'bell', 'gong', 'supergong', 'supervibe', 
-                     'vibe', 'marimba', 'synth', 'lead', 'pad', 'string']
-    perc_sounds = ['tabla', 'bongo', 'conga', 'perc', 'shaker', 'tamb', 'cowbell', 'wood', 
-                   'metal', 'click', 'tick']
-    fx_sounds = ['noise', 'wind', 'breath', 'bev', 'birds', 'space', 'pad', 'drone', 
-                 'texture', 'grain', 'glitch', 'acid']
-    
-    for drum in drum_sounds:
-        if drum in sound_source or f'sound "{drum}' in pattern_lower:
-            return 'drums'
-    
-    for bass in bass_sounds:
-        if bass in sound_source:
-            return 'bass'
-    
-    for perc in perc_sounds:
-        if perc in sound_source:
-            return 'percussion'
-    
-    for fx in fx_sounds:
-        if fx in sound_source:
-            return 'fx'
-    
-    if has_note:
-        if any(x in pattern_lower for x in ['scale', 'chord', 'arpeggio', 'arpeggiate']):
-            return 'melody'
-        
-        note_numbers = re.findall(r'\b(\d+)\b', pattern)
-        if note_numbers:
-            notes = [int(n) for n in note_numbers if int(n) < 128]
-            if notes:
-                avg_note = sum(notes) / len(notes)
-                if avg_note < 48:
-                    return 'bass'
-                elif avg_note >= 48:
-                    return 'melody'
-    
-    for melody in melody_sounds:
-        if melody in sound_source or melody in pattern_lower:
-            return 'melody'
-    
-    if any(x in pattern_lower for x in ['lpf 200', 'lpf 150', 'lpf 120', 'lpf 100']):
-        return 'bass'
-    
-    if any(x in pattern_lower for x in ['striate', 'grain', 'chop']):
-        return 'fx'
-    
-    return 'unknown'
-
 def ask_user_classification(pattern, auto_type):
     """Pregunta al usuario si la clasificación automática es correcta"""
     print("\n" + "="*80)
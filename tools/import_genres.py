@@ -16,11 +16,18 @@ def extract_patterns():
 
     # Regex para encontrar bloques de código dentro de <pre><code>...</code></pre>
     # Nota: El HTML tiene <p> dentro de <code> a veces, según lo visto.
-    code_blocks = re.findall(r'<pre><code>(.*?)</code></pre>', html_content, re.DOTALL)
+    # Los encabezados (<h2>/<h3>) nombran el género de los bloques que les siguen:
+    # se conservan como cabeceras "# GENERO: ..." para entrenar los sub-modelos por género
+    sections = re.split(r'<h[23][^>]*>(.*?)</h[23]>', html_content, flags=re.DOTALL)
+    titled_blocks = []
+    for i in range(0, len(sections), 2):
+        title = re.sub(r'<[^>]+>', '', sections[i - 1]).strip() if i else ''
+        for block in re.findall(r'<pre><code>(.*?)</code></pre>', sections[i], re.DOTALL):
+            titled_blocks.append((title, block))
     
-    clean_patterns = []
+    clean_patterns = []  # (título de sección, patrón)
     
-    for block in code_blocks:
+    for title, block in titled_blocks:
         # Limpiar tags HTML internos (<p>, </p>, <br>)
         text = re.sub(r'<[^>]+>', '', block)
         
@@ -41,7 +48,7 @@ def extract_patterns():
             if re.match(r'd\d+\s*\$', line):
                 # Guardar patrón previo si existe
                 if current_pattern:
-                    clean_patterns.append(" ".join(current_pattern))
+                    clean_patterns.append((title, " ".join(current_pattern)))
                     current_pattern = []
                 
                 # Transformar 'd1 $ ...' a algo genérico para el corpus?
@@ -62,7 +69,7 @@ def extract_patterns():
         
         # Añadir último del bloque
         if current_pattern:
-            clean_patterns.append(" ".join(current_pattern))
+            clean_patterns.append((title, " ".join(current_pattern)))
 
     # Guardar en corpus
     print(f"Encontrados {len(clean_patterns)} patrones nuevos.")
@@ -71,7 +78,11 @@ def extract_patterns():
         f.write("\n\n# ============================================\n")
         f.write("# IMPORTADO DESDE DOCUMENTACION GENEROS\n")
         f.write("# ============================================\n")
-        for p in clean_patterns:
+        current_title = None
+        for title, p in clean_patterns:
+            if title and title != current_title:
+                f.write(f"# GENERO: {title}\n")
+                current_title = title
             # Limpieza final de espacios múltiples
             p_clean = re.sub(r'\s+', ' ', p).strip()
             f.write(p_clean + '\n')